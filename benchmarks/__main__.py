@@ -0,0 +1,73 @@
+import sys
+import tempfile
+from optparse import OptionParser
+
+from loguru import logger
+
+from benchmarks.runner import measure, load_baseline, save_baseline, Comparison
+from benchmarks.suite import benchmarks
+from common.cache import set_cache_dir
+
+
+def format_change(value: float | None) -> str:
+    return "" if value is None else f" ({value * 100:+.1f}%)"
+
+
+def format_bytes(value: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024 or unit == "MiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def main():
+    parser = OptionParser(usage="python -m benchmarks [options] [NAME_PREFIX ...]")
+
+    parser.add_option("--baseline", dest="baseline", help="Baseline file", type="string", default="benchmarks/baseline.json")
+    parser.add_option("--save", dest="save", help="Save the results to the baseline file", action="store_true", default=False)
+    parser.add_option("--tolerance", dest="tolerance", help="Slowdown or memory growth reported as a regression", type="float", default=0.2)
+    parser.add_option("--min-time", dest="min_time", help="Seconds every repeat runs at least", type="float", default=0.2)
+    parser.add_option("--repeats", dest="repeats", help="Repeats, the best one counts", type="int", default=5)
+    parser.add_option("--list", dest="list", help="List benchmarks", action="store_true", default=False)
+
+    (options, args) = parser.parse_args()
+
+    suite = [benchmark for benchmark in benchmarks() if not args or benchmark.name.startswith(tuple(args))]
+
+    if options.list:
+        for benchmark in suite:
+            print(f"{benchmark.name} ({benchmark.group})")
+        return
+
+    # fixtures must not read or write the persistent caches of real runs
+    set_cache_dir(tempfile.mkdtemp(prefix="bench-cache-"))
+    logger.remove()
+
+    baseline = load_baseline(options.baseline)
+    comparisons = []
+
+    print("| Benchmark | ops/s | Peak memory per op |")
+    print("|---|---|---|")
+
+    for benchmark in suite:
+        result = measure(benchmark, min_time=options.min_time, repeats=options.repeats)
+        comparison = Comparison(name=benchmark.name, result=result, baseline=baseline.get(benchmark.name))
+        comparisons.append(comparison)
+
+        mark = " ⚠️" if comparison.regressed(options.tolerance) else ""
+        print(f"| {benchmark.name}{mark} | {result.ops_per_second:,.1f}{format_change(comparison.speed_change)} | "
+              f"{format_bytes(result.peak_bytes)}{format_change(comparison.memory_change)} |", flush=True)
+
+    regressions = [comparison.name for comparison in comparisons if comparison.regressed(options.tolerance)]
+
+    if options.save:
+        save_baseline(options.baseline, [comparison.result for comparison in comparisons])
+        print(f"\nSaved {len(comparisons)} results to {options.baseline}")
+
+    if regressions:
+        print(f"\nRegressions beyond {options.tolerance * 100:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import random
+
+from pytoniq_core import begin_cell
+
+from common.models import BlockchainToken, BuildRouteRequest, DexRoute, DexBenchmarkResult, EmulatedResult, \
+    ProviderException, DexRouteProvider
+from common.timing import PhaseTimings
+from common.util import remember_token_metadata
+from emulator.emulator import UnsignedMessage
+from emulator.synthetic import TraceShape, address, generate_trace
+from providers.swap_coffee import DexPool, SwapRoute
+
+# every fixture is generated from a fixed seed, so all runs of the suite measure the same inputs
+SEED = 0
+
+TON = BlockchainToken(address="native", symbol="TON", decimals=9)
+
+
+SENDER = address(1)
+JETTON_WALLET = address(2)
+
+
+def trace(hops: int, fanout: int, splits: int) -> dict:
+    # EmulatorResult JSON of a route with every dex, an excess per hop and no failures
+    data, _ = generate_trace(TraceShape(hops=hops, fanout=fanout, splits=splits, excess="every_hop", seed=SEED,
+                                        sender=SENDER, jetton_wallet=JETTON_WALLET))
+
+    return data
+
+
+def message_body(amount: int) -> str:
+    # jetton transfer of amount to the sender
+    cell = (begin_cell().store_uint(0x0f8a7ea5, 32).store_uint(0, 64).store_coins(amount)
+            .store_address(SENDER).store_address(SENDER).store_bit(0).store_coins(1).store_bit(0).end_cell())
+
+    return cell.to_boc().hex()
+
+
+def unsigned_messages(splits: int) -> list[UnsignedMessage]:
+    return [UnsignedMessage(src=SENDER, dest=address(100 + split), body=message_body(10 ** 9 + split),
+                            value=300_000_000, swap_input_amount=10 ** 9, jetton_wallet=JETTON_WALLET)
+            for split in range(splits)]
+
+
+def swap_routes(splits: int, length: int) -> list[SwapRoute]:
+    # token metadata is remembered up front, so build_paths never asks the network for it
+    tokens = [address(1000 + token) for token in range(length + 1)]
+
+    for idx, token in enumerate(tokens):
+        remember_token_metadata(token, {"name": f"Token {idx}", "symbol": f"T{idx}", "decimals": 9})
+
+    return [SwapRoute(gas_amount=0.3, pools=[
+        DexPool(input_token=tokens[hop], output_token=tokens[hop + 1], amount_in=10 ** 9, amount_out=2 * 10 ** 9,
+                dex_name="stonfi" if hop % 2 else "dedust", pool_address=address(2000 + split * length + hop))
+        for hop in range(length)
+    ]) for split in range(splits)]
+
+
+def benchmark_results(count: int, providers: list[DexRouteProvider], amounts: tuple[int, ...] = (100, 1000),
+                      error_rate: float = 0.05) -> dict[int, list[DexBenchmarkResult | ProviderException]]:
+    # results of `count` builds spread over amounts, output tokens and providers, with a share of failures
+    rng = random.Random(SEED)
+    symbols = max(1, count // (len(amounts) * len(providers)))
+    tokens = [BlockchainToken(address=address(3000 + idx), symbol=f"JET{idx}", decimals=9) for idx in range(symbols)]
+    results: dict[int, list] = {amount: [] for amount in amounts}
+
+    for idx in range(count):
+        amount = amounts[idx % len(amounts)]
+        provider = providers[idx // len(amounts) % len(providers)]
+        token = tokens[idx // (len(amounts) * len(providers)) % symbols]
+        request = BuildRouteRequest(input_token=TON, output_token=token, input_amount=amount * 10 ** 9,
+                                    max_splits=4, max_length=3)
+
+        if rng.random() < error_rate:
+            results[amount].append(ProviderException(provider, request, "timed out", "ReadTimeout", 45_000_000))
+            continue
+
+        output = int(amount * 10 ** 9 * rng.uniform(0.9, 1.1))
+        elapsed = rng.uniform(0.2, 3)
+        route = DexRoute(input_token=TON, output_token=token, provider=provider.get_name(),
+                         input_amount=request.input_amount, output_amount=output, request=request)
+
+        results[amount].append(DexBenchmarkResult(
+            route=route,
+            elapsed=elapsed,
+            timings=PhaseTimings(wait=elapsed * 0.8, download=0.01, total=elapsed, requests=1),
+            emulation_elapsed=rng.uniform(0.1, 1),
+            end_to_end_elapsed=elapsed + 1,
+            ratio=output / (request.input_amount + 50_000_000),
+            provider=provider,
+            emulation_result=EmulatedResult(output_token=token, output_amount=output, gas_used=50_000_000, splits=2),
+            mc_block_seqno=45_000_000 + idx // 100,
+        ))
+
+    return results
@@ -0,0 +1,105 @@
+import gc
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from pydantic import BaseModel
+
+# runs the benchmarked operation n times
+Operation = Callable[[int], object]
+
+
+class Benchmark:
+
+    def __init__(self, name: str, setup: Callable[[], Operation], group: str = ""):
+        self.name = name
+        self.group = group
+        # builds the fixtures and returns the operation, fixture building is never measured
+        self.setup = setup
+
+
+class BenchmarkResult(BaseModel):
+    name: str
+    ops_per_second: float
+    iterations: int
+    # peak memory allocated by one operation on top of what was allocated before it
+    peak_bytes: int
+
+
+class Comparison(BaseModel):
+    name: str
+    result: BenchmarkResult
+    baseline: BenchmarkResult | None = None
+
+    @property
+    def speed_change(self) -> float | None:
+        return self.result.ops_per_second / self.baseline.ops_per_second - 1 if self.baseline else None
+
+    @property
+    def memory_change(self) -> float | None:
+        if self.baseline is None or self.baseline.peak_bytes == 0:
+            return None
+
+        return self.result.peak_bytes / self.baseline.peak_bytes - 1
+
+    def regressed(self, tolerance: float) -> bool:
+        speed, memory = self.speed_change, self.memory_change
+
+        return (speed is not None and speed < -tolerance) or (memory is not None and memory > tolerance)
+
+
+def _timed(operation: Operation, iterations: int) -> float:
+    # the collector would charge one operation for the garbage of another
+    gc.collect()
+    gc.disable()
+
+    try:
+        started_at = time.perf_counter()
+        operation(iterations)
+        return time.perf_counter() - started_at
+    finally:
+        gc.enable()
+
+
+def measure(benchmark: Benchmark, min_time: float = 0.2, repeats: int = 5) -> BenchmarkResult:
+    operation = benchmark.setup()
+
+    # warm-up, also the first estimate of the cost of one operation
+    elapsed = _timed(operation, 1)
+    iterations = max(1, int(min_time / elapsed)) if elapsed > 0 else 1000
+
+    # the best of several repeats, the others are slowed down by something else
+    best = min(_timed(operation, iterations) for _ in range(repeats)) / iterations
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        operation(1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(name=benchmark.name, ops_per_second=1 / best if best > 0 else float("inf"),
+                           iterations=iterations, peak_bytes=max(0, peak - before))
+
+
+def load_baseline(path: str | Path) -> dict[str, BenchmarkResult]:
+    try:
+        data = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return {}
+
+    return {name: BenchmarkResult.model_validate(result) for name, result in data.items()}
+
+
+def save_baseline(path: str | Path, results: list[BenchmarkResult]):
+    # results of benchmarks that did not run this time are kept
+    baseline = load_baseline(path)
+    baseline.update({result.name: result for result in results})
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({name: result.model_dump() for name, result in sorted(baseline.items())}, indent=2))
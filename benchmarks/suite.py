@@ -0,0 +1,130 @@
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+import exporters
+from benchmarks import fixtures
+from benchmarks.runner import Benchmark, Operation
+from emulator.emulator import build_message_boc, emulate_internal_messages, get_total_swap_output, \
+    EmulatedTransaction
+from emulator.models import EmulatorResult
+from emulator.trace import decode_trace
+from exporters.csv import CsvExporter
+from exporters.jinja_template import Jinja2Exporter
+from providers.dedust_router_v2 import DedustRouterV2Provider
+from providers.moki_ag import MokiAgProvider
+from providers.swap_coffee import SwapCoffeeRouteProvider, build_paths
+from providers.xdelta import XdeltaRouteProvider
+
+# (hops, fan-out, splits) of the benchmarked traces, from a plain two-hop swap to wide multi-split ones
+TRACE_SHAPES = [(2, 0, 1), (3, 2, 4), (4, 4, 8), (3, 1, 20)]
+SPLITS = [1, 4, 20]
+EXPORT_SIZES = [1_000, 10_000, 100_000]
+
+
+def _async(factory: Callable[[], Awaitable]) -> Operation:
+    # every call of the operation runs n awaits on a loop of its own
+    loop = asyncio.new_event_loop()
+
+    async def repeat(iterations: int):
+        for _ in range(iterations):
+            await factory()
+
+    return lambda iterations: loop.run_until_complete(repeat(iterations))
+
+
+def trace_validation(hops: int, fanout: int, splits: int) -> Operation:
+    data = fixtures.trace(hops, fanout, splits)
+
+    return lambda iterations: [EmulatorResult.model_validate(data) for _ in range(iterations)]
+
+
+def trace_decoding(hops: int, fanout: int, splits: int) -> Operation:
+    content = json.dumps(fixtures.trace(hops, fanout, splits)).encode()
+
+    return lambda iterations: [decode_trace(content) for _ in range(iterations)]
+
+
+def swap_output(splits: int) -> Operation:
+    result = decode_trace(json.dumps(fixtures.trace(2, 1, 4)).encode())
+    transactions = [EmulatedTransaction(message=message, emulation_result=result)
+                    for message in fixtures.unsigned_messages(splits)]
+
+    return _async(lambda: get_total_swap_output(transactions))
+
+
+def path_building(splits: int) -> Operation:
+    routes = fixtures.swap_routes(splits, length=3)
+    client = httpx.AsyncClient()
+
+    return _async(lambda: build_paths(client, routes))
+
+
+def message_building(splits: int) -> Operation:
+    messages = fixtures.unsigned_messages(splits)
+
+    return lambda iterations: [build_message_boc(message.src, message.dest, message.value, message.body)
+                               for _ in range(iterations) for message in messages]
+
+
+def message_emulation(splits: int) -> Operation:
+    # the emulator answers at once with a fixed trace, what is left is building, sending and parsing
+    trace = json.dumps(fixtures.trace(2, 1, 4)).encode()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=trace)))
+    messages = fixtures.unsigned_messages(splits)
+
+    return _async(lambda: emulate_internal_messages("benchmark", client, messages, "session"))
+
+
+def _providers():
+    swap_coffee = SwapCoffeeRouteProvider()
+
+    return [swap_coffee, XdeltaRouteProvider(), MokiAgProvider(swap_coffee), DedustRouterV2Provider()]
+
+
+def csv_export(count: int) -> Operation:
+    results = fixtures.benchmark_results(count, _providers())
+    directory = tempfile.mkdtemp(prefix="bench-csv-")
+
+    def export(iterations: int):
+        for _ in range(iterations):
+            CsvExporter(directory).export(results)
+
+    return export
+
+
+def jinja_export(count: int) -> Operation:
+    results = fixtures.benchmark_results(count, _providers())
+    output = Path(tempfile.mkdtemp(prefix="bench-jinja-")) / "summary.md"
+
+    def export(iterations: int):
+        for _ in range(iterations):
+            Jinja2Exporter("template.jinja2", str(output), directory=str(Path(exporters.__file__).parent),
+                           context={"connection_mode": "warm"}).export(results)
+
+    return export
+
+
+def benchmarks() -> list[Benchmark]:
+    suite = []
+
+    for shape in TRACE_SHAPES:
+        name = "h{}-f{}-s{}".format(*shape)
+        suite.append(Benchmark(f"trace_validate/{name}", lambda s=shape: trace_validation(*s), "traces"))
+        suite.append(Benchmark(f"trace_decode/{name}", lambda s=shape: trace_decoding(*s), "traces"))
+
+    for splits in SPLITS:
+        suite.append(Benchmark(f"swap_output/{splits}", lambda s=splits: swap_output(s), "analysis"))
+        suite.append(Benchmark(f"build_paths/{splits}", lambda s=splits: path_building(s), "paths"))
+        suite.append(Benchmark(f"message_boc/{splits}", lambda s=splits: message_building(s), "messages"))
+        suite.append(Benchmark(f"emulate_messages/{splits}", lambda s=splits: message_emulation(s), "messages"))
+
+    for count in EXPORT_SIZES:
+        suite.append(Benchmark(f"csv_export/{count}", lambda c=count: csv_export(c), "exporters"))
+        suite.append(Benchmark(f"jinja_export/{count}", lambda c=count: jinja_export(c), "exporters"))
+
+    return suite
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+CACHE_DIR = Path(os.environ.get("DEX_BENCHMARK_CACHE_DIR", ".cache"))
+
+
+def set_cache_dir(directory: str):
+    global CACHE_DIR
+    CACHE_DIR = Path(directory)
+
+
+# Key-value cache persisted as a single JSON file in CACHE_DIR. Loaded lazily on first access, so the
+# cache directory can be changed from the command line before anything is read.
+# With ttl set, entries are stored along with their expiry time and ignored once expired
+class JsonFileCache:
+
+    def __init__(self, name: str, ttl: float | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.entries: dict[str, Any] | None = None
+        self.inflight: dict[str, asyncio.Task] = {}
+        self.dirty = False
+
+    @property
+    def path(self) -> Path:
+        return CACHE_DIR / f"{self.name}.json"
+
+    def _load(self) -> dict[str, Any]:
+        if self.entries is None:
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except FileNotFoundError:
+                self.entries = {}
+            except ValueError as e:
+                logger.warning(f"Ignoring corrupted cache {self.path}: {e}")
+                self.entries = {}
+
+        return self.entries
+
+    def get(self, key: str) -> Any:
+        entry = self._load().get(key)
+
+        if self.ttl is None or entry is None:
+            return entry
+
+        if entry["expires_at"] < time.time():
+            return None
+
+        return entry["value"]
+
+    def set(self, key: str, value: Any):
+        if self.ttl is not None:
+            value = {"value": value, "expires_at": time.time() + self.ttl}
+
+        self._load()[key] = value
+        self.dirty = True
+
+    def __len__(self):
+        return len(self._load())
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+            self.set(key, value)
+            return value
+        finally:
+            self.inflight.pop(key, None)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        # concurrent lookups of the same key share a single fetch
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            self.inflight[key] = task
+
+        return await asyncio.shield(task)
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # other processes (e.g. shard workers) may have saved the same cache meanwhile, their entries are kept
+        try:
+            entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            entries = {}
+
+        entries.update(self.entries)
+        self.entries = entries
+
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self.entries))
+        os.replace(tmp_path, self.path)
+
+        self.dirty = False
@@ -0,0 +1,64 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+# A route that takes longer than BUILD_BUDGET to build is discarded, since the blockchain state could have changed
+# significantly; emulation runs on a pinned block and only has to finish within EMULATION_BUDGET.
+# The deadline of the current stage travels with the request in a context variable: the stage is cancelled as soon as
+# it runs past it, which also closes its in-flight requests and frees their pooled connections, and waits inside the
+# stage that would outlast it can fail at once with sleep_within_deadline. Stages start after their rate limiter slot
+# is granted, so the limiter's own waits never count against a deadline
+BUILD_BUDGET = 6.0
+EMULATION_BUDGET = 30.0
+
+STAGES = ("build", "emulation")
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str, budget: float):
+        self.stage = stage
+        self.budget = budget
+
+        super().__init__(f"{stage.capitalize()} did not finish within {budget:g}s")
+
+
+class Deadline:
+
+    def __init__(self, stage: str, budget: float):
+        self.stage = stage
+        self.budget = budget
+        self.when = asyncio.get_running_loop().time() + budget
+
+    def remaining(self) -> float:
+        return self.when - asyncio.get_running_loop().time()
+
+
+CURRENT_DEADLINE: ContextVar[Deadline | None] = ContextVar("current_deadline", default=None)
+
+
+@asynccontextmanager
+async def deadline(stage: str, budget: float):
+    current = Deadline(stage, budget)
+    token = CURRENT_DEADLINE.set(current)
+
+    try:
+        async with asyncio.timeout_at(current.when) as timeout:
+            yield current
+    except TimeoutError:
+        # a timeout of the work itself, e.g. of an inner wait, is not the deadline's
+        if not timeout.expired():
+            raise
+
+        raise DeadlineExceeded(stage, budget) from None
+    finally:
+        CURRENT_DEADLINE.reset(token)
+
+
+async def sleep_within_deadline(delay: float):
+    # a wait that would outlast the current deadline fails at once instead of holding the pair until it is cancelled
+    current = CURRENT_DEADLINE.get()
+
+    if current is not None and delay >= current.remaining():
+        raise DeadlineExceeded(current.stage, current.budget)
+
+    await asyncio.sleep(delay)
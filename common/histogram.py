@@ -0,0 +1,153 @@
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+# values are recorded as integer microseconds
+UNITS_PER_SECOND = 1_000_000
+
+
+# Log-linear histogram in the layout of HdrHistogram: values below sub_bucket_count are counted exactly, larger ones
+# fall into buckets whose width doubles every sub_bucket_count / 2 slots, so every value is kept within
+# 10^-significant_digits of its true value. Histograms with the same settings merge by adding counts, without losing
+# anything a single histogram would have recorded
+class LatencyHistogram:
+
+    def __init__(self, significant_digits: int = 2, highest_value: float = 600):
+        self.significant_digits = significant_digits
+        self.highest_value = highest_value
+
+        self.sub_bucket_magnitude = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_half_magnitude = self.sub_bucket_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_magnitude
+        self.sub_bucket_half = self.sub_bucket_count // 2
+
+        self.highest_units = int(highest_value * UNITS_PER_SECOND)
+        self.counts = np.zeros(self._index(self.highest_units) + 1, dtype=np.int64)
+
+        self.total = 0
+        self.min_units: int | None = None
+        self.max_units = 0
+        self.sum_units = 0
+
+    def _index(self, units: int) -> int:
+        if units < self.sub_bucket_count:
+            return units
+
+        shift = units.bit_length() - self.sub_bucket_magnitude
+
+        return ((shift + 1) << self.sub_bucket_half_magnitude) + (units >> shift) - self.sub_bucket_half
+
+    def _highest_equivalent(self, index: np.ndarray) -> np.ndarray:
+        # largest value that falls into each slot
+        bucket = (index >> self.sub_bucket_half_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half - 1)) + self.sub_bucket_half
+
+        below = bucket < 0
+        sub_bucket = np.where(below, sub_bucket - self.sub_bucket_half, sub_bucket)
+        bucket = np.maximum(bucket, 0)
+
+        return ((sub_bucket + 1) << bucket) - 1
+
+    @property
+    def compatible_key(self) -> tuple[int, float]:
+        return self.significant_digits, self.highest_value
+
+    def record(self, value: float, count: int = 1):
+        # values past the highest trackable one saturate instead of being dropped
+        units = min(max(0, round(value * UNITS_PER_SECOND)), self.highest_units)
+
+        self.counts[self._index(units)] += count
+        self.total += count
+        self.sum_units += units * count
+        self.max_units = max(self.max_units, units)
+        self.min_units = units if self.min_units is None else min(self.min_units, units)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if other.compatible_key != self.compatible_key:
+            raise ValueError(f"Cannot merge histograms with different settings: {self.compatible_key} and {other.compatible_key}")
+
+        self.counts += other.counts
+        self.total += other.total
+        self.sum_units += other.sum_units
+        self.max_units = max(self.max_units, other.max_units)
+
+        if other.min_units is not None:
+            self.min_units = other.min_units if self.min_units is None else min(self.min_units, other.min_units)
+
+        return self
+
+    def percentiles(self, percentiles: list[float]) -> list[float]:
+        if self.total == 0:
+            return [0.0] * len(percentiles)
+
+        ranks = np.maximum(1, np.ceil(np.asarray(percentiles, dtype=np.float64) / 100 * self.total))
+        indexes = np.searchsorted(np.cumsum(self.counts), ranks)
+        values = np.minimum(self._highest_equivalent(indexes), self.max_units)
+
+        return (values / UNITS_PER_SECOND).tolist()
+
+    def percentile(self, percentile: float) -> float:
+        return self.percentiles([percentile])[0]
+
+    @property
+    def max(self) -> float:
+        return self.max_units / UNITS_PER_SECOND
+
+    @property
+    def min(self) -> float:
+        return (self.min_units or 0) / UNITS_PER_SECOND
+
+    @property
+    def mean(self) -> float:
+        return self.sum_units / self.total / UNITS_PER_SECOND if self.total else 0.0
+
+    def to_dict(self) -> dict:
+        indexes = np.flatnonzero(self.counts)
+
+        return {
+            "significant_digits": self.significant_digits,
+            "highest_value": self.highest_value,
+            "total": self.total,
+            "min_units": self.min_units,
+            "max_units": self.max_units,
+            "sum_units": self.sum_units,
+            # sparse, most slots of a latency histogram stay empty
+            "counts": dict(zip(indexes.tolist(), self.counts[indexes].tolist())),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        histogram = cls(data["significant_digits"], data["highest_value"])
+        histogram.total = data["total"]
+        histogram.min_units = data["min_units"]
+        histogram.max_units = data["max_units"]
+        histogram.sum_units = data["sum_units"]
+
+        for index, count in data["counts"].items():
+            histogram.counts[int(index)] = count
+
+        return histogram
+
+
+def save_histograms(path: str | Path, histograms: dict[str, LatencyHistogram]):
+    Path(path).write_text(json.dumps({key: histogram.to_dict() for key, histogram in histograms.items()}))
+
+
+def load_histograms(path: str | Path) -> dict[str, LatencyHistogram]:
+    return {key: LatencyHistogram.from_dict(data) for key, data in json.loads(Path(path).read_text()).items()}
+
+
+def merge_histograms(*sets: dict[str, LatencyHistogram]) -> dict[str, LatencyHistogram]:
+    # e.g. histograms of several hosts or runs, the inputs are left untouched
+    merged: dict[str, LatencyHistogram] = {}
+
+    for histograms in sets:
+        for key, histogram in histograms.items():
+            if key in merged:
+                merged[key].merge(histogram)
+            else:
+                merged[key] = LatencyHistogram.from_dict(histogram.to_dict())
+
+    return merged
@@ -0,0 +1,286 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from common.models import DexRoute, BuildRouteRequest, EmulatedResult, DexBenchmarkResult, ProviderException, \
+    DexRouteProvider, RouteTimeout, TIMEOUT_ERROR_TYPES
+from common.timing import PhaseTimings
+
+# (input amount in TON, output jetton address, provider name, max splits)
+JournalKey = tuple[int, str, str, int]
+
+
+class JournalEntry(BaseModel):
+    run_id: str | None = None
+    amount: int
+    provider: str
+    request: BuildRouteRequest
+    route: DexRoute | None = None
+    elapsed: float = 0
+    loop_lag: float = 0
+    timings: PhaseTimings | None = None
+    emulation_elapsed: float = 0
+    end_to_end_elapsed: float = 0
+    ratio: float = 0
+    emulation_result: EmulatedResult | None = None
+    mc_block_seqno: int | None = None
+    error: str | None = None
+    error_type: str | None = None
+    # budget of the stage a timed out route ran past
+    deadline: float | None = None
+
+    @property
+    def key(self) -> JournalKey:
+        return self.amount, self.request.output_token.address, self.provider, self.request.max_splits
+
+    @classmethod
+    def of(cls, run_id: str | None, amount: int, result: DexBenchmarkResult | ProviderException) -> "JournalEntry":
+        if isinstance(result, ProviderException):
+            return cls(run_id=run_id, amount=amount, provider=result.provider.get_name(), request=result.request,
+                       mc_block_seqno=result.mc_block_seqno, error=result.message, error_type=result.error_type,
+                       deadline=result.budget if isinstance(result, RouteTimeout) else None)
+
+        return cls(
+            run_id=run_id,
+            amount=amount,
+            provider=result.provider.get_name(),
+            request=result.route.request,
+            route=result.route,
+            elapsed=result.elapsed,
+            loop_lag=result.loop_lag,
+            timings=result.timings,
+            emulation_elapsed=result.emulation_elapsed,
+            end_to_end_elapsed=result.end_to_end_elapsed,
+            ratio=result.ratio,
+            emulation_result=result.emulation_result,
+            mc_block_seqno=result.mc_block_seqno,
+        )
+
+    def restore(self, provider: DexRouteProvider) -> DexBenchmarkResult | ProviderException:
+        stages = {error_type: stage for stage, error_type in TIMEOUT_ERROR_TYPES.items()}
+
+        if self.error_type in stages and self.deadline is not None:
+            return RouteTimeout(provider, self.request, stages[self.error_type], self.deadline, self.mc_block_seqno)
+
+        if self.error is not None or self.route is None:
+            return ProviderException(provider, self.request, self.error or "", self.error_type, self.mc_block_seqno)
+
+        return DexBenchmarkResult(
+            route=self.route,
+            elapsed=self.elapsed,
+            loop_lag=self.loop_lag,
+            timings=self.timings,
+            emulation_elapsed=self.emulation_elapsed,
+            end_to_end_elapsed=self.end_to_end_elapsed,
+            ratio=self.ratio,
+            provider=provider,
+            emulation_result=self.emulation_result,
+            mc_block_seqno=self.mc_block_seqno,
+        )
+
+
+def _truncate_partial_line(path: Path):
+    # a crash in the middle of a write leaves half a record behind, appending after it would corrupt the next one
+    with open(path, "rb+") as file:
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            file.seek(position - step)
+            chunk = file.read(step)
+            newline = chunk.rfind(b"\n")
+
+            if newline != -1:
+                end = position - step + newline + 1
+                break
+
+            position -= step
+        else:
+            end = 0
+
+        if end != size:
+            logger.warning(f"Dropping {size - end} bytes of an incomplete record at the end of {path}")
+            file.truncate(end)
+
+
+def _backup(path: Path):
+    # never silently throw away a previous run, it may be the one that needs resuming
+    backup = path.with_name(f"{path.name}.{int(time.time())}")
+    logger.warning(f"Moving previous journal {path} to {backup}, use --resume to continue it")
+    os.replace(path, backup)
+
+
+def new_run_id() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+# Append-only JSONL log of finished results. Each record is handed to the OS as soon as it is written, so a crashed
+# process loses nothing; fsync runs in a thread once `batch` records are pending or every `interval` seconds,
+# which bounds what a power loss can take without blocking the event loop on disk
+class ResultJournal:
+
+    def __init__(self, path: str | Path, run_id: str | None = None, batch: int = 100, interval: float = 1.0):
+        self.path = Path(path)
+        self.run_id = run_id
+        self.batch = batch
+        self.interval = interval
+
+        self.file = None
+        self.pending = 0
+        self.written = 0
+        self.last_sync = time.monotonic()
+        self.sync_task: asyncio.Task | None = None
+
+    def open(self, resume: bool = False):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.path.exists() and self.path.stat().st_size > 0:
+            if resume:
+                _truncate_partial_line(self.path)
+            else:
+                _backup(self.path)
+
+        self.file = open(self.path, "ab")
+
+    def append(self, amount: int, result: DexBenchmarkResult | ProviderException):
+        # raw provider responses are not needed to rebuild reports
+        record = JournalEntry.of(self.run_id, amount, result).model_dump_json(exclude={"route": {"extra"}})
+        self.file.write(record.encode() + b"\n")
+        self.file.flush()
+
+        self.pending += 1
+        self.written += 1
+
+        if self.pending >= self.batch or time.monotonic() - self.last_sync >= self.interval:
+            self._schedule_sync()
+
+    def _schedule_sync(self):
+        if self.sync_task is None or self.sync_task.done():
+            self.pending = 0
+            self.last_sync = time.monotonic()
+            self.sync_task = asyncio.create_task(asyncio.to_thread(os.fsync, self.file.fileno()))
+
+    async def close(self):
+        if self.file is None:
+            return
+
+        if self.sync_task is not None:
+            await self.sync_task
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+    def __iter__(self) -> Iterator[JournalEntry]:
+        return iter_journal(self.path)
+
+    def completed(self) -> set[JournalKey]:
+        return {entry.key for entry in self}
+
+    def recorded_run_id(self) -> str | None:
+        # id of the run that started the journal
+        for entry in self:
+            return entry.run_id
+
+        return None
+
+
+def _iter_records(path: str | Path) -> Iterator[tuple[JournalEntry, bytes]]:
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return
+
+    with file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                yield JournalEntry.model_validate_json(line), line
+            except ValidationError as e:
+                logger.warning(f"Skipping corrupted record at {path}:{number}: {e.error_count()} errors")
+
+
+def iter_journal(path: str | Path) -> Iterator[JournalEntry]:
+    for entry, _ in _iter_records(path):
+        yield entry
+
+
+def merge_journals(paths: list[str | Path], output: str | Path, resume: bool = False) -> int:
+    # Combines the journals of shard workers into one. Records are ordered by their key rather than by the time they
+    # finished, so the merged journal, and every report built from it, is the same however the shards were scheduled.
+    # A key recorded more than once keeps its latest record, from the first journal that has it
+    records: dict[JournalKey, bytes] = {}
+    run_ids = set()
+
+    for path in paths:
+        shard: dict[JournalKey, bytes] = {}
+
+        for entry, line in _iter_records(path):
+            shard[entry.key] = line if line.endswith(b"\n") else line + b"\n"
+            run_ids.add(entry.run_id)
+
+        for key, line in shard.items():
+            if key in records:
+                logger.warning(f"{key} is recorded by more than one journal, keeping the first one")
+            else:
+                records[key] = line
+
+    if len(run_ids) > 1:
+        logger.warning(f"Merging journals of different runs: {', '.join(sorted(map(str, run_ids)))}")
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    if output.exists() and output.stat().st_size > 0 and not resume:
+        _backup(output)
+
+    tmp_path = output.with_name(output.name + ".tmp")
+
+    with open(tmp_path, "wb") as file:
+        for key in sorted(records):
+            file.write(records[key])
+
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmp_path, output)
+
+    return len(records)
+
+
+def iter_results(path: str | Path, providers: dict[str, DexRouteProvider]) \
+        -> Iterator[tuple[int, DexBenchmarkResult | ProviderException]]:
+    unknown = set()
+
+    for entry in iter_journal(path):
+        provider = providers.get(entry.provider)
+
+        if provider is None:
+            unknown.add(entry.provider)
+            continue
+
+        yield entry.amount, entry.restore(provider)
+
+    if unknown:
+        logger.warning(f"Skipped journal records of unknown providers: {', '.join(sorted(unknown))}")
+
+
+def load_results(path: str | Path, providers: dict[str, DexRouteProvider]) -> dict[int, list[DexBenchmarkResult]]:
+    results: dict[int, list[DexBenchmarkResult]] = {}
+
+    for amount, result in iter_results(path, providers):
+        results.setdefault(amount, []).append(result)
+
+    return results
@@ -0,0 +1,141 @@
+import asyncio
+import math
+import time
+import weakref
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+import httpx
+from loguru import logger
+from pydantic import BaseModel
+
+THROTTLED_STATUS_CODES = {429, 503}
+
+
+class RateLimit(BaseModel):
+    # sustained requests per second
+    rate: float = 1
+    # requests allowed back to back before the sustained rate applies
+    burst: int = 1
+    max_concurrency: int = 2
+
+    def share(self, fraction: float) -> "RateLimit":
+        # part of the limit left to one of several processes calling the same API, never below one request
+        return RateLimit(rate=self.rate * fraction,
+                         burst=max(1, math.floor(self.burst * fraction)),
+                         max_concurrency=max(1, math.ceil(self.max_concurrency * fraction)))
+
+
+# limiters the current task holds a concurrency slot of
+HELD_SLOTS: ContextVar[frozenset] = ContextVar("held_slots", default=frozenset())
+
+# fraction of every API limit this process may use, see set_limiter_share
+LIMITER_SHARE = 1.0
+LIMITERS: "weakref.WeakSet[RateLimiter]" = weakref.WeakSet()
+
+
+def set_limiter_share(fraction: float):
+    # e.g. 1/N in each of N shard workers, applies to existing limiters and to those created later
+    global LIMITER_SHARE
+    LIMITER_SHARE = fraction
+
+    for limiter in LIMITERS:
+        limiter.configure(limiter.base_limit)
+
+
+def parse_retry_after(response: httpx.Response) -> float:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return 0
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+# GCRA limiter with a concurrency cap. Backs off multiplicatively when the API answers with 429 (or 503 with
+# Retry-After) and recovers towards the configured rate after a run of successful calls
+class RateLimiter:
+
+    def __init__(self, name: str, limit: RateLimit, min_rate_factor: float = 0.1, recovery_successes: int = 10):
+        self.name = name
+        self.base_limit = limit
+        self.min_rate_factor = min_rate_factor
+        self.recovery_successes = recovery_successes
+
+        self.tat = 0.0
+        self.successes = 0
+        self.configure(limit)
+
+        LIMITERS.add(self)
+
+    def configure(self, limit: RateLimit):
+        self.limit = limit.share(LIMITER_SHARE) if LIMITER_SHARE < 1 else limit
+        self.rate = self.limit.rate
+        self.min_rate = self.limit.rate * self.min_rate_factor
+        self.semaphore = asyncio.Semaphore(self.limit.max_concurrency)
+
+    def _reserve(self) -> float:
+        interval = 1 / self.rate
+        tolerance = interval * (self.limit.burst - 1)
+
+        now = time.monotonic()
+        tat = max(self.tat, now)
+        self.tat = tat + interval
+
+        return tat - tolerance - now
+
+    def throttled(self, retry_after: float = 0):
+        self.successes = 0
+        self.rate = max(self.min_rate, self.rate / 2)
+
+        if retry_after > 0:
+            tolerance = (self.limit.burst - 1) / self.rate
+            self.tat = max(self.tat, time.monotonic() + retry_after + tolerance)
+
+        logger.warning(f"Throttled by {self.name}, slowing down to {self.rate:.2f} rps (retry after {retry_after:.2f}s)")
+
+    def succeeded(self):
+        if self.rate >= self.limit.rate:
+            return
+
+        self.successes += 1
+
+        if self.successes >= self.recovery_successes:
+            self.successes = 0
+            self.rate = min(self.limit.rate, self.rate * 1.5)
+            logger.info(f"Speeding up {self.name} to {self.rate:.2f} rps")
+
+    @asynccontextmanager
+    async def slot(self):
+        # a task already holding a slot, e.g. an emulation creating its session, is paced without taking a second one:
+        # once every slot is held by such tasks none of them could get it
+        held = HELD_SLOTS.get()
+
+        async with nullcontext() if self in held else self.semaphore:
+            token = HELD_SLOTS.set(held | {self})
+
+            try:
+                delay = self._reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                try:
+                    yield
+                except httpx.HTTPStatusError as e:
+                    response = e.response
+                    if response.status_code == 429 or \
+                            (response.status_code in THROTTLED_STATUS_CODES and "Retry-After" in response.headers):
+                        self.throttled(parse_retry_after(response))
+                    raise
+
+                self.succeeded()
+            finally:
+                HELD_SLOTS.reset(token)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import deque
+
+
+# Measures how long the event loop is blocked: a ticker sleeps for a fixed interval and a wake-up later than scheduled
+# is a stall. Every wake-up overshoots a little even on an idle loop, so only the part above the smallest overshoot
+# seen so far counts, and only once it exceeds min_stall. Stalls are kept as time intervals, so a timing taken on the
+# same loop is corrected only by the stalls overlapping its own window
+class LoopLagMonitor:
+
+    def __init__(self, interval: float = 0.005, min_stall: float = 0.001, horizon: float = 300):
+        self.interval = interval
+        self.min_stall = min_stall
+        # stalls older than this are forgotten, no window measured on the loop is longer
+        self.horizon = horizon
+
+        self.baseline: float | None = None
+        self.stalls: deque[tuple[float, float]] = deque()
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.task: asyncio.Task | None = None
+
+    def _record(self, overshoot: float, woke: float):
+        self.baseline = overshoot if self.baseline is None else min(self.baseline, overshoot)
+
+        stall = overshoot - self.baseline
+        if stall <= self.min_stall:
+            return
+
+        self.stalls.append((woke - stall, woke))
+        self.total_lag += stall
+        self.max_lag = max(self.max_lag, stall)
+
+        while self.stalls and self.stalls[0][1] < woke - self.horizon:
+            self.stalls.popleft()
+
+    async def _tick(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            woke = time.perf_counter()
+
+            self._record(woke - started - self.interval, woke)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._tick())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def mark(self) -> float:
+        return time.perf_counter()
+
+    def since(self, mark: float) -> float:
+        # stalled time between the mark and now
+        lag = 0.0
+
+        for start, end in reversed(self.stalls):
+            if end <= mark:
+                break
+
+            lag += end - max(start, mark)
+
+        return lag
+
+
+LOOP_LAG = LoopLagMonitor()
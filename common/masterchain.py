@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Hashable
+
+from httpx import AsyncClient
+from loguru import logger
+
+from common.util import get_latest_mc_seqno
+
+
+# Polls the masterchain head in the background, so pairs read the latest seqno without a round-trip
+class MasterchainTracker:
+
+    def __init__(self, client: AsyncClient, interval: float = 2.0, ready_timeout: float = 30):
+        self.client = client
+        self.interval = interval
+        self.ready_timeout = ready_timeout
+
+        self.seqno: int | None = None
+        # wall-clock and monotonic time the current seqno was first seen
+        self.seen_at: float | None = None
+        self.changed_at = 0.0
+
+        # seqno and monotonic time of every pin
+        self.pinned: dict[Hashable, tuple[int, float]] = {}
+        self.ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def staleness(self) -> float:
+        # time since the head last moved, failing polls do not look fresh
+        if self.seqno is None:
+            return float("inf")
+
+        return time.monotonic() - self.changed_at
+
+    async def _poll(self):
+        while True:
+            try:
+                seqno = await get_latest_mc_seqno(self.client)
+
+                if seqno != self.seqno:
+                    self.seqno = seqno
+                    self.seen_at = time.time()
+                    self.changed_at = time.monotonic()
+                    self.ready.set()
+            except Exception as e:
+                # any failure, e.g. a malformed body, only skips this poll; a dead loop would pin every later pair
+                # to the last seqno it saw
+                logger.warning(f"Failed to poll masterchain head: {e.__class__.__name__} {str(e)}")
+
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._poll())
+
+        await self.current()
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def current(self) -> int:
+        if self.seqno is None:
+            await asyncio.wait_for(self.ready.wait(), self.ready_timeout)
+
+        return self.seqno
+
+    def _expired(self, key: Hashable, max_age: float | None) -> bool:
+        pinned = self.pinned.get(key)
+
+        return pinned is None or (max_age is not None and time.monotonic() - pinned[1] > max_age)
+
+    async def pin(self, key: Hashable, max_age: float | None = None) -> int:
+        # the first caller with a given key fixes the seqno for everyone else using that key; a caller arriving more
+        # than max_age seconds after the pin moves it to the current head, later callers share the new one
+        if self._expired(key, max_age):
+            seqno = await self.current()
+
+            if self._expired(key, max_age):
+                self.pinned[key] = (seqno, time.monotonic())
+
+        return self.pinned[key][0]
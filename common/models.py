@@ -1,10 +1,10 @@
-import asyncio
-import time
 from abc import abstractmethod, ABC
 
 import httpx
 from pydantic import BaseModel
-from loguru import logger
+
+from common.limiter import RateLimit, RateLimiter
+from common.timing import PhaseTimings
 
 
 class BlockchainToken(BaseModel):
@@ -49,31 +49,53 @@ class EmulationSender(BaseModel):
 class DexBenchmarkResult(BaseModel):
     route: DexRoute
     elapsed: float
+    # time the event loop was blocked while elapsed was measured
+    loop_lag: float = 0
+    timings: PhaseTimings | None = None
+    emulation_elapsed: float = 0
+    # build plus emulation, without the wait for a rate limiter slot in between
+    end_to_end_elapsed: float = 0
     ratio: float = 0
     provider: "DexRouteProvider"
     emulation_result: EmulatedResult | None = None
+    mc_block_seqno: int | None = None
 
     class Config:
         arbitrary_types_allowed = True
 
+    @property
+    def provider_elapsed(self) -> float:
+        # build time without our own connection queueing and event loop stalls
+        queue = self.timings.queue if self.timings else 0
+
+        return max(0.0, self.elapsed - queue - self.loop_lag)
+
+# the emulator is shared by every provider whose emulation only calls the emulator, so its budget and its 429s are
+# kept apart from those of the providers' own APIs
+EMULATOR_LIMITER = RateLimiter("emulator", RateLimit(rate=10, burst=10, max_concurrency=16))
+
+
 class DexRouteProvider(ABC):
+    rate_limit = RateLimit()
 
     def __init__(self):
-        self.leaky_bucket = asyncio.Queue(1)
-        self.last_request_time = 0
+        self.limiter = RateLimiter(self.get_name(), self.rate_limit)
+
+    def throttle(self):
+        return self.limiter.slot()
 
-    async def acquire(self, permits = 1):
-        await self.leaky_bucket.put(permits)
+    def throttle_emulation(self):
+        # providers whose emulation calls their own API take their own slot instead
+        return EMULATOR_LIMITER.slot()
 
-        current_time = time.time()
-        elapsed_time = current_time - self.last_request_time
-        if elapsed_time < 1:
-            logger.info(f"Sleeping for {1 - elapsed_time} seconds for {self.get_name()}")
-            await asyncio.sleep(1 - elapsed_time)
+    def get_hosts(self) -> set[str]:
+        # hosts the provider sends requests to, including those of its transaction builder
+        hosts = {httpx.URL(self.api_url).host} if hasattr(self, "api_url") else set()
 
-        self.last_request_time = time.time()
-        self.leaky_bucket.get_nowait()
+        if getattr(self, "builder", None) is not None:
+            hosts |= self.builder.get_hosts()
 
+        return hosts
 
     @abstractmethod
     async def build_route(self, client: httpx.AsyncClient,
@@ -101,10 +123,48 @@ class DexBenchmarkExporter(ABC):
         pass
 
 
+# Exporter receiving results one by one while the benchmark runs, export() remains for a finished result set
+class DexBenchmarkStreamExporter(DexBenchmarkExporter):
+
+    @abstractmethod
+    def add(self, input_amount: int, result: "DexBenchmarkResult | ProviderException"):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def export(self, results: dict[int, list[DexBenchmarkResult]]):
+        for input_amount, amount_results in results.items():
+            for result in amount_results:
+                self.add(input_amount, result)
+
+        self.close()
+
+
 class ProviderException(Exception):
-    def __init__(self, provider: DexRouteProvider, request: BuildRouteRequest, message: str):
+    def __init__(self, provider: DexRouteProvider, request: BuildRouteRequest, message: str,
+                 error_type: str | None = None, mc_block_seqno: int | None = None):
         self.provider = provider
         self.message = message
         self.request = request
+        # class name of the original error
+        self.error_type = error_type
+        self.mc_block_seqno = mc_block_seqno
 
         super().__init__(message)
+
+
+# error types of routes cancelled at the deadline of a stage, by stage
+TIMEOUT_ERROR_TYPES = {"build": "BuildTimeout", "emulation": "EmulationTimeout"}
+
+
+# a build or emulation cancelled once it ran past its deadline, its result could not count anyway
+class RouteTimeout(ProviderException):
+    def __init__(self, provider: DexRouteProvider, request: BuildRouteRequest, stage: str, budget: float,
+                 mc_block_seqno: int | None = None):
+        self.stage = stage
+        self.budget = budget
+
+        super().__init__(provider, request, f"{stage.capitalize()} did not finish within {budget:g}s",
+                         TIMEOUT_ERROR_TYPES[stage], mc_block_seqno)
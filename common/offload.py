@@ -0,0 +1,39 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable
+
+OFFLOAD_MODES = ("inline", "thread", "process")
+
+# executor for CPU-bound work (message serialization, trace decoding), None runs it inline on the event loop
+EXECUTOR: Executor | None = None
+
+
+def configure_offload(mode: str = "thread", workers: int | None = None):
+    global EXECUTOR
+
+    if mode not in OFFLOAD_MODES:
+        raise ValueError(f"Unknown offload mode {mode}, expected one of {', '.join(OFFLOAD_MODES)}")
+
+    shutdown_offload()
+
+    if mode == "thread":
+        EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="offload")
+    elif mode == "process":
+        # spawn, forking a process with a running event loop and open sockets is not safe
+        EXECUTOR = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_offload():
+    global EXECUTOR
+
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        EXECUTOR = None
+
+
+async def run_cpu(func: Callable[..., Any], *args) -> Any:
+    if EXECUTOR is None:
+        return func(*args)
+
+    return await asyncio.get_running_loop().run_in_executor(EXECUTOR, func, *args)
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import os
+import time
+import zlib
+from pathlib import Path
+
+import httpx
+from loguru import logger
+from pydantic import BaseModel
+
+from common.timing import PhaseTimings, RequestTracer
+
+# record: every exchange of a real run is saved to an archive. replay: requests are answered from an archive
+# without touching the network
+ARCHIVE_MODES = ("record", "replay")
+
+# recorded phases in the order a request goes through them, with the httpcore trace events that bound each of them
+REPLAY_PHASES = [
+    ("connect", "connection.connect_tcp.started", "connection.connect_tcp.complete"),
+    ("tls", "connection.start_tls.started", "connection.start_tls.complete"),
+    ("send", "http11.send_request_headers.started", "http11.send_request_body.complete"),
+    ("wait", None, "http11.receive_response_headers.complete"),
+    ("download", "http11.receive_response_body.started", "http11.receive_response_body.complete"),
+]
+
+
+class Exchange(BaseModel):
+    method: str
+    url: str
+    # content hashes of the bodies, the bodies themselves are stored once per distinct content
+    request_body: str | None = None
+    status_code: int
+    headers: list[tuple[str, str]]
+    response_body: str | None = None
+    # seconds since the recording started
+    started_at: float
+    phases: PhaseTimings
+
+    def keys(self) -> list[tuple]:
+        return request_keys(self.method, httpx.URL(self.url), self.request_body)
+
+
+def content_hash(content: bytes) -> str | None:
+    return hashlib.sha256(content).hexdigest() if content else None
+
+
+def request_keys(method: str, url: httpx.URL, body_hash: str | None) -> list[tuple]:
+    # from the most to the least specific match: query parameters such as emulator session ids, and request bodies
+    # carrying them, differ between the recording and the replay when concurrent requests finish in another order
+    endpoint = (method, url.scheme, url.host, url.path)
+
+    return [
+        ("exact", method, str(url), body_hash),
+        ("body", *endpoint, body_hash),
+        ("endpoint", *endpoint),
+    ]
+
+
+# Content-addressed archive of HTTP exchanges: exchanges.jsonl lists requests and responses in the order they were
+# made, with their phase timings, and bodies are stored compressed under blobs/ by their hash, so the same response
+# seen many times (token lists, emulator sessions) takes the space of one
+class HttpArchive:
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.index_file = None
+        self.started_at = time.perf_counter()
+        self.blobs: set[str] = set()
+        self.recorded = 0
+
+    @property
+    def index_path(self) -> Path:
+        return self.path / "exchanges.jsonl"
+
+    def blob_path(self, digest: str) -> Path:
+        return self.path / "blobs" / digest[:2] / digest
+
+    def open(self):
+        # a recording always starts a new archive, appending would interleave the exchanges of two runs
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.index_file = open(self.index_path, "wb")
+        self.started_at = time.perf_counter()
+
+    def put_blob(self, content: bytes) -> str | None:
+        digest = content_hash(content)
+
+        if digest is None or digest in self.blobs:
+            return digest
+
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_bytes(zlib.compress(content))
+            os.replace(tmp_path, path)
+
+        self.blobs.add(digest)
+
+        return digest
+
+    def blob(self, digest: str | None) -> bytes:
+        return zlib.decompress(self.blob_path(digest).read_bytes()) if digest else b""
+
+    def add(self, exchange: Exchange):
+        self.index_file.write(exchange.model_dump_json().encode() + b"\n")
+        self.recorded += 1
+
+    def exchanges(self) -> list[Exchange]:
+        with open(self.index_path, "rb") as file:
+            return [Exchange.model_validate_json(line) for line in file if line.strip()]
+
+    def close(self):
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+            logger.info(f"Recorded {self.recorded} HTTP exchanges with {len(self.blobs)} distinct bodies to {self.path}")
+
+
+# Passes requests through to the real transport and saves every exchange to the archive. Sits below TimedTransport,
+# so the phases of the request are measured by a tracer of its own as well
+class RecordingTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, archive: HttpArchive):
+        self.transport = transport
+        self.archive = archive
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        phases = PhaseTimings()
+        started_at = time.perf_counter()
+
+        request.extensions = {**request.extensions,
+                              "trace": RequestTracer(phases, request.extensions.get("trace"))}
+
+        response = await self.transport.handle_async_request(request)
+
+        try:
+            # raw bytes, content encoding is left to the client the same way on replay
+            content = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+
+        phases.total = time.perf_counter() - started_at
+
+        self.archive.add(Exchange(
+            method=request.method,
+            url=str(request.url),
+            request_body=self.archive.put_blob(body),
+            status_code=response.status_code,
+            headers=response.headers.multi_items(),
+            response_body=self.archive.put_blob(content),
+            started_at=started_at - self.archive.started_at,
+            phases=phases,
+        ))
+
+        return httpx.Response(status_code=response.status_code, headers=response.headers,
+                              stream=httpx.ByteStream(content), extensions=response.extensions)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# Answers requests from an archive. A request gets the next recorded exchange with the most specific matching key,
+# in recording order, and starts over once all of them were served. Recorded phases are played back as trace events,
+# so PhaseTimings come out as they were recorded, scaled by latency_scale (0 answers at once)
+class ReplayTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, archive: HttpArchive, latency_scale: float = 1.0):
+        self.archive = archive
+        self.latency_scale = latency_scale
+
+        self.matches: dict[tuple, list[int]] = {}
+        self.cursors: dict[tuple, int] = {}
+        self.bodies: dict[str, bytes] = {}
+        self.served = 0
+        self.missed = 0
+
+        self.exchanges = archive.exchanges()
+
+        for idx, exchange in enumerate(self.exchanges):
+            for key in exchange.keys():
+                self.matches.setdefault(key, []).append(idx)
+
+        logger.info(f"Replaying {len(self.exchanges)} HTTP exchanges from {archive.path}")
+
+    def _match(self, request: httpx.Request, body: bytes) -> Exchange | None:
+        for key in request_keys(request.method, request.url, content_hash(body)):
+            candidates = self.matches.get(key)
+
+            if candidates:
+                cursor = self.cursors.get(key, 0)
+                self.cursors[key] = cursor + 1
+
+                return self.exchanges[candidates[cursor % len(candidates)]]
+
+        return None
+
+    def _body(self, digest: str | None) -> bytes:
+        if digest is None:
+            return b""
+
+        content = self.bodies.get(digest)
+        if content is None:
+            content = self.bodies[digest] = self.archive.blob(digest)
+
+        return content
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        exchange = self._match(request, await request.aread())
+
+        if exchange is None:
+            self.missed += 1
+            raise httpx.ConnectError(f"{request.method} {request.url} is not in the archive", request=request)
+
+        self.served += 1
+        trace = request.extensions.get("trace")
+
+        for phase, started, complete in REPLAY_PHASES:
+            recorded = getattr(exchange.phases, phase)
+            duration = recorded * self.latency_scale
+
+            # phases the recorded request did not go through, e.g. connecting on a kept-alive connection
+            if recorded <= 0 and phase in ("connect", "tls"):
+                continue
+
+            if trace is not None and started is not None:
+                await trace(started, {})
+
+            if duration > 0:
+                await asyncio.sleep(duration)
+
+            if trace is not None:
+                await trace(complete, {})
+
+        return httpx.Response(status_code=exchange.status_code, headers=exchange.headers,
+                              stream=httpx.ByteStream(self._body(exchange.response_body)),
+                              extensions={"http_version": b"HTTP/1.1"})
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,107 @@
+import asyncio
+from typing import Awaitable, Callable, Any
+
+from loguru import logger
+from pydantic import BaseModel
+
+from common.models import BlockchainToken, EmulationSender
+
+
+class BenchmarkPair(BaseModel):
+    index: int
+    input_amount: int
+    output_token: BlockchainToken
+
+
+LaneJob = Callable[[BenchmarkPair, Awaitable[EmulationSender]], Awaitable[Any]]
+LaneSkip = Callable[[BenchmarkPair], bool]
+
+
+# Each lane walks all pairs in order for a single provider configuration with its own concurrency cap,
+# so fast providers never wait for slow ones to finish the same pair. How far lanes drift apart is bounded by the
+# scheduler's window, every lane reaches a pair while its sender and block are still fresh
+class ProviderLane:
+
+    def __init__(self, name: str, job: LaneJob, concurrency: int = 1, skip: LaneSkip | None = None):
+        self.name = name
+        self.job = job
+        self.concurrency = max(1, concurrency)
+        # pairs the lane already has a result for, e.g. from a previous run; their senders are never prepared
+        self.skip = skip
+
+
+class PairScheduler:
+
+    def __init__(self, prepare: Callable[[BenchmarkPair], Awaitable[EmulationSender]], prepare_concurrency: int = 4,
+                 window: int | None = 10):
+        self.prepare = prepare
+        self.prepare_semaphore = asyncio.Semaphore(prepare_concurrency)
+        self.senders: dict[int, asyncio.Task] = {}
+        # a lane starts pair i only once every other lane has started pair i - window, None lets them drift freely
+        self.window = window
+        # index of the next pair every lane starts, the number of pairs once it has started all of them
+        self.positions: list[int] = []
+        self.progress = asyncio.Condition()
+
+    async def _prepare(self, pair: BenchmarkPair) -> EmulationSender:
+        async with self.prepare_semaphore:
+            return await self.prepare(pair)
+
+    def _sender(self, idx: int, pair: BenchmarkPair) -> Awaitable[EmulationSender]:
+        # every lane shares the same sender for a pair, whichever lane reaches it first prepares it
+        task = self.senders.get(idx)
+        if task is None:
+            task = asyncio.create_task(self._prepare(pair))
+            self.senders[idx] = task
+
+        return asyncio.shield(task)
+
+    def _within_window(self, idx: int) -> bool:
+        return self.window is None or min(self.positions) >= idx - self.window
+
+    async def _advance(self, lane_idx: int, position: int):
+        async with self.progress:
+            # workers of a lane may report out of order, a lane never moves back
+            self.positions[lane_idx] = max(self.positions[lane_idx], position)
+            self.progress.notify_all()
+
+    async def _run_lane(self, lane_idx: int, lane: ProviderLane, pairs: list[BenchmarkPair], results: list[list]):
+        todo = [idx for idx, pair in enumerate(pairs) if lane.skip is None or not lane.skip(pair)]
+        skipped = len(pairs) - len(todo)
+        cursor = 0
+
+        await self._advance(lane_idx, todo[0] if todo else len(pairs))
+
+        async def worker():
+            nonlocal cursor
+
+            while cursor < len(todo):
+                if not self._within_window(todo[cursor]):
+                    async with self.progress:
+                        await self.progress.wait_for(lambda: cursor >= len(todo) or self._within_window(todo[cursor]))
+                    continue
+
+                idx = todo[cursor]
+                cursor += 1
+                await self._advance(lane_idx, todo[cursor] if cursor < len(todo) else len(pairs))
+                pair = pairs[idx]
+
+                try:
+                    results[idx][lane_idx] = await lane.job(pair, self._sender(idx, pair))
+                except Exception as e:
+                    logger.error(f"[{lane.name}] Unhandled error for {pair.input_amount} TON -> {pair.output_token.symbol}: "
+                                 f"{e.__class__.__name__} {str(e)}")
+                    results[idx][lane_idx] = e
+
+        await asyncio.gather(*(worker() for _ in range(lane.concurrency)))
+
+        logger.info(f"[{lane.name}] Finished {len(pairs) - skipped} pairs" + (f", skipped {skipped}" if skipped else ""))
+
+    async def run(self, pairs: list[BenchmarkPair], lanes: list[ProviderLane]) -> list[list]:
+        results = [[None] * len(lanes) for _ in pairs]
+        # no lane runs ahead before every lane has reported where it starts
+        self.positions = [0] * len(lanes)
+
+        await asyncio.gather(*(self._run_lane(idx, lane, pairs, results) for idx, lane in enumerate(lanes)))
+
+        return results
@@ -0,0 +1,68 @@
+import asyncio
+import sys
+from pathlib import Path
+from typing import TypeVar
+
+from loguru import logger
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Shard(BaseModel):
+    # zero-based
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        # "i/N"
+        try:
+            index, count = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid shard {value}, expected i/N")
+
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {value}, expected 0 <= i < N")
+
+        return cls(index=index, count=count)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    def select(self, items: list[T]) -> list[T]:
+        # every N-th item, so the shards get a similar mix of popular and long tail jettons
+        return items[self.index::self.count]
+
+    def with_shard(self, path: str | Path) -> Path:
+        # results/journal.jsonl -> results/journal.shard-0-of-4.jsonl
+        path = Path(path)
+
+        return path.with_name(f"{path.stem}.shard-{self.index}-of-{self.count}{path.suffix}")
+
+
+def shards(count: int) -> list[Shard]:
+    return [Shard(index=index, count=count) for index in range(count)]
+
+
+async def launch_shards(script: str, args: list[str], count: int, run_id: str) -> list[int]:
+    # runs the benchmark once per shard in its own process, all of them under the same run id; later options win
+    # in optparse, so the shard options override whatever args already hold
+    async def run(shard: Shard) -> int:
+        process = await asyncio.create_subprocess_exec(sys.executable, script, *args,
+                                                       "--shard", str(shard), "--run-id", run_id)
+        logger.info(f"Started shard {shard} (pid {process.pid})")
+
+        try:
+            code = await process.wait()
+        except asyncio.CancelledError:
+            process.terminate()
+            await process.wait()
+            raise
+
+        log = logger.info if code == 0 else logger.error
+        log(f"Shard {shard} finished with exit code {code}")
+
+        return code
+
+    return list(await asyncio.gather(*(run(shard) for shard in shards(count))))
@@ -0,0 +1,131 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from pydantic import BaseModel
+
+NS = 1e9
+
+
+class PhaseTimings(BaseModel):
+    # waiting for a pooled connection, including our own connection limits
+    queue: float = 0
+    dns: float = 0
+    connect: float = 0
+    tls: float = 0
+    send: float = 0
+    # time to first byte once the request is sent
+    wait: float = 0
+    download: float = 0
+    # whole provider call, JSON parsing and provider code are whatever is not covered by the phases above
+    total: float = 0
+    requests: int = 0
+    connections: int = 0
+
+    @property
+    def network(self) -> float:
+        return self.dns + self.connect + self.tls + self.send + self.wait + self.download
+
+    @property
+    def processing(self) -> float:
+        return max(0.0, self.total - self.queue - self.network)
+
+
+CURRENT_TIMINGS: ContextVar[PhaseTimings | None] = ContextVar("current_timings", default=None)
+
+# httpcore trace event -> phase, the phase lasts from "<event>.started" to "<event>.complete"
+TRACE_PHASES = {
+    "connection.connect_tcp": "connect",
+    "connection.start_tls": "tls",
+    "http11.send_request_headers": "send",
+    "http11.send_request_body": "send",
+    "http11.receive_response_body": "download",
+    "http2.send_request_headers": "send",
+    "http2.send_request_body": "send",
+    "http2.receive_response_body": "download",
+}
+
+FIRST_BYTE_EVENTS = {"http11.receive_response_headers.complete", "http2.receive_response_headers.complete"}
+WAIT_START_EVENTS = {"http11.send_request_body.complete", "http2.send_request_body.complete"}
+
+
+class RequestTracer:
+
+    def __init__(self, timings: PhaseTimings, parent=None):
+        self.timings = timings
+        self.parent = parent
+        self.started_at = time.perf_counter_ns()
+        self.queued = True
+        self.phase_started: dict[str, int] = {}
+        self.dns_before_connect = 0.0
+
+    def add(self, phase: str, duration_ns: int):
+        setattr(self.timings, phase, getattr(self.timings, phase) + duration_ns / NS)
+
+    async def __call__(self, event: str, info: dict):
+        now = time.perf_counter_ns()
+
+        if self.queued and event.endswith(".started"):
+            # the first thing httpcore does with a connection ends the wait for it
+            self.queued = False
+            self.add("queue", now - self.started_at)
+
+        name, _, stage = event.rpartition(".")
+        phase = TRACE_PHASES.get(name)
+
+        if event == "connection.connect_tcp.started":
+            self.dns_before_connect = self.timings.dns
+        elif event == "connection.connect_tcp.complete":
+            self.timings.connections += 1
+            # the network backend resolves the host inside connect_tcp and records it as dns already
+            self.add("connect", -round((self.timings.dns - self.dns_before_connect) * NS))
+
+        if event in WAIT_START_EVENTS:
+            self.phase_started["wait"] = now
+        elif event in FIRST_BYTE_EVENTS and "wait" in self.phase_started:
+            self.add("wait", now - self.phase_started.pop("wait"))
+
+        if phase is not None:
+            if stage == "started":
+                self.phase_started[name] = now
+            elif name in self.phase_started:
+                self.add(phase, now - self.phase_started.pop(name))
+
+        if self.parent is not None:
+            await self.parent(event, info)
+
+
+# Transport wrapper attributing httpcore phases of every request to the PhaseTimings active in the current context
+class TimedTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timings = CURRENT_TIMINGS.get()
+
+        if timings is None:
+            return await self.transport.handle_async_request(request)
+
+        timings.requests += 1
+        request.extensions = {**request.extensions,
+                              "trace": RequestTracer(timings, request.extensions.get("trace"))}
+
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+@contextmanager
+def record_phases():
+    timings = PhaseTimings()
+    token = CURRENT_TIMINGS.set(timings)
+    started_at = time.perf_counter_ns()
+
+    try:
+        yield timings
+    finally:
+        timings.total = (time.perf_counter_ns() - started_at) / NS
+        CURRENT_TIMINGS.reset(token)
@@ -0,0 +1,261 @@
+import asyncio
+import importlib.util
+import socket
+import time
+import typing
+from contextlib import contextmanager
+
+import httpcore
+import httpx
+from loguru import logger
+
+from common.replay import HttpArchive, RecordingTransport, ReplayTransport
+from common.timing import CURRENT_TIMINGS, TimedTransport, NS
+
+# HTTP/2 is negotiated per host over ALPN, it needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# warm: connections are opened before the benchmark and kept alive across pairs, so timings are steady-state.
+# cold: every request resolves the host and opens a new connection, so timings include DNS, TCP and TLS setup
+CONNECTION_MODES = ("warm", "cold")
+
+KEEPALIVE_EXPIRY = 120
+
+
+# Network backend resolving hosts once per ttl instead of on every new connection. Resolution time is
+# attributed to the dns phase of the PhaseTimings active in the current context
+class CachedDnsBackend(httpcore.AsyncNetworkBackend):
+
+    def __init__(self, ttl: float = 300, backend: httpcore.AsyncNetworkBackend | None = None):
+        self.ttl = ttl
+        self.backend = backend or httpcore.AnyIOBackend()
+
+        self.addresses: dict[tuple[str, int], tuple[list[str], float]] = {}
+        self.inflight: dict[tuple[str, int], asyncio.Task] = {}
+
+    async def _lookup(self, host: str, port: int) -> list[str]:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        finally:
+            self.inflight.pop((host, port), None)
+
+        # keep the resolver's order, it already prefers the address family that is likely to work
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+
+        if self.ttl > 0:
+            self.addresses[(host, port)] = (addresses, time.monotonic() + self.ttl)
+
+        return addresses
+
+    async def resolve(self, host: str, port: int) -> list[str]:
+        entry = self.addresses.get((host, port))
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        # connections opened at the same time share a single lookup
+        task = self.inflight.get((host, port))
+        if task is None:
+            task = asyncio.create_task(self._lookup(host, port))
+            self.inflight[(host, port)] = task
+
+        started_at = time.perf_counter_ns()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            timings = CURRENT_TIMINGS.get()
+            if timings is not None:
+                timings.dns += (time.perf_counter_ns() - started_at) / NS
+
+    def forget(self, host: str, port: int):
+        self.addresses.pop((host, port), None)
+
+    async def connect_tcp(
+            self,
+            host: str,
+            port: int,
+            timeout: float | None = None,
+            local_address: str | None = None,
+            socket_options: typing.Iterable[httpcore.SOCKET_OPTION] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        error = None
+        for address in addresses:
+            try:
+                # TLS still uses the original host name for SNI and certificate checks
+                return await self.backend.connect_tcp(address, port, timeout=timeout,
+                                                      local_address=local_address, socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+
+        # the host may have moved, resolve it again next time
+        self.forget(host, port)
+
+        if error is None:
+            raise httpcore.ConnectError(f"No addresses found for {host}")
+
+        raise error
+
+    async def connect_unix_socket(
+            self,
+            path: str,
+            timeout: float | None = None,
+            socket_options: typing.Iterable[httpcore.SOCKET_OPTION] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+# httpcore errors raised by the pool, mapped to their httpx counterparts; the most specific match wins
+HTTPCORE_ERRORS: dict[type[Exception], type[httpx.TransportError]] = {
+    httpcore.TimeoutException: httpx.TimeoutException,
+    httpcore.ConnectTimeout: httpx.ConnectTimeout,
+    httpcore.ReadTimeout: httpx.ReadTimeout,
+    httpcore.WriteTimeout: httpx.WriteTimeout,
+    httpcore.PoolTimeout: httpx.PoolTimeout,
+    httpcore.NetworkError: httpx.NetworkError,
+    httpcore.ConnectError: httpx.ConnectError,
+    httpcore.ReadError: httpx.ReadError,
+    httpcore.WriteError: httpx.WriteError,
+    httpcore.ProxyError: httpx.ProxyError,
+    httpcore.UnsupportedProtocol: httpx.UnsupportedProtocol,
+    httpcore.ProtocolError: httpx.ProtocolError,
+    httpcore.LocalProtocolError: httpx.LocalProtocolError,
+    httpcore.RemoteProtocolError: httpx.RemoteProtocolError,
+}
+
+
+@contextmanager
+def httpcore_errors():
+    try:
+        yield
+    except Exception as e:
+        mapped = None
+        for error, to in HTTPCORE_ERRORS.items():
+            if isinstance(e, error) and (mapped is None or issubclass(to, mapped)):
+                mapped = to
+
+        if mapped is None:
+            raise
+
+        raise mapped(str(e)) from e
+
+
+class PoolResponseStream(httpx.AsyncByteStream):
+
+    def __init__(self, stream: typing.AsyncIterable[bytes]):
+        self.stream = stream
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        with httpcore_errors():
+            async for chunk in self.stream:
+                yield chunk
+
+    async def aclose(self):
+        if hasattr(self.stream, "aclose"):
+            await self.stream.aclose()
+
+
+# httpx does not take a network backend, so requests go straight to an httpcore pool built around ours
+class PoolTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+
+        with httpcore_errors():
+            response = await self.pool.handle_async_request(core_request)
+
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=PoolResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.pool.aclose()
+
+
+def create_transport(limits: httpx.Limits, backend: httpcore.AsyncNetworkBackend,
+                     http2: bool = True) -> PoolTransport:
+    return PoolTransport(httpcore.AsyncConnectionPool(
+        ssl_context=httpx.create_ssl_context(),
+        max_connections=limits.max_connections,
+        max_keepalive_connections=limits.max_keepalive_connections,
+        keepalive_expiry=limits.keepalive_expiry,
+        http1=True,
+        http2=http2 and HTTP2_AVAILABLE,
+        network_backend=backend,
+    ))
+
+
+# One client with a separate connection pool per host, so a slow or throttled provider never holds
+# connections another provider is waiting for.
+# With an archive, exchanges are recorded to it or, in replay mode, answered from it without any connections
+def create_client(hosts: typing.Iterable[str], timeout: httpx.Timeout, max_connections: int = 100,
+                  mode: str = "warm", http2: bool = True, archive: HttpArchive | None = None,
+                  archive_mode: str = "record", latency_scale: float = 1.0) -> httpx.AsyncClient:
+    if mode not in CONNECTION_MODES:
+        raise ValueError(f"Unknown connection mode: {mode}")
+
+    if archive is not None and archive_mode == "replay":
+        # a single transport for every host, replay order is kept across all of them
+        return httpx.AsyncClient(timeout=timeout, transport=TimedTransport(ReplayTransport(archive, latency_scale)))
+
+    warm = mode == "warm"
+    backend = CachedDnsBackend(ttl=300 if warm else 0)
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections if warm else 0,
+                          keepalive_expiry=KEEPALIVE_EXPIRY if warm else 0)
+
+    def transport():
+        if archive is not None:
+            return TimedTransport(RecordingTransport(create_transport(limits, backend, http2), archive))
+
+        return TimedTransport(create_transport(limits, backend, http2))
+
+    return httpx.AsyncClient(
+        timeout=timeout,
+        transport=transport(),
+        mounts={f"all://{host}": transport() for host in sorted(set(hosts))},
+    )
+
+
+async def _open_connection(client: httpx.AsyncClient, host: str) -> bool:
+    try:
+        # any response means the connection is up, the status does not matter
+        await client.head(f"https://{host}/")
+        return True
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to pre-warm connection to {host}: {e.__class__.__name__} {str(e)}")
+        return False
+
+
+async def prewarm(client: httpx.AsyncClient, hosts: dict[str, int]):
+    # hosts maps a host to the number of connections to open, concurrent requests each take a connection of their own
+    started_at = time.perf_counter()
+
+    opened = await asyncio.gather(*(_open_connection(client, host)
+                                    for host, connections in hosts.items() for _ in range(connections)))
+
+    logger.info(f"Pre-warmed {sum(opened)}/{len(opened)} connections to {len(hosts)} hosts "
+                f"in {time.perf_counter() - started_at:.2f} seconds")
@@ -1,48 +1,124 @@
+import asyncio
+from functools import lru_cache
+
+import httpx
 from httpx import AsyncClient
-from pytoniq_core import Address
+from loguru import logger
 
+from common.cache import JsonFileCache
+from common.limiter import RateLimiter, RateLimit
 
-def address_to_raw(address: str) -> str:
-    if address == "native":
-        return "native"
-    return Address(address).to_str(is_user_friendly=False)
+ADDRESS_CACHE_SIZE = 16384
+TONAPI_LIMITER = RateLimiter("tonapi", RateLimit(rate=1, burst=1, max_concurrency=4))
+JETTON_WALLETS = JsonFileCache("jetton_wallets")
+TOKEN_METADATA = JsonFileCache("token_metadata", ttl=24 * 60 * 60)
 
+NATIVE_METADATA = {
+    "name": "TON",
+    "symbol": "TON",
+    "decimals": 9,
+    "listed": True
+}
 
-def address_to_friendly(address: str) -> str:
+
+class AddressForms:
+    __slots__ = ("raw", "bounceable", "non_bounceable")
+
+    def __init__(self, raw: str, bounceable: str, non_bounceable: str):
+        self.raw = raw
+        self.bounceable = bounceable
+        self.non_bounceable = non_bounceable
+
+    @property
+    def is_native(self) -> bool:
+        return self.raw == "native"
+
+    def friendly_or(self, native: str) -> str:
+        # providers name native TON differently ("TON", "ton", zero address...)
+        return native if self.is_native else self.bounceable
+
+    @property
+    def jetton_asset(self) -> str:
+        return "native" if self.is_native else f"jetton:{self.raw}"
+
+
+NATIVE_FORMS = AddressForms("native", "native", "native")
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def address_forms(address: str) -> AddressForms:
     if address == "native":
-        return "native"
+        return NATIVE_FORMS
+
+    # pytoniq_core is imported by the first lookup, runs that never parse an address do not load it
+    from pytoniq_core import Address
+
+    parsed = Address(address)
+
+    return AddressForms(
+        raw=parsed.to_str(is_user_friendly=False),
+        bounceable=parsed.to_str(is_user_friendly=True, is_bounceable=True, is_url_safe=True),
+        non_bounceable=parsed.to_str(is_user_friendly=True, is_bounceable=False, is_url_safe=True),
+    )
+
+
+def warm_address_forms(addresses: list[str]):
+    for address in addresses:
+        forms = address_forms(address)
+
+        # the other forms come back from provider APIs, so they are cached too
+        address_forms(forms.raw)
+        address_forms(forms.bounceable)
+        address_forms(forms.non_bounceable)
+
+
+def address_to_raw(address: str) -> str:
+    return address_forms(address).raw
 
-    return Address(address).to_str(is_user_friendly=True, is_bounceable=True, is_url_safe=True)
+
+def address_to_friendly(address: str) -> str:
+    return address_forms(address).bounceable
 
 async def get_latest_mc_seqno(client: AsyncClient) -> int:
-    response = await client.get("https://tonapi.io/v2/blockchain/masterchain-head")
-    response.raise_for_status()
+    async with TONAPI_LIMITER.slot():
+        response = await client.get("https://tonapi.io/v2/blockchain/masterchain-head")
+        response.raise_for_status()
 
     data = response.json()
 
     return data["seqno"]
 
 async def get_jetton_wallet_address(client: AsyncClient, user: str, jetton_master: str):
-    response = await client.get(f"https://tonapi.io/v2/blockchain/accounts/{address_to_raw(jetton_master)}/methods/get_wallet_address?args={address_to_raw(user)}")
-    response.raise_for_status()
+    owner = address_to_raw(user)
+    master = address_to_raw(jetton_master)
 
-    data = response.json()
+    async def fetch():
+        async with TONAPI_LIMITER.slot():
+            response = await client.get(f"https://tonapi.io/v2/blockchain/accounts/{master}/methods/get_wallet_address?args={owner}")
+            response.raise_for_status()
 
-    return data["decoded"]["jetton_wallet_address"]
+        data = response.json()
 
-async def get_token_metadata(client: AsyncClient, token_address: str):
-    if token_address == "native":
-        return {
-            "name": "TON",
-            "symbol": "TON",
-            "decimals": 9,
-            "listed": True
-        }
-    response = await client.get(f"https://tokens.swap.coffee/api/v2/tokens/address/{token_address}")
-    response.raise_for_status()
+        return data["decoded"]["jetton_wallet_address"]
 
-    data = response.json()
+    # wallet address is fixed for (owner, master), so it is resolved once and persisted between runs
+    return await JETTON_WALLETS.get_or_fetch(f"{owner}:{master}", fetch)
 
+async def prefetch_jetton_wallets(client: AsyncClient, user: str, jetton_masters: list[str], concurrency: int = 4):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def prefetch(jetton_master: str):
+        async with semaphore:
+            try:
+                await get_jetton_wallet_address(client, user, jetton_master)
+            except (httpx.HTTPError, KeyError) as e:
+                logger.warning(f"Failed to prefetch jetton wallet for {jetton_master}: {e.__class__.__name__} {str(e)}")
+
+    await asyncio.gather(*(prefetch(jetton_master) for jetton_master in jetton_masters))
+
+    JETTON_WALLETS.save()
+
+def _token_metadata(data: dict) -> dict:
     return {
         "name": data["name"],
         "symbol": data["symbol"],
@@ -50,6 +126,29 @@ async def get_token_metadata(client: AsyncClient, token_address: str):
         "listed": True
     }
 
+def remember_token_metadata(token_address: str, data: dict | None):
+    if token_address == "native":
+        return
+
+    from pytoniq_core import AddressError
+
+    try:
+        TOKEN_METADATA.set(address_to_raw(token_address), _token_metadata(data))
+    except (KeyError, TypeError, AddressError) as e:
+        logger.debug(f"Skipping metadata for {token_address}: {e.__class__.__name__} {str(e)}")
+
+async def get_token_metadata(client: AsyncClient, token_address: str):
+    if token_address == "native":
+        return NATIVE_METADATA
+
+    async def fetch():
+        response = await client.get(f"https://tokens.swap.coffee/api/v2/tokens/address/{token_address}")
+        response.raise_for_status()
+
+        return _token_metadata(response.json())
+
+    return await TOKEN_METADATA.get_or_fetch(address_to_raw(token_address), fetch)
+
 async def normalize_token_amount(client: AsyncClient, token_address: str, amount: int):
     if token_address == "native":
         return amount / 1e9
@@ -57,3 +156,7 @@ async def normalize_token_amount(client: AsyncClient, token_address: str, amount
     metadata = await get_token_metadata(client, token_address)
 
     return amount / 10 ** int(metadata["decimals"])
+
+def save_caches():
+    JETTON_WALLETS.save()
+    TOKEN_METADATA.save()
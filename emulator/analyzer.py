@@ -0,0 +1,99 @@
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel
+
+from emulator.trace import TraceTransaction
+
+if TYPE_CHECKING:
+    from emulator.models import TransactionModel
+
+JETTON_INTERNAL_TRANSFER = "jetton_internal_transfer"
+
+# message bodies that start a swap on a pool
+SWAP_BODY_DEXES = {
+    "dedust_swap": "dedust",
+    "dedust_swap_peer": "dedust",
+    "stonfi_swap": "stonfi",
+    "stonfi_v2_swap": "stonfi_v2",
+}
+
+PAYOUT_OP_CODES = [
+    "0x474f86cf" # dedust payout
+    "0x01f3835d" # pton transfer
+]
+
+
+class SwapHop(BaseModel):
+    dex: str
+    account: str
+    depth: int
+    exit_code: int | None
+    fees: int
+
+
+class DexBreakdown(BaseModel):
+    hops: int = 0
+    failed: int = 0
+    fees: int = 0
+
+
+class TraceAnalysis(BaseModel):
+    output: int = 0
+    excesses: int = 0
+    gas: int = 0
+    hops: list[SwapHop] = []
+    dexes: dict[str, DexBreakdown] = {}
+
+    @property
+    def gas_used(self) -> int:
+        return max(0, self.gas - self.excesses)
+
+    def merge(self, other: "TraceAnalysis"):
+        self.output += other.output
+        self.excesses += other.excesses
+        self.gas += other.gas
+        self.hops.extend(other.hops)
+
+        for dex, breakdown in other.dexes.items():
+            total = self.dexes.setdefault(dex, DexBreakdown())
+            total.hops += breakdown.hops
+            total.failed += breakdown.failed
+            total.fees += breakdown.fees
+
+
+def analyze_trace(root: "TransactionModel | TraceTransaction", sender_raw: str, jetton_wallet_raw: str,
+                  swap_input_amount: int) -> TraceAnalysis:
+    analysis = TraceAnalysis(hops=[], dexes={})
+    analysis.gas = root.in_msg.value - swap_input_amount
+
+    stack = [(root, 0)]
+
+    while stack:
+        model, depth = stack.pop()
+        stack.extend((child, depth + 1) for child in model.children or ())
+
+        in_msg = model.in_msg
+        if in_msg is None:
+            continue
+
+        body_type = in_msg.decoded_body.type if in_msg.decoded_body is not None else None
+        exit_code = model.compute_phase.exit_code if model.compute_phase is not None else None
+
+        if body_type == JETTON_INTERNAL_TRANSFER and in_msg.dest == jetton_wallet_raw:
+            analysis.output += in_msg.decoded_body.amount
+
+        # FIXME: stonfi v2 routers can refund tons without non-zero exit codes..
+        if in_msg.dest == sender_raw and exit_code == 0 and in_msg.decoded_op not in PAYOUT_OP_CODES:
+            analysis.excesses += in_msg.value
+
+        dex = SWAP_BODY_DEXES.get(body_type)
+        if dex is not None:
+            analysis.hops.append(SwapHop(dex=dex, account=model.account, depth=depth, exit_code=exit_code,
+                                         fees=model.total_fees))
+
+            breakdown = analysis.dexes.setdefault(dex, DexBreakdown())
+            breakdown.hops += 1
+            breakdown.failed += exit_code != 0
+            breakdown.fees += model.total_fees
+
+    return analysis
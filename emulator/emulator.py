@@ -1,18 +1,22 @@
-import random
-import string
-from typing import Callable
+import asyncio
+from typing import Any, TYPE_CHECKING
 
 from httpx import AsyncClient
 from pydantic import BaseModel
-from pytoniq import Contract
-from pytoniq_core import Address, Cell
 
-from emulator.models import EmulatorResult, TransactionModel, InternalMsgBodyExcess, \
-    InternalMsgBodyJettonInternalTransfer
+from common.offload import run_cpu
+from common.util import address_to_raw
+from emulator.analyzer import TraceAnalysis, analyze_trace
+from emulator.trace import TraceResult, decode_trace
+
+if TYPE_CHECKING:
+    from emulator.models import EmulatorResult
 
 BASE_URL = f"https://tvm.swap.coffee/api"
-JettonInternalTransfer = InternalMsgBodyJettonInternalTransfer
-Excesses = InternalMsgBodyExcess
+# full pydantic validation of traces is slow, by default only the fields used for the analysis are decoded
+VALIDATE_TRACES = False
+# max splits of a single route emulated at the same time
+SPLIT_CONCURRENCY = 8
 
 
 class EmulationRequest(BaseModel):
@@ -31,16 +35,45 @@ class UnsignedMessage(BaseModel):
 
 class EmulatedTransaction(BaseModel):
     message: UnsignedMessage
-    emulation_result: EmulatorResult
+    # EmulatorResult or TraceResult, left unchecked so the full schema in emulator.models is only imported
+    # by runs that validate traces
+    emulation_result: Any
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+def set_trace_validation(enabled: bool):
+    global VALIDATE_TRACES
+    VALIDATE_TRACES = enabled
+
+    if enabled:
+        # building the schema takes a while, it should not be timed as part of the first emulation
+        import emulator.models  # noqa: F401
 
 
-async def emulate_to_trace(client: AsyncClient, request: EmulationRequest, session_id: str) -> EmulatorResult:
+def preload_message_builder():
+    # the lazy pytoniq import of build_message_boc, done up front by runs that emulate so no emulation is timed with it
+    import pytoniq  # noqa: F401
+
+
+async def emulate_to_trace(client: AsyncClient, request: EmulationRequest, session_id: str,
+                           validate: bool | None = None) -> "EmulatorResult | TraceResult":
     response = await client.post(f"{BASE_URL}/v1/emulate/trace", json=request.model_dump(),
                                  params={"session_id": session_id})
 
     response.raise_for_status()
 
-    return EmulatorResult.model_validate(response.json())
+    return await run_cpu(parse_trace, response.content, validate if validate is not None else VALIDATE_TRACES)
+
+
+def parse_trace(content: bytes, validate: bool) -> "EmulatorResult | TraceResult":
+    if validate:
+        from emulator.models import EmulatorResult
+
+        return EmulatorResult.model_validate_json(content)
+
+    return decode_trace(content)
 
 
 async def create_session(client: AsyncClient, mc_block_seqno: int) -> str:
@@ -50,84 +83,67 @@ async def create_session(client: AsyncClient, mc_block_seqno: int) -> str:
     return response.json()["session_id"]
 
 
-async def emulate_internal_messages(provider_name: str, client: AsyncClient, messages: list[UnsignedMessage], session_id: str) -> list[
-    EmulatedTransaction]:
-    results = []
-
-    for message in messages:
-        msg = Contract.create_internal_msg(
-            src=Address(message.src),
-            dest=Address(message.dest),
-            value=message.value,
-            body=Cell.one_from_boc(message.body)
-        )
-
-        msg_cell = msg.serialize().to_boc().hex()
-
-        request = EmulationRequest(boc=msg_cell, format="hex")
+def build_message_boc(src: str, dest: str, value: int, body: str) -> str:
+    # pytoniq pulls in the whole lite client, it is imported by the first message instead of every run
+    from pytoniq import Contract
+    from pytoniq_core import Address, Cell
 
-        result = await emulate_to_trace(client, request, session_id)
+    msg = Contract.create_internal_msg(
+        src=Address(src),
+        dest=Address(dest),
+        value=value,
+        body=Cell.one_from_boc(body)
+    )
 
-        results.append(EmulatedTransaction(message=message, emulation_result=result))
+    return msg.serialize().to_boc().hex()
 
-    return results
 
-def traverse(
-        model: TransactionModel,
-        func: Callable[[TransactionModel], None],
-):
-    func(model)
-    for child in model.children:
-        traverse(child, func)
+async def emulate_message(client: AsyncClient, message: UnsignedMessage, session_id: str) -> EmulatedTransaction:
+    msg_cell = await run_cpu(build_message_boc, message.src, message.dest, message.value, message.body)
 
-def find_messages_by_body(model: TransactionModel, body_type: type) -> list[TransactionModel]:
-    result = []
-    if isinstance(model.in_msg.decoded_body, body_type):
-        result.append(model.in_msg)
-    for child in model.children:
-        result.extend(find_messages_by_body(child, body_type))
+    request = EmulationRequest(boc=msg_cell, format="hex")
 
-    return result
+    result = await emulate_to_trace(client, request, session_id)
 
+    return EmulatedTransaction(message=message, emulation_result=result)
 
-async def get_total_swap_output(results: list[EmulatedTransaction]):
-    total_output = 0
-    total_excesses = 0
-    total_gas = 0
 
-    payout_op_codes = [
-        "0x474f86cf" # dedust payout
-        "0x01f3835d" # pton transfer
-    ]
+async def emulate_internal_messages(provider_name: str, client: AsyncClient, messages: list[UnsignedMessage],
+                                    session_id: str | list[str], concurrency: int = SPLIT_CONCURRENCY) -> list[
+    EmulatedTransaction]:
+    if isinstance(session_id, str):
+        # splits share one session, each of them sees the state left by the previous ones
+        return [await emulate_message(client, message, session_id) for message in messages]
 
-    for result in results:
-        sender_raw = Address(result.message.src).to_str(is_user_friendly=False)
-        jetton_wallet_raw = Address(result.message.jetton_wallet).to_str(is_user_friendly=False)
-        emulation_result = result.emulation_result.result
+    # one session per split, splits are independent and can be emulated at the same time
+    semaphore = asyncio.Semaphore(concurrency)
 
-        internal_transfers = find_messages_by_body(emulation_result, JettonInternalTransfer)
+    async def emulate(message: UnsignedMessage, message_session_id: str) -> EmulatedTransaction:
+        async with semaphore:
+            return await emulate_message(client, message, message_session_id)
 
-        total_gas += emulation_result.in_msg.value - result.message.swap_input_amount
+    return list(await asyncio.gather(*(emulate(message, message_session_id)
+                                       for message, message_session_id in zip(messages, session_id, strict=True))))
 
-        for internal_transfer in internal_transfers:
-            if internal_transfer.dest == jetton_wallet_raw:
 
-                total_output += internal_transfer.decoded_body.amount
+async def analyze_swap(results: list[EmulatedTransaction]) -> TraceAnalysis:
+    total = TraceAnalysis(hops=[], dexes={})
 
-        def collect_value(model: TransactionModel):
-            nonlocal total_excesses
+    for result in results:
+        sender_raw = address_to_raw(result.message.src)
+        jetton_wallet_raw = address_to_raw(result.message.jetton_wallet)
 
-            # FIXME: stonfi v2 routers can refund tons without non-zero exit codes..
+        total.merge(analyze_trace(result.emulation_result.result, sender_raw, jetton_wallet_raw,
+                                  result.message.swap_input_amount))
 
-            if model.in_msg.dest == sender_raw and model.compute_phase.exit_code == 0 and model.in_msg.decoded_op not in payout_op_codes:
-                total_excesses += model.in_msg.value
+    return total
 
-        traverse(emulation_result, collect_value)
 
+async def get_total_swap_output(results: list[EmulatedTransaction]):
+    analysis = await analyze_swap(results)
 
-    gas_used = total_gas - total_excesses
+    return analysis.output, analysis.gas_used
 
-    return total_output, max(0, gas_used)
 #
 # async def test():
 #     client = AsyncClient()
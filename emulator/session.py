@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import time
+
+from httpx import AsyncClient
+from loguru import logger
+
+from common.limiter import HELD_SLOTS
+from common.models import EMULATOR_LIMITER
+from emulator.emulator import create_session, UnsignedMessage, EmulatedTransaction, emulate_internal_messages
+
+# emulate splits of a route in separate sessions at the same time, instead of one after another in a single session.
+# Off by default: splits routed through the same pool would no longer see each other's price impact
+PARALLEL_SPLITS = False
+
+
+def set_parallel_splits(enabled: bool):
+    global PARALLEL_SPLITS
+    PARALLEL_SPLITS = enabled
+
+
+class SessionStats:
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.expired = 0
+
+    def __str__(self):
+        return f"hits={self.hits} misses={self.misses} created={self.created} expired={self.expired}"
+
+
+# Emulator sessions keyed by masterchain seqno.
+# In shared mode every route emulated on the same seqno reuses one session. Otherwise each route gets a fresh
+# session of its own, taken from the sessions created ahead of demand with warm() when there are any.
+# Sessions are created on the emulator limiter, the same budget the emulations themselves use
+class EmulationSessionPool:
+
+    def __init__(self, shared: bool = False, ttl: float = 120):
+        self.shared = shared
+        self.ttl = ttl
+        self.stats = SessionStats()
+
+        self.sessions: dict[int, list[tuple[asyncio.Task, float]]] = {}
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+
+        for seqno, sessions in list(self.sessions.items()):
+            alive = [(task, created_at) for task, created_at in sessions
+                     if created_at >= deadline or not task.done()]
+            self.stats.expired += len(sessions) - len(alive)
+
+            if alive:
+                self.sessions[seqno] = alive
+            else:
+                del self.sessions[seqno]
+
+    async def _create(self, client: AsyncClient, seqno: int) -> str:
+        async with EMULATOR_LIMITER.slot():
+            session_id = await create_session(client, seqno)
+        self.stats.created += 1
+
+        return session_id
+
+    def _spawn(self, client: AsyncClient, seqno: int, detached: bool = False) -> asyncio.Task:
+        context = contextvars.copy_context()
+        if detached:
+            # a session created ahead of demand is not part of the task warming it, it takes an emulator slot of its own
+            context.run(HELD_SLOTS.set, frozenset())
+
+        task = asyncio.create_task(self._create(client, seqno), context=context)
+        # failures are reported to whoever takes the session, this only silences "exception never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        return task
+
+    def _register(self, seqno: int, task: asyncio.Task):
+        self.sessions.setdefault(seqno, []).append((task, time.monotonic()))
+
+    def warm(self, client: AsyncClient, seqno: int, count: int):
+        self._expire()
+
+        if self.shared:
+            count = 0 if self.sessions.get(seqno) else 1
+
+        for _ in range(count):
+            self._register(seqno, self._spawn(client, seqno, detached=True))
+
+    async def acquire(self, client: AsyncClient, seqno: int, isolated: bool = False) -> str:
+        self._expire()
+
+        shared = self.shared and not isolated
+        sessions = self.sessions.get(seqno)
+        # a shared session is never handed out as an isolated one
+        hit = bool(sessions) and self.shared == shared
+
+        if hit:
+            task = sessions[0][0] if shared else sessions.pop(0)[0]
+        else:
+            task = self._spawn(client, seqno)
+            if shared:
+                self._register(seqno, task)
+
+        try:
+            session_id = await asyncio.shield(task)
+        except Exception as e:
+            if shared:
+                # never keep a failed session around, the next route will create a new one
+                self.sessions.pop(seqno, None)
+
+            if not hit:
+                raise
+
+            logger.warning(f"Pre-created emulation session for block {seqno} failed: {e.__class__.__name__} {str(e)}")
+            self.stats.misses += 1
+
+            return await self._create(client, seqno)
+
+        if hit:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+
+        return session_id
+
+
+SESSION_POOL = EmulationSessionPool()
+
+
+async def emulate_on_block(provider_name: str, client: AsyncClient, messages: list[UnsignedMessage],
+                           mc_block_seqno: int, parallel: bool | None = None) -> list[EmulatedTransaction]:
+    if parallel is None:
+        parallel = PARALLEL_SPLITS
+
+    if parallel and len(messages) > 1:
+        session_ids = await asyncio.gather(*(SESSION_POOL.acquire(client, mc_block_seqno, isolated=True)
+                                             for _ in messages))
+
+        return await emulate_internal_messages(provider_name, client, messages, list(session_ids))
+
+    session_id = await SESSION_POOL.acquire(client, mc_block_seqno)
+
+    return await emulate_internal_messages(provider_name, client, messages, session_id)
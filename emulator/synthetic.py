@@ -0,0 +1,315 @@
+import json
+import random
+from typing import IO, Iterator
+
+from pydantic import BaseModel
+
+# Synthetic emulator traces shaped like emulator.models.EmulatorResult, for benchmarking and fuzzing the trace parsing
+# and the swap output analysis on inputs the live emulator rarely or never produces.
+# A trace starts at the router receiving the swap message and fans out into `splits` chains of `hops` swaps each.
+# Every hop may send `fanout` side messages (fees, referral payouts) and an excess back to the sender, and may fail
+# and bounce; a chain that gets through pays its output to the jetton wallet of the sender.
+# Nodes are produced lazily, so write_trace() streams traces of any size to disk in memory bound by their depth
+
+DEXES = ("dedust", "stonfi", "stonfi_v2")
+
+# none: nothing is returned to the sender, final: one excess once a chain pays out, every_hop: every hop returns one
+EXCESS_PATTERNS = ("none", "final", "every_hop")
+
+OP_CODES = {
+    "comment": "0x00000000",
+    "excess": "0xd53276db",
+    "jetton_internal_transfer": "0x178d4519",
+    "jetton_transfer_notification": "0x7362d09c",
+    "dedust_swap": "0xea06185d",
+    "dedust_swap_peer": "0x72aca8aa",
+    "stonfi_swap": "0x25938561",
+    "stonfi_v2_swap": "0x6664de2a",
+    "bounced": "0xffffffff",
+}
+
+# exit codes of failed swaps, e.g. slippage exceeded or out of gas
+BOUNCE_EXIT_CODES = (9, 13, 65535)
+
+NOW = 1_700_000_000
+
+
+def address(index: int) -> str:
+    # raw form, building it does not need pytoniq
+    return f"0:{index:064x}"
+
+
+class TraceShape(BaseModel):
+    hops: int = 2
+    fanout: int = 0
+    splits: int = 1
+    # relative weights of the dexes hops go through
+    dexes: dict[str, float] = {dex: 1 for dex in DEXES}
+    # probability that a hop fails, its chain ends with a bounce
+    bounce_rate: float = 0
+    excess: str = "final"
+    input_amount: int = 10 ** 9
+    gas: int = 300_000_000
+    # output of a hop per unit of its input
+    rate: float = 0.997
+    seed: int = 0
+    sender: str = address(1)
+    jetton_wallet: str = address(2)
+    router: str = address(3)
+
+
+# what the analysis of the trace has to come up with, counted while the trace is generated
+class TraceSummary(BaseModel):
+    transactions: int = 0
+    max_depth: int = 0
+    hops: int = 0
+    failed_hops: int = 0
+    output: int = 0
+    excesses: int = 0
+
+
+# a transaction without its children, and the children, produced on demand
+Node = tuple[dict, Iterator["Node"]]
+
+
+class TraceGenerator:
+
+    def __init__(self, shape: TraceShape):
+        if shape.excess not in EXCESS_PATTERNS:
+            raise ValueError(f"Unknown excess pattern {shape.excess}, expected one of {', '.join(EXCESS_PATTERNS)}")
+
+        unknown = set(shape.dexes) - set(DEXES)
+        if unknown:
+            raise ValueError(f"Unknown dexes {', '.join(sorted(unknown))}, expected some of {', '.join(DEXES)}")
+
+        self.shape = shape
+        self.rng = random.Random(shape.seed)
+        self.summary = TraceSummary()
+        self.lt = 1_000
+        self.accounts = 1_000
+
+        self.dexes = [dex for dex, weight in shape.dexes.items() if weight > 0]
+        self.weights = [shape.dexes[dex] for dex in self.dexes]
+
+    def _account(self) -> str:
+        self.accounts += 1
+        return address(self.accounts)
+
+    def _message(self, src: str, dest: str, value: int, body: dict | None, op: str | None = None,
+                 bounced: bool = False) -> dict:
+        self.lt += 1
+
+        return {
+            "type": "int_msg",
+            "ihr_disabled": True,
+            "bounce": not bounced,
+            "bounced": bounced,
+            "src": src,
+            "dest": dest,
+            "value": value,
+            "ihr_fee": 0,
+            "fwd_fee": 1_000_000,
+            "created_lt": self.lt,
+            "created_at": NOW,
+            "decoded_op": op or (OP_CODES[body["type"]] if body else None),
+            "decoded_body": body,
+        }
+
+    def _transaction(self, account: str, in_msg: dict, depth: int, exit_code: int = 0) -> dict:
+        self.lt += 1
+        self.summary.transactions += 1
+        self.summary.max_depth = max(self.summary.max_depth, depth)
+
+        return {
+            "account": account,
+            "lt": self.lt,
+            "prev_trans_hash": f"{self.lt:064x}",
+            "prev_trans_lt": self.lt - 1,
+            "now": NOW,
+            "orig_status": "active",
+            "end_status": "active",
+            "in_msg": in_msg,
+            "out_msgs": [],
+            "total_fees": 3_000_000,
+            "state_old_hash": f"{self.lt:064x}",
+            "state_new_hash": f"{self.lt + 1:064x}",
+            "type": "ordinary",
+            "credit_first": False,
+            "aborted": exit_code != 0,
+            "destroyed": False,
+            "compute_phase": {
+                "type": "vm", "reason": None, "success": exit_code == 0, "msg_state_used": False,
+                "account_activated": False, "gas_fees": 2_000_000, "gas_used": 5_000, "gas_limit": 1_000_000,
+                "gas_credit": None, "mode": 0, "exit_code": exit_code, "exit_arg": None, "vm_steps": 100,
+                "vm_init_state_hash": "00" * 32, "vm_final_state_hash": "00" * 32,
+            },
+            "children": [],
+        }
+
+    def _leaf(self, src: str, dest: str, value: int, body: dict | None, depth: int) -> Node:
+        return self._transaction(dest, self._message(src, dest, value, body), depth), iter(())
+
+    def _excess(self, src: str, depth: int) -> Node:
+        value = 10_000_000
+        self.summary.excesses += value
+
+        return self._leaf(src, self.shape.sender, value, {"type": "excess", "query_id": 0}, depth)
+
+    def _swap_body(self, dex: str, hop: int, amount: int, pool: str) -> dict:
+        sender = self.shape.sender
+
+        if dex == "dedust":
+            swap_params = {"deadline": NOW + 300, "recipient_addr": sender, "referral_addr": None,
+                           "fulfill_payload": None, "reject_payload": None}
+            params = {"kind_out": False, "limit": 0, "next": None}
+
+            if hop == 0:
+                return {"type": "dedust_swap", "query_id": 0, "amount": amount,
+                        "step": {"pool_addr": pool, "params": params}, "swap_params": swap_params}
+
+            return {"type": "dedust_swap_peer", "query_id": 0, "proof": None, "asset": {"type": "native"},
+                    "amount": amount, "sender_addr": sender, "current": params, "swap_params": swap_params}
+
+        if dex == "stonfi":
+            return {"type": "stonfi_swap", "query_id": 0, "to_address": sender, "sender_address": sender,
+                    "jetton_amount": amount, "min_out": 0, "has_ref_address": False,
+                    "addrs": {"from_user": sender}}
+
+        return {"type": "stonfi_v2_swap", "query_id": 0, "from_user": sender, "left_amount": amount,
+                "right_amount": 0,
+                "dex_payload": {"transferred_op": 0, "token_wallet1": pool, "refund_address": sender,
+                                "excesses_address": sender, "tx_deadline": NOW + 300,
+                                "swap_body": {"min_out": 0, "receiver": sender, "fwd_gas": 0, "custom_payload": None,
+                                              "refund_fwd_gas": 0, "refund_payload": None, "ref_fee": 0,
+                                              "ref_address": None}}}
+
+    def _payout(self, src: str, amount: int, depth: int) -> Node:
+        shape = self.shape
+        self.summary.output += amount
+
+        body = {"type": "jetton_internal_transfer", "query_id": 0, "amount": amount, "from": src,
+                "response_address": shape.sender, "forward_ton_amount": 1, "forward_payload": None}
+        transaction = self._transaction(shape.jetton_wallet, self._message(src, shape.jetton_wallet, 50_000_000, body),
+                                        depth)
+
+        def children() -> Iterator[Node]:
+            notification = {"type": "jetton_transfer_notification", "query_id": 0, "amount": amount,
+                            "sender": src, "forward_payload": None}
+            # the forwarded TON reaches the sender as well, the analysis counts it with the excesses
+            self.summary.excesses += 1
+            yield self._leaf(shape.jetton_wallet, shape.sender, 1, notification, depth + 1)
+
+            if shape.excess != "none":
+                yield self._excess(shape.jetton_wallet, depth + 1)
+
+        return transaction, children()
+
+    def _hop(self, src: str, hop: int, amount: int, value: int, depth: int) -> Node:
+        shape = self.shape
+        dex = self.rng.choices(self.dexes, self.weights)[0]
+        pool = self._account()
+        failed = self.rng.random() < shape.bounce_rate
+
+        exit_code = self.rng.choice(BOUNCE_EXIT_CODES) if failed else 0
+        transaction = self._transaction(pool, self._message(src, pool, value, self._swap_body(dex, hop, amount, pool)),
+                                        depth, exit_code)
+
+        self.summary.hops += 1
+        self.summary.failed_hops += failed
+
+        def children() -> Iterator[Node]:
+            if failed:
+                # the swap message comes back to whoever sent it, the chain ends here
+                yield self._transaction(src, self._message(pool, src, value - 5_000_000, None, OP_CODES["bounced"],
+                                                           bounced=True), depth + 1), iter(())
+                return
+
+            output = int(amount * shape.rate)
+
+            if hop + 1 < shape.hops:
+                yield self._hop(pool, hop + 1, output, value - 10_000_000, depth + 1)
+            else:
+                yield self._payout(pool, output, depth + 1)
+
+            for _ in range(shape.fanout):
+                yield self._leaf(pool, self._account(), 1_000_000, {"type": "comment", "comment": "fee"}, depth + 1)
+
+            if shape.excess == "every_hop":
+                yield self._excess(pool, depth + 1)
+
+        return transaction, children()
+
+    def root(self) -> Node:
+        shape = self.shape
+        value = shape.input_amount + shape.gas
+        transaction = self._transaction(shape.router, self._message(shape.sender, shape.router, value, None), 0)
+
+        def children() -> Iterator[Node]:
+            for split in range(shape.splits):
+                # the last split takes the remainder, so the splits add up to the input
+                amount = shape.input_amount // shape.splits
+                if split == shape.splits - 1:
+                    amount += shape.input_amount % shape.splits
+
+                yield self._hop(shape.router, 0, amount, shape.gas // shape.splits + amount, 1)
+
+        return transaction, children()
+
+
+def generate_trace(shape: TraceShape) -> tuple[dict, TraceSummary]:
+    # the whole EmulatorResult JSON in memory, built without recursion so deep chains work too
+    generator = TraceGenerator(shape)
+    root, children = generator.root()
+    stack = [(root, children)]
+
+    while stack:
+        transaction, children = stack[-1]
+        child = next(children, None)
+
+        if child is None:
+            stack.pop()
+            continue
+
+        transaction["children"].append(child[0])
+        stack.append(child)
+
+    return {"ok": True, "exit_code": 0, "message": None, "result": root}, generator.summary
+
+
+def write_trace(shape: TraceShape, file: IO[str]) -> TraceSummary:
+    # streams the EmulatorResult JSON, only the transactions on the path from the root to the current one are in memory
+    generator = TraceGenerator(shape)
+
+    def opening(transaction: dict) -> str:
+        # the transaction up to the opening bracket of its children
+        transaction = dict(transaction)
+        del transaction["children"]
+
+        return json.dumps(transaction)[:-1] + ', "children": ['
+
+    root, children = generator.root()
+    file.write('{"ok": true, "exit_code": 0, "message": null, "result": ')
+    file.write(opening(root))
+
+    # (children left to write, whether one was written already)
+    stack = [[children, False]]
+
+    while stack:
+        entry = stack[-1]
+        child = next(entry[0], None)
+
+        if child is None:
+            file.write("]}")
+            stack.pop()
+            continue
+
+        if entry[1]:
+            file.write(", ")
+
+        entry[1] = True
+        file.write(opening(child[0]))
+        stack.append([child[1], False])
+
+    file.write("}")
+
+    return generator.summary
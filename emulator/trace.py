@@ -0,0 +1,85 @@
+import json
+
+# Lightweight view of EmulatorResult with only the fields the swap output analysis reads.
+# Attribute names mirror emulator.models, so code reading a trace works with either representation
+
+
+class TraceMessageBody:
+    __slots__ = ("type", "amount")
+
+    def __init__(self, raw: dict):
+        self.type = raw.get("type")
+        self.amount = raw.get("amount")
+
+
+class TraceMessage:
+    __slots__ = ("type", "src", "dest", "value", "decoded_op", "decoded_body")
+
+    def __init__(self, raw: dict):
+        body = raw.get("decoded_body")
+
+        self.type = raw.get("type")
+        self.src = raw.get("src")
+        self.dest = raw.get("dest")
+        self.value = raw.get("value", 0)
+        self.decoded_op = raw.get("decoded_op")
+        self.decoded_body = TraceMessageBody(body) if body else None
+
+
+class TraceComputePhase:
+    __slots__ = ("exit_code",)
+
+    def __init__(self, raw: dict):
+        self.exit_code = raw.get("exit_code")
+
+
+class TraceTransaction:
+    __slots__ = ("account", "total_fees", "in_msg", "compute_phase", "children")
+
+    def __init__(self, raw: dict):
+        in_msg = raw.get("in_msg")
+        compute_phase = raw.get("compute_phase")
+
+        self.account = raw.get("account")
+        self.total_fees = raw.get("total_fees", 0)
+        self.in_msg = TraceMessage(in_msg) if in_msg else None
+        self.compute_phase = TraceComputePhase(compute_phase) if compute_phase else None
+        self.children: list[TraceTransaction] = []
+
+
+class TraceResult:
+    __slots__ = ("result", "ok", "exit_code", "message")
+
+    def __init__(self, result: TraceTransaction | None, ok: bool, exit_code: int | None, message: str | None):
+        self.result = result
+        self.ok = ok
+        self.exit_code = exit_code
+        self.message = message
+
+
+def _decode_transaction(raw: dict) -> TraceTransaction:
+    root = TraceTransaction(raw)
+    stack = [(root, raw)]
+
+    # iterative, deep traces must not hit the recursion limit
+    while stack:
+        node, raw_node = stack.pop()
+
+        for raw_child in raw_node.get("children") or ():
+            child = TraceTransaction(raw_child)
+            node.children.append(child)
+            stack.append((child, raw_child))
+
+    return root
+
+
+def decode_trace(content: bytes | str) -> TraceResult:
+    data = json.loads(content)
+    result = data.get("result")
+
+    return TraceResult(
+        result=_decode_transaction(result) if result else None,
+        ok=data["ok"],
+        exit_code=data.get("exit_code"),
+        message=data.get("message"),
+    )
@@ -0,0 +1,203 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from common.models import DexBenchmarkStreamExporter, DexBenchmarkResult, ProviderException
+from common.timing import PhaseTimings
+
+# dictionary-encoded columns, every segment stores its own value lists next to the rows
+STRING_COLUMNS = ("run", "provider", "input_symbol", "output_symbol", "error_type")
+
+TIMING_COLUMNS = ("queue", "dns", "connect", "tls", "send", "wait", "download", "processing")
+
+ROW_DTYPE = np.dtype(
+    [(column, "u2") for column in STRING_COLUMNS] + [
+        # pair input amount, in input token units
+        ("amount", "u8"),
+        ("input_amount", "f8"),
+        ("output_amount", "f8"),
+        ("emulated_output_amount", "f8"),
+        ("gas", "f8"),
+        ("ratio", "f8"),
+        ("max_splits", "u1"),
+        ("max_length", "u1"),
+        ("splits", "u2"),
+        ("mc_block_seqno", "u4"),
+        ("elapsed", "f4"),
+        ("emulation_elapsed", "f4"),
+        ("end_to_end_elapsed", "f4"),
+        ("loop_lag", "f4"),
+    ] + [(column, "f4") for column in TIMING_COLUMNS] + [
+        ("connections", "u2"),
+    ]
+)
+
+# error_type of successful results
+NO_ERROR = ""
+
+
+class ColumnarTable:
+
+    def __init__(self, rows: np.ndarray, dictionaries: dict[str, list[str]]):
+        self.rows = rows
+        self.dictionaries = dictionaries
+
+    def __len__(self):
+        return len(self.rows)
+
+    def code(self, column: str, value: str) -> int:
+        # -1 never matches, so filtering on an unknown value selects nothing
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return -1
+
+    def decode(self, column: str, codes: np.ndarray | None = None) -> np.ndarray:
+        values = np.array(self.dictionaries[column], dtype=object)
+
+        return values[self.rows[column] if codes is None else codes]
+
+    def ok(self) -> np.ndarray:
+        return self.rows["error_type"] == self.code("error_type", NO_ERROR)
+
+
+# Append-only store of benchmark results as numpy structured arrays, one segment per run: <run_id>.npy with
+# the rows and <run_id>.json with the values of the dictionary-encoded columns. Segments are plain .npy files,
+# so they can be memory mapped; strings take two bytes per row and timings are float32, which keeps a row
+# at about a hundred bytes.
+# As a stream exporter it buffers the rows of the current run and writes its segment on close; a resumed run
+# replays its journal, so rewriting the segment of the same run id never duplicates rows
+class ColumnarStore(DexBenchmarkStreamExporter):
+
+    def __init__(self, directory: str | Path, run_id: str | None = None, capacity: int = 1024):
+        self.directory = Path(directory)
+        self.run_id = run_id
+
+        self.rows = np.zeros(capacity, dtype=ROW_DTYPE)
+        self.count = 0
+        self.dictionaries: dict[str, dict[str, int]] = {column: {} for column in STRING_COLUMNS}
+
+    def _code(self, column: str, value: str) -> int:
+        codes = self.dictionaries[column]
+        code = codes.get(value)
+
+        if code is None:
+            code = codes[value] = len(codes)
+
+        return code
+
+    def add(self, input_amount: int, result: DexBenchmarkResult | ProviderException):
+        if self.count == len(self.rows):
+            # fields a failed result does not set must stay zero, so the new rows are not left uninitialized
+            rows = np.zeros(len(self.rows) * 2, dtype=ROW_DTYPE)
+            rows[:self.count] = self.rows
+            self.rows = rows
+
+        row = self.rows[self.count]
+        self.count += 1
+
+        request = result.request if isinstance(result, ProviderException) else result.route.request
+        seqno = result.mc_block_seqno or 0
+
+        row["run"] = self._code("run", self.run_id or "")
+        row["provider"] = self._code("provider", result.provider.get_name())
+        row["input_symbol"] = self._code("input_symbol", request.input_token.symbol)
+        row["output_symbol"] = self._code("output_symbol", request.output_token.symbol)
+        row["amount"] = input_amount
+        row["input_amount"] = request.input_amount / 10 ** request.input_token.decimals
+        row["max_splits"] = request.max_splits
+        row["max_length"] = request.max_length
+        row["mc_block_seqno"] = seqno
+
+        if isinstance(result, ProviderException):
+            row["error_type"] = self._code("error_type", result.error_type or "Error")
+            return
+
+        emulation = result.emulation_result
+        timings = result.timings or PhaseTimings()
+
+        row["error_type"] = self._code("error_type", NO_ERROR)
+        row["output_amount"] = result.route.output_amount / 10 ** request.output_token.decimals
+        row["ratio"] = result.ratio
+        row["elapsed"] = result.elapsed
+        row["emulation_elapsed"] = result.emulation_elapsed
+        row["end_to_end_elapsed"] = result.end_to_end_elapsed
+        row["loop_lag"] = result.loop_lag
+        row["connections"] = timings.connections
+
+        for column in TIMING_COLUMNS:
+            row[column] = getattr(timings, column)
+
+        if emulation is not None:
+            row["emulated_output_amount"] = emulation.output_amount / 10 ** request.output_token.decimals
+            row["gas"] = emulation.gas_used / 1e9
+            row["splits"] = emulation.splits
+
+    def close(self):
+        if self.count == 0:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        name = self.run_id or "run"
+        dictionaries = {column: list(codes) for column, codes in self.dictionaries.items()}
+
+        # the dictionaries go first, a segment only counts once its rows are in place
+        _replace(self.directory / f"{name}.json", lambda file: file.write(json.dumps(dictionaries).encode()))
+        _replace(self.directory / f"{name}.npy", lambda file: np.save(file, self.rows[:self.count]))
+
+        self.rows = np.zeros(len(self.rows), dtype=ROW_DTYPE)
+        self.count = 0
+        self.dictionaries = {column: {} for column in STRING_COLUMNS}
+
+    def runs(self) -> list[str]:
+        return sorted(path.stem for path in self.directory.glob("*.npy") if path.with_suffix(".json").exists())
+
+    def segment(self, run_id: str, mmap: bool = True) -> ColumnarTable:
+        rows = np.load(self.directory / f"{run_id}.npy", mmap_mode="r" if mmap else None)
+        dictionaries = json.loads((self.directory / f"{run_id}.json").read_text())
+
+        return ColumnarTable(rows, dictionaries)
+
+    def load(self, runs: list[str] | None = None, columns: list[str] | None = None) -> ColumnarTable:
+        # only the requested columns are read from the mapped segments, string codes are remapped to shared
+        # dictionaries so rows of different runs compare directly
+        columns = columns or list(ROW_DTYPE.names)
+        dtype = np.dtype([(column, ROW_DTYPE[column]) for column in columns])
+        dictionaries: dict[str, dict[str, int]] = {column: {} for column in STRING_COLUMNS if column in columns}
+        parts = []
+
+        for run_id in runs or self.runs():
+            segment = self.segment(run_id)
+            # columns added after a segment was written read as zeros
+            part = np.zeros(len(segment), dtype=dtype)
+
+            for column in columns:
+                if column not in segment.rows.dtype.names:
+                    continue
+                elif column in dictionaries:
+                    shared = dictionaries[column]
+                    mapping = np.array([shared.setdefault(value, len(shared)) for value in segment.dictionaries[column]],
+                                       dtype=np.uint16)
+                    part[column] = mapping[segment.rows[column]] if len(mapping) else 0
+                else:
+                    part[column] = segment.rows[column]
+
+            parts.append(part)
+
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        return ColumnarTable(rows, {column: list(codes) for column, codes in dictionaries.items()})
+
+
+def _replace(path: Path, write):
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    with open(tmp_path, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmp_path, path)
@@ -1,7 +1,11 @@
+import asyncio
 import csv
+import time
 from pathlib import Path
+from typing import TextIO
 
-from common.models import ProviderException, DexBenchmarkResult, DexBenchmarkExporter
+from common.models import ProviderException, DexBenchmarkResult, DexBenchmarkStreamExporter
+from common.timing import PhaseTimings
 
 HEADER = [
     'provider',
@@ -16,7 +20,18 @@ HEADER = [
     'max_splits',
     'max_length',
     'splits',
-    'error_message'
+    'error_message',
+    # appended, readers of the original columns find them where they always were
+    'loop_lag',
+    'queue',
+    'dns',
+    'connect',
+    'tls',
+    'send',
+    'wait',
+    'download',
+    'processing',
+    'connections',
 ]
 
 
@@ -24,14 +39,17 @@ def _build_row(benchmark_result: DexBenchmarkResult) -> list:
     if isinstance(benchmark_result, ProviderException):
         provider_name = benchmark_result.provider.get_name()
         request = benchmark_result.request
-        output_amount = emulated_output_amount = gas_used = elapsed = splits = 0
+        output_amount = emulated_output_amount = gas_used = elapsed = loop_lag = splits = 0
         error_message = benchmark_result.message
         ratio = 0
+        timings = PhaseTimings()
     else:
         provider_name = benchmark_result.route.provider
         request = benchmark_result.route.request
         output_amount = benchmark_result.route.output_amount
         elapsed = benchmark_result.elapsed
+        loop_lag = benchmark_result.loop_lag
+        timings = benchmark_result.timings or PhaseTimings()
         emulated_output_amount = benchmark_result.emulation_result.output_amount if benchmark_result.emulation_result else 0
         gas_used = benchmark_result.emulation_result.gas_used if benchmark_result.emulation_result else 0
         splits = benchmark_result.emulation_result.splits if benchmark_result.emulation_result else 0
@@ -52,24 +70,108 @@ def _build_row(benchmark_result: DexBenchmarkResult) -> list:
         request.max_length,
         splits,
         error_message,
+        loop_lag,
+        timings.queue,
+        timings.dns,
+        timings.connect,
+        timings.tls,
+        timings.send,
+        timings.wait,
+        timings.download,
+        timings.processing,
+        timings.connections,
     ]
 
 
-class CsvExporter(DexBenchmarkExporter):
+class _CsvFile:
 
-    def __init__(self, directory: str = "results"):
+    def __init__(self, path: Path):
+        self.file: TextIO = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.rows: list[list] = []
+
+        self.writer.writerow(HEADER)
+
+    def flush(self):
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows.clear()
+
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# Writes {input_amount}.csv files while the benchmark runs. Rows are buffered and written once flush_rows rows are
+# waiting, and at least every flush_interval seconds while a loop is running, so files can be followed with tail even
+# while a slow pair holds back the next result
+class CsvExporter(DexBenchmarkStreamExporter):
+
+    def __init__(self, directory: str = "results", flush_rows: int = 100, flush_interval: float = 5.0):
         self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self.files: dict[int, _CsvFile] = {}
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        self.flush_task: asyncio.Task | None = None
+
+    def _file(self, input_amount: int) -> _CsvFile:
+        file = self.files.get(input_amount)
+
+        if file is None:
+            # ensure the directory exists
+            Path(self.directory).mkdir(parents=True, exist_ok=True)
+
+            file = _CsvFile(Path(self.directory) / f"{input_amount}.csv")
+            self.files[input_amount] = file
+
+        return file
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.last_flush + self.flush_interval - time.monotonic()))
+
+            if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+            elif not self.pending:
+                self.last_flush = time.monotonic()
+
+    def _start_flushing(self):
+        if self.flush_task is not None:
+            return
+
+        try:
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+        except RuntimeError:
+            # exported without a loop, e.g. from a finished result set; close() writes everything
+            pass
+
+    def add(self, input_amount: int, result: DexBenchmarkResult | ProviderException):
+        self._file(input_amount).rows.append(_build_row(result))
+        self.pending += 1
+        self._start_flushing()
+
+        if self.pending >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        for file in self.files.values():
+            file.flush()
 
-    def export(self, results: dict[int, list[DexBenchmarkResult]]):
-        # ensure the directory exists
-        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        self.pending = 0
+        self.last_flush = time.monotonic()
 
-        for input_amount, results in results.items():
-            with open(f"{self.directory}/{input_amount}.csv", 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(HEADER)
+    def close(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
 
-                for result in results:
-                    row = _build_row(result)
+        for file in self.files.values():
+            file.close()
 
-                    writer.writerow(row)
+        self.files.clear()
+        self.pending = 0
@@ -0,0 +1,270 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common.models import DexBenchmarkStreamExporter, DexBenchmarkResult, ProviderException
+from exporters.stats import WIN_TOLERANCE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    providers TEXT NOT NULL,
+    options TEXT NOT NULL,
+    min_seqno INTEGER,
+    max_seqno INTEGER,
+    results INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    provider TEXT NOT NULL,
+    output_symbol TEXT NOT NULL,
+    output_address TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    max_splits INTEGER NOT NULL,
+    ratio REAL,
+    gas REAL,
+    splits INTEGER,
+    elapsed REAL,
+    provider_elapsed REAL,
+    emulation_elapsed REAL,
+    mc_block_seqno INTEGER,
+    error_type TEXT,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS results_lookup ON results (provider, output_symbol, amount, run_id);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id, amount, output_symbol);
+"""
+
+# a provider wins a round when one of its routes is within WIN_TOLERANCE of the best ratio for the symbol,
+# the same rule as the summary
+WINS_QUERY = f"""
+WITH best AS (
+    SELECT amount, output_symbol, MAX(ratio) AS ratio
+    FROM results
+    WHERE run_id = :run_id AND error_type IS NULL
+    GROUP BY amount, output_symbol
+)
+SELECT r.provider, r.amount, COUNT(DISTINCT r.output_symbol)
+FROM results r JOIN best b ON r.amount = b.amount AND r.output_symbol = b.output_symbol
+WHERE r.run_id = :run_id AND r.error_type IS NULL AND b.ratio != 0 AND 1 - r.ratio / b.ratio < {WIN_TOLERANCE}
+GROUP BY r.provider, r.amount
+"""
+
+ROUNDS_QUERY = """
+SELECT amount, COUNT(DISTINCT output_symbol)
+FROM results
+WHERE run_id = :run_id AND error_type IS NULL
+GROUP BY amount
+"""
+
+PERCENTILES = (50, 90, 99)
+
+
+class ProviderRunStats:
+
+    def __init__(self, provider: str, amount: int):
+        self.provider = provider
+        self.amount = amount
+        self.wins = 0
+        self.rounds = 0
+        self.results = 0
+        # provider_elapsed percentiles, None without successful results
+        self.latency: dict[int, float] | None = None
+        # (output symbol, max splits) of failed routes
+        self.failures: set[tuple[str, int]] = set()
+
+    @property
+    def win_rate(self) -> float | None:
+        return self.wins / self.rounds if self.rounds else None
+
+
+class ProviderDiff:
+
+    def __init__(self, before: ProviderRunStats | None, after: ProviderRunStats | None):
+        self.before = before
+        self.after = after
+
+    @property
+    def win_rate_change(self) -> float | None:
+        if self.before is None or self.after is None or None in (self.before.win_rate, self.after.win_rate):
+            return None
+
+        return self.after.win_rate - self.before.win_rate
+
+    def latency_change(self, percentile: int) -> float | None:
+        if self.before is None or self.after is None or self.before.latency is None or self.after.latency is None:
+            return None
+
+        return self.after.latency[percentile] - self.before.latency[percentile]
+
+    @property
+    def new_failures(self) -> set[tuple[str, int]]:
+        if self.after is None:
+            return set()
+
+        return self.after.failures - (self.before.failures if self.before else set())
+
+
+# Run history in SQLite: one row per run with its metadata and one row per result, indexed by
+# (provider, output symbol, amount, run) for queries across runs.
+# As a stream exporter it records the current run; a resumed run replays its journal, so the rows of the run are
+# replaced rather than duplicated
+class RunHistory(DexBenchmarkStreamExporter):
+
+    def __init__(self, path: str | Path, run_id: str | None = None, providers: list[str] | None = None,
+                 options: dict | None = None, batch: int = 500):
+        self.path = Path(path)
+        self.run_id = run_id
+        # run metadata, left as recorded when None, e.g. when rebuilding from a journal
+        self.providers = providers
+        self.options = options
+        self.batch = batch
+
+        self.connection: sqlite3.Connection | None = None
+        self.rows: list[tuple] = []
+        self.started = False
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript(SCHEMA)
+
+        return self.connection
+
+    def _start(self):
+        connection = self.connect()
+
+        with connection:
+            connection.execute("DELETE FROM results WHERE run_id = ?", (self.run_id,))
+            connection.execute("INSERT OR IGNORE INTO runs (run_id, started_at, providers, options) VALUES (?, ?, ?, ?)",
+                               (self.run_id, time.time(), "[]", "{}"))
+            if self.providers is not None:
+                connection.execute("UPDATE runs SET providers = ? WHERE run_id = ?",
+                                   (json.dumps(self.providers), self.run_id))
+
+            if self.options is not None:
+                connection.execute("UPDATE runs SET options = ? WHERE run_id = ?",
+                                   (json.dumps(self.options), self.run_id))
+
+        self.started = True
+
+    def add(self, input_amount: int, result: DexBenchmarkResult | ProviderException):
+        if not self.started:
+            self._start()
+
+        request = result.request if isinstance(result, ProviderException) else result.route.request
+        key = (self.run_id, result.provider.get_name(), request.output_token.symbol, request.output_token.address,
+               input_amount, request.max_splits)
+
+        if isinstance(result, ProviderException):
+            values = (None, None, None, None, None, None, result.mc_block_seqno, result.error_type or "Error",
+                      result.message)
+        else:
+            emulation = result.emulation_result
+            values = (result.ratio,
+                      emulation.gas_used / 1e9 if emulation else None,
+                      emulation.splits if emulation else None,
+                      result.elapsed,
+                      result.provider_elapsed,
+                      result.emulation_elapsed,
+                      result.mc_block_seqno,
+                      None,
+                      None)
+
+        self.rows.append(key + values)
+
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        with self.connect() as connection:
+            connection.executemany("INSERT INTO results (run_id, provider, output_symbol, output_address, amount, "
+                                   "max_splits, ratio, gas, splits, elapsed, provider_elapsed, emulation_elapsed, "
+                                   "mc_block_seqno, error_type, error) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.rows)
+
+        self.rows.clear()
+
+    def close(self):
+        if self.started:
+            self.flush()
+
+            with self.connect() as connection:
+                connection.execute("""
+                    UPDATE runs SET
+                        finished_at = :finished_at,
+                        min_seqno = (SELECT MIN(mc_block_seqno) FROM results WHERE run_id = :run_id),
+                        max_seqno = (SELECT MAX(mc_block_seqno) FROM results WHERE run_id = :run_id),
+                        results = (SELECT COUNT(*) FROM results WHERE run_id = :run_id)
+                    WHERE run_id = :run_id
+                """, {"finished_at": time.time(), "run_id": self.run_id})
+
+            self.started = False
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def runs(self) -> list[sqlite3.Row]:
+        connection = self.connect()
+        connection.row_factory = sqlite3.Row
+
+        return connection.execute("SELECT * FROM runs ORDER BY started_at").fetchall()
+
+    def run_stats(self, run_id: str) -> dict[tuple[str, int], ProviderRunStats]:
+        connection = self.connect()
+        stats: dict[tuple[str, int], ProviderRunStats] = {}
+
+        def get(provider: str, amount: int) -> ProviderRunStats:
+            key = (provider, amount)
+            if key not in stats:
+                stats[key] = ProviderRunStats(provider, amount)
+
+            return stats[key]
+
+        rounds = dict(connection.execute(ROUNDS_QUERY, {"run_id": run_id}).fetchall())
+
+        for provider, amount, count in connection.execute(
+                "SELECT provider, amount, COUNT(*) FROM results "
+                "WHERE run_id = ? GROUP BY provider, amount", (run_id,)):
+            entry = get(provider, amount)
+            entry.results = count
+            entry.rounds = rounds.get(amount, 0)
+
+        for provider, amount, wins in connection.execute(WINS_QUERY, {"run_id": run_id}):
+            get(provider, amount).wins = wins
+
+        latencies: dict[tuple[str, int], list[float]] = {}
+        for provider, amount, elapsed in connection.execute(
+                "SELECT provider, amount, provider_elapsed FROM results "
+                "WHERE run_id = ? AND error_type IS NULL", (run_id,)):
+            latencies.setdefault((provider, amount), []).append(elapsed)
+
+        for key, values in latencies.items():
+            percentiles = np.percentile(np.array(values), PERCENTILES)
+            stats[key].latency = dict(zip(PERCENTILES, percentiles.tolist()))
+
+        for provider, amount, symbol, max_splits in connection.execute(
+                "SELECT provider, amount, output_symbol, max_splits FROM results "
+                "WHERE run_id = ? AND error_type IS NOT NULL", (run_id,)):
+            stats[(provider, amount)].failures.add((symbol, max_splits))
+
+        return stats
+
+    def diff(self, before: str, after: str) -> dict[tuple[str, int], ProviderDiff]:
+        before_stats = self.run_stats(before)
+        after_stats = self.run_stats(after)
+
+        return {key: ProviderDiff(before_stats.get(key), after_stats.get(key))
+                for key in sorted(before_stats.keys() | after_stats.keys(), key=lambda k: (k[1], k[0]))}
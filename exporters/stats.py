@@ -0,0 +1,231 @@
+from array import array
+
+import numpy as np
+
+from common.histogram import LatencyHistogram
+from common.models import DexBenchmarkResult, ProviderException
+from common.timing import PhaseTimings
+
+# relative distance to the best value that still counts as a win
+WIN_TOLERANCE = 1e-4
+
+PHASE_FIELDS = [name for name, field in PhaseTimings.model_fields.items() if field.annotation is float]
+
+# latency histogram -> DexBenchmarkResult field it records
+LATENCY_METRICS = {
+    "build": "elapsed",
+    "emulation": "emulation_elapsed",
+    "end_to_end": "end_to_end_elapsed",
+}
+
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+
+
+def bootstrap_rate_ci(wins: np.ndarray, samples: int = BOOTSTRAP_SAMPLES, confidence: float = CONFIDENCE,
+                      seed: int = 0) -> tuple[np.ndarray, np.ndarray] | None:
+    # wins is a (rounds, providers) boolean matrix. A resample draws rounds with replacement, so the wins of a provider
+    # in it follow Binomial(rounds, observed rate) exactly; drawing those counts directly gives the same intervals
+    # without materializing (samples, rounds) resampling weights, which does not scale to large runs
+    rounds = len(wins)
+    if rounds == 0:
+        return None
+
+    rng = np.random.default_rng(seed)
+    rates = rng.binomial(rounds, wins.mean(axis=0), size=(samples, wins.shape[1])) / rounds
+
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(rates, [tail, 100 - tail], axis=0)
+
+    return low, high
+
+
+class ProviderSummary:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profitable_hit = 0
+        self.fast_hit = 0
+        self.tokens: set[str] = set()
+        # None when the provider has no successful results for the amount
+        self.avg_elapsed: float | None = None
+        self.avg_phases = PhaseTimings()
+        self.latency: dict[str, LatencyHistogram] = {}
+        # bootstrap confidence intervals of the win rates, None without rounds
+        self.profitable_ci: tuple[float, float] | None = None
+        self.fast_ci: tuple[float, float] | None = None
+
+
+class AmountSummary:
+
+    def __init__(self, input_amount: int, symbols: int, providers: list[ProviderSummary]):
+        self.input_amount = input_amount
+        # routes are compared per output symbol, every symbol with a successful route is one round
+        self.symbols = symbols
+        self.providers = providers
+
+
+# Columnar (amount, symbol, provider) index of successful results. Results are added one at a time and reduced to a
+# few numbers each, so the index stays small, and summarize() computes the best ratio, the fastest build and the win
+# counts of every provider for every amount in one vectorized pass
+class ResultIndex:
+
+    def __init__(self):
+        self.amounts: dict[int, int] = {}
+        self.symbols: dict[str, int] = {}
+        self.providers: dict[str, int] = {}
+        self.provider_is_dex: list[bool] = []
+
+        # typed columns, numpy reads them without copying
+        self.amount_idx = array("q")
+        self.symbol_idx = array("q")
+        self.provider_idx = array("q")
+        self.ratio = array("d")
+        self.elapsed = array("d")
+        self.provider_elapsed = array("d")
+        self.has_phases = array("b")
+        # PHASE_FIELDS of every result, flattened
+        self.phases = array("d")
+        # (amount, provider) -> metric -> histogram
+        self.latency: dict[tuple[int, int], dict[str, LatencyHistogram]] = {}
+
+    def __len__(self):
+        return len(self.amount_idx)
+
+    @staticmethod
+    def _intern(index: dict, key) -> int:
+        idx = index.get(key)
+        if idx is None:
+            idx = index[key] = len(index)
+
+        return idx
+
+    def add(self, input_amount: int, result: DexBenchmarkResult | ProviderException):
+        amount = self._intern(self.amounts, input_amount)
+
+        # failed providers still get a section in the summary, but take no part in the comparison
+        name = result.provider.get_name()
+        if name not in self.providers:
+            self._intern(self.providers, name)
+            self.provider_is_dex.append(bool(result.provider.is_dex()))
+
+        if not isinstance(result, DexBenchmarkResult):
+            return
+
+        timings = result.timings
+
+        self.amount_idx.append(amount)
+        self.symbol_idx.append(self._intern(self.symbols, result.route.output_token.symbol))
+        self.provider_idx.append(self.providers[name])
+        self.ratio.append(result.ratio)
+        self.elapsed.append(result.elapsed)
+        self.provider_elapsed.append(result.provider_elapsed)
+        self.has_phases.append(timings is not None)
+        self.phases.extend([getattr(timings, field) for field in PHASE_FIELDS] if timings else [0.0] * len(PHASE_FIELDS))
+
+        histograms = self.latency.setdefault((amount, self.providers[name]), {})
+        for metric, field in LATENCY_METRICS.items():
+            value = getattr(result, field)
+
+            # zero means not measured, e.g. providers that are not emulated
+            if value > 0:
+                histograms.setdefault(metric, LatencyHistogram()).record(value)
+
+    def histograms(self) -> dict[str, LatencyHistogram]:
+        # keyed by "<amount>/<provider>/<metric>", the layout save_histograms writes
+        amounts = list(self.amounts)
+        providers = list(self.providers)
+
+        return {f"{amounts[a]}/{providers[p]}/{metric}": histogram
+                for (a, p), histograms in self.latency.items() for metric, histogram in histograms.items()}
+
+    @staticmethod
+    def _wins(group: np.ndarray, values: np.ndarray, groups: int, maximize: bool) -> np.ndarray:
+        best = np.full(groups, -np.inf if maximize else np.inf)
+        (np.maximum if maximize else np.minimum).at(best, group, values)
+        best = best[group]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if maximize:
+                diff = np.where(best != 0, 1 - values / best, np.inf)
+            else:
+                diff = np.where(values != 0, 1 - best / values, np.inf)
+
+        # nan (nobody eligible) compares as False
+        return diff < WIN_TOLERANCE
+
+    def summarize(self) -> list[AmountSummary]:
+        amounts, symbols, providers = len(self.amounts), len(self.symbols), len(self.providers)
+
+        amount = np.frombuffer(self.amount_idx, dtype=np.int64)
+        symbol = np.frombuffer(self.symbol_idx, dtype=np.int64)
+        provider = np.frombuffer(self.provider_idx, dtype=np.int64)
+        ratio = np.frombuffer(self.ratio, dtype=np.float64)
+        elapsed = np.frombuffer(self.elapsed, dtype=np.float64)
+        is_dex = np.array(self.provider_is_dex, dtype=bool)
+
+        # the fastest build is only compared between aggregators
+        speed = np.where(is_dex[provider], np.inf, np.frombuffer(self.provider_elapsed, dtype=np.float64))
+
+        group = amount * symbols + symbol
+        groups = amounts * symbols
+
+        # a provider wins a round if any of its routes for the symbol matches the best one
+        profitable = np.zeros(groups * providers, dtype=bool)
+        profitable[(group * providers + provider)[self._wins(group, ratio, groups, maximize=True)]] = True
+        profitable = profitable.reshape(amounts, symbols, providers)
+
+        fast = np.zeros(groups * providers, dtype=bool)
+        fast[(group * providers + provider)[self._wins(group, speed, groups, maximize=False)]] = True
+        fast = fast.reshape(amounts, symbols, providers)
+
+        played = np.zeros(groups, dtype=bool)
+        played[group] = True
+        played = played.reshape(amounts, symbols)
+        rounds = played.sum(axis=1)
+
+        cell = amount * providers + provider
+        cells = amounts * providers
+
+        timed = elapsed > 0
+        elapsed_count = np.bincount(cell[timed], minlength=cells).reshape(amounts, providers)
+        elapsed_sum = np.bincount(cell[timed], weights=elapsed[timed], minlength=cells).reshape(amounts, providers)
+
+        phased = timed & np.frombuffer(self.has_phases, dtype=np.int8).astype(bool)
+        phases = np.frombuffer(self.phases, dtype=np.float64).reshape(-1, len(PHASE_FIELDS))
+        phase_count = np.bincount(cell[phased], minlength=cells).reshape(amounts, providers)
+        phase_sums = [np.bincount(cell[phased], weights=phases[phased, column], minlength=cells).reshape(amounts, providers)
+                      for column in range(len(PHASE_FIELDS))]
+
+        symbol_names = np.array(list(self.symbols), dtype=object)
+        summaries = []
+
+        for input_amount, a in self.amounts.items():
+            stats = []
+            profitable_ci = bootstrap_rate_ci(profitable[a][played[a]])
+            fast_ci = bootstrap_rate_ci(fast[a][played[a]])
+
+            for name, p in self.providers.items():
+                summary = ProviderSummary(name)
+                summary.profitable_hit = int(profitable[a, :, p].sum())
+                summary.fast_hit = int(fast[a, :, p].sum())
+                summary.tokens = set(symbol_names[profitable[a, :, p]])
+
+                if elapsed_count[a, p]:
+                    summary.avg_elapsed = float(elapsed_sum[a, p] / elapsed_count[a, p])
+
+                if phase_count[a, p]:
+                    summary.avg_phases = PhaseTimings(**{field: float(phase_sums[column][a, p] / phase_count[a, p])
+                                                         for column, field in enumerate(PHASE_FIELDS)})
+
+                summary.latency = self.latency.get((a, p), {})
+
+                if profitable_ci is not None:
+                    summary.profitable_ci = (float(profitable_ci[0][p]), float(profitable_ci[1][p]))
+                    summary.fast_ci = (float(fast_ci[0][p]), float(fast_ci[1][p]))
+
+                stats.append(summary)
+
+            summaries.append(AmountSummary(input_amount, int(rounds[a]), stats))
+
+        return summaries
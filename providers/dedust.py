@@ -4,11 +4,13 @@ import httpx
 from httpx import AsyncClient
 
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, EmulationSender, EmulatedResult
-from common.util import address_to_raw
+from common.limiter import RateLimit
+from common.util import address_forms
 from providers.swap_coffee import SwapCoffeeRouteProvider, DexPool, build_paths, SwapRoute
 
 
 class DedustProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=2, burst=2, max_concurrency=2)
 
     def __init__(self, builder: SwapCoffeeRouteProvider | None = None):
         super().__init__()
@@ -25,8 +27,8 @@ class DedustProvider(DexRouteProvider):
         output_token_address = output_token.address
 
         body = {
-            "from": f"jetton:{address_to_raw(input_token_address)}" if input_token_address != "native" else "native",
-            "to": f"jetton:{address_to_raw(output_token_address)}" if output_token_address != "native" else "native",
+            "from": address_forms(input_token_address).jetton_asset,
+            "to": address_forms(output_token_address).jetton_asset,
             "amount": str(input_amount)
         }
 
@@ -50,6 +52,10 @@ class DedustProvider(DexRouteProvider):
     def get_name(self) -> str:
         return "dedust"
 
+    def throttle_emulation(self):
+        # emulation goes through the builder's API, so it spends the builder's budget
+        return self.builder.throttle() if self.builder else super().throttle_emulation()
+
     def is_dex(self):
         return True
 
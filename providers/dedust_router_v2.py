@@ -2,10 +2,13 @@ import httpx
 from httpx import AsyncClient
 
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, EmulationSender, EmulatedResult
-from emulator.emulator import UnsignedMessage, emulate_internal_messages, get_total_swap_output, create_session
+from common.limiter import RateLimit
+from emulator.emulator import UnsignedMessage, get_total_swap_output
+from emulator.session import emulate_on_block
 
 
 class DedustRouterV2Provider(DexRouteProvider):
+    rate_limit = RateLimit(rate=5, burst=5, max_concurrency=4)
 
     def __init__(self):
         super().__init__()
@@ -54,6 +57,10 @@ class DedustRouterV2Provider(DexRouteProvider):
     def is_dex(self):
         return False
 
+    def throttle_emulation(self):
+        # the swap messages come from the router's /swap, emulation spends the provider's budget
+        return self.throttle()
+
     async def emulate_route(self, client: httpx.AsyncClient, sender: EmulationSender,
                             route: DexRoute) -> EmulatedResult:
         body = {
@@ -77,8 +84,7 @@ class DedustRouterV2Provider(DexRouteProvider):
                 swap_input_amount=int(path["in_amount"]),
             ))
 
-        session_id = await create_session(client, sender.mc_block_seqno)
-        result = await emulate_internal_messages(self.get_name(), client, messages, session_id)
+        result = await emulate_on_block(self.get_name(), client, messages, sender.mc_block_seqno)
 
         output, gas_used = await get_total_swap_output(result)
 
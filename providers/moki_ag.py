@@ -4,6 +4,7 @@ import httpx
 from httpx import AsyncClient
 
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, EmulationSender, EmulatedResult
+from common.limiter import RateLimit
 from common.util import address_to_friendly
 from providers.swap_coffee import SwapCoffeeRouteProvider, DexPool, SwapRoute, build_paths
 
@@ -20,6 +21,7 @@ def _map_dex_name(dex_name: str) -> str:
 
 
 class MokiAgProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=2, burst=2, max_concurrency=2)
 
     def __init__(self, builder: SwapCoffeeRouteProvider | None = None):
         super().__init__()
@@ -37,10 +39,8 @@ class MokiAgProvider(DexRouteProvider):
 
         body = {
             "inputAssetAmount": str(input_amount),
-            "inputAssetAddress": address_to_friendly(
-                input_token_address) if input_token_address != "native" else input_token_address,
-            "outputAssetAddress": address_to_friendly(
-                output_token_address) if output_token_address != "native" else output_token_address,
+            "inputAssetAddress": address_to_friendly(input_token_address),
+            "outputAssetAddress": address_to_friendly(output_token_address),
         }
 
         response = await client.post(self.api_url, json=body)
@@ -61,6 +61,10 @@ class MokiAgProvider(DexRouteProvider):
     def get_name(self) -> str:
         return "moki.ag"
 
+    def throttle_emulation(self):
+        # emulation goes through the builder's API, so it spends the builder's budget
+        return self.builder.throttle() if self.builder else super().throttle_emulation()
+
     def is_dex(self):
         return False
 
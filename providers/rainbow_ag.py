@@ -1,15 +1,18 @@
 import httpx
 from httpx import AsyncClient
-from pytoniq_core import begin_cell
 
-from emulator.emulator import UnsignedMessage, emulate_internal_messages, get_total_swap_output, create_session
+from emulator.emulator import UnsignedMessage, get_total_swap_output
+from emulator.session import emulate_on_block
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, \
     EmulationSender, EmulatedResult
+from common.limiter import RateLimit
 
-EMPTY_CELL = begin_cell().end_cell().to_boc().hex()
+# begin_cell().end_cell().to_boc().hex()
+EMPTY_CELL = "b5ee9c72010101010002000000"
 
 
 class RainbowAgProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=1, burst=2, max_concurrency=2)
 
     def __init__(self):
         super().__init__()
@@ -101,8 +104,7 @@ class RainbowAgProvider(DexRouteProvider):
 
             transactions.append(transaction)
 
-        session_id = await create_session(client, sender.mc_block_seqno)
-        result = await emulate_internal_messages(self.get_name(), client, transactions, session_id)
+        result = await emulate_on_block(self.get_name(), client, transactions, sender.mc_block_seqno)
 
         output, gas_used = await get_total_swap_output(result)
 
@@ -0,0 +1,85 @@
+import importlib
+import inspect
+from importlib.metadata import entry_points
+
+from loguru import logger
+
+from common.models import DexRouteProvider
+
+# Providers by name, as "module:class" import paths. A module is imported only once its provider is asked for,
+# so a run that benchmarks or reports a few providers does not pay for the imports of the others.
+PROVIDERS = {
+    "swap.coffee": "providers.swap_coffee:SwapCoffeeRouteProvider",
+    "rainbow.ag": "providers.rainbow_ag:RainbowAgProvider",
+    "titan.tg": "providers.titan_tg:TitanTgProvider",
+    "xdelta.fi": "providers.xdelta:XdeltaRouteProvider",
+    "moki.ag": "providers.moki_ag:MokiAgProvider",
+    "dedust_v2": "providers.dedust_router_v2:DedustRouterV2Provider",
+    "dedust": "providers.dedust:DedustProvider",
+    "stonfi": "providers.stonfi:StonfiProvider",
+}
+
+# Note: swap.coffee is used as a transaction builder, because these providers do not provide a REST API for this.
+# Transaction building is required for emulation
+BUILDERS = {
+    "moki.ag": "swap.coffee",
+    "dedust": "swap.coffee",
+    "stonfi": "swap.coffee",
+}
+
+# benchmarked unless --providers says otherwise, together with every provider registered through entry points
+DEFAULT_PROVIDERS = ["swap.coffee", "rainbow.ag", "titan.tg", "xdelta.fi", "moki.ag", "dedust_v2"]
+
+# other packages add providers with an entry point in this group, named after the provider and pointing to its class,
+# e.g. in pyproject.toml: [tool.poetry.plugins."aggregator_researches.providers"] "my.dex" = "my_dex.provider:MyDex"
+ENTRY_POINT_GROUP = "aggregator_researches.providers"
+
+
+class ProviderRegistry:
+
+    def __init__(self, paths: dict[str, str] | None = None, plugins: bool = True):
+        self.paths = dict(PROVIDERS if paths is None else paths)
+        self.plugins: list[str] = []
+
+        if plugins:
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                if entry_point.name in self.paths:
+                    logger.warning(f"Provider {entry_point.name} from {entry_point.value} shadows a built-in one")
+
+                self.paths[entry_point.name] = entry_point.value
+                self.plugins.append(entry_point.name)
+
+        # one instance per provider, so rate limits and the transaction builder are shared by everyone using it
+        self.instances: dict[str, DexRouteProvider] = {}
+
+    def names(self) -> list[str]:
+        return list(self.paths)
+
+    def defaults(self) -> list[str]:
+        return DEFAULT_PROVIDERS + [name for name in self.plugins if name not in DEFAULT_PROVIDERS]
+
+    def load(self, name: str) -> type[DexRouteProvider]:
+        module_name, _, attribute = self.paths[name].partition(":")
+
+        return getattr(importlib.import_module(module_name), attribute)
+
+    def create(self, name: str) -> DexRouteProvider:
+        if name not in self.paths:
+            raise KeyError(f"Unknown provider {name}, expected one of {', '.join(self.names())}")
+
+        if name not in self.instances:
+            provider_class = self.load(name)
+
+            if name in BUILDERS and "builder" in inspect.signature(provider_class).parameters:
+                self.instances[name] = provider_class(self.create(BUILDERS[name]))
+            else:
+                self.instances[name] = provider_class()
+
+        return self.instances[name]
+
+    def get(self, name: str, default: DexRouteProvider | None = None) -> DexRouteProvider | None:
+        # dict-like lookup for iter_results, records of unknown providers are skipped
+        return self.create(name) if name in self.paths else default
+
+
+PROVIDER_REGISTRY = ProviderRegistry()
@@ -2,12 +2,14 @@ import httpx
 from httpx import AsyncClient
 
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, EmulationSender, EmulatedResult
+from common.limiter import RateLimit
 from providers.swap_coffee import SwapCoffeeRouteProvider, SwapRoute, DexPool, build_paths
 
 TON_ADDRESS = "EQAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAM9c"
 LEGACY_ROUTER = "EQB3ncyBUTjZUA5EnFKR5_EnOMI9V1tTEAAPaiU71gc4TiUt"
 
 class StonfiProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=2, burst=2, max_concurrency=2)
 
     def __init__(self, builder: SwapCoffeeRouteProvider | None = None):
         super().__init__()
@@ -52,6 +54,10 @@ class StonfiProvider(DexRouteProvider):
     def get_name(self) -> str:
         return "stonfi"
 
+    def throttle_emulation(self):
+        # emulation goes through the builder's API, so it spends the builder's budget
+        return self.builder.throttle() if self.builder else super().throttle_emulation()
+
     def is_dex(self):
         return True
 
@@ -1,10 +1,15 @@
+import asyncio
+
 from httpx import AsyncClient
+from loguru import logger
 from pydantic import BaseModel
 
-from common.util import get_token_metadata, address_to_friendly
-from emulator.emulator import UnsignedMessage, emulate_internal_messages, get_total_swap_output, create_session
+from common.util import get_token_metadata, address_to_friendly, remember_token_metadata
+from emulator.emulator import UnsignedMessage, get_total_swap_output
+from emulator.session import emulate_on_block
 from common.models import DexRouteProvider, BlockchainToken, DexRoute, BuildRouteRequest, \
     EmulationSender, EmulatedResult
+from common.limiter import RateLimit
 
 
 class DexPool(BaseModel):
@@ -21,7 +26,29 @@ class SwapRoute(BaseModel):
     pools: list[DexPool]
 
 
+def harvest_paths_metadata(paths: list):
+    # route responses carry full token metadata, so remembering it saves separate lookups later. Best effort: a path
+    # the cache cannot use is skipped, it never fails the route it came with
+    stack = list(paths)
+
+    while stack:
+        path = stack.pop()
+
+        try:
+            # a path splits into every one of its next paths
+            stack.extend(path.get("next") or [])
+
+            for token in (path["input_token"], path["output_token"]):
+                remember_token_metadata(token["address"]["address"], token.get("metadata"))
+        except (KeyError, TypeError, AttributeError) as e:
+            logger.debug(f"Skipping metadata of a route path: {e.__class__.__name__} {str(e)}")
+
+
 async def build_paths(client: AsyncClient, routes: list[SwapRoute]) -> list:
+    tokens = list({token for swap_route in routes for pool in swap_route.pools
+                   for token in (pool.input_token, pool.output_token)})
+    metadata = dict(zip(tokens, await asyncio.gather(*(get_token_metadata(client, token) for token in tokens))))
+
     paths = []
     for swap_route in routes:
         current_path = None
@@ -34,8 +61,8 @@ async def build_paths(client: AsyncClient, routes: list[SwapRoute]) -> list:
             amount_in = pool.amount_in
             amount_out = pool.amount_out
 
-            input_metadata = await get_token_metadata(client, input_token)
-            output_metadata = await get_token_metadata(client, output_token)
+            input_metadata = metadata[input_token]
+            output_metadata = metadata[output_token]
 
             path = {
                 "blockchain": "ton",
@@ -82,6 +109,7 @@ async def build_paths(client: AsyncClient, routes: list[SwapRoute]) -> list:
 
 
 class SwapCoffeeRouteProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=5, burst=5, max_concurrency=8)
 
     def __init__(self):
         super().__init__()
@@ -114,6 +142,9 @@ class SwapCoffeeRouteProvider(DexRouteProvider):
 
         data = response.json()
 
+        remember_token_metadata(data["output_token"]["address"]["address"], data["output_token"]["metadata"])
+        harvest_paths_metadata(data["paths"])
+
         return DexRoute(
             input_token=input_token,
             output_token=BlockchainToken(address=data["output_token"]["address"]["address"],
@@ -134,6 +165,10 @@ class SwapCoffeeRouteProvider(DexRouteProvider):
     def is_dex(self):
         return False
 
+    def throttle_emulation(self):
+        # /v2/route/transactions is called before every emulation, it counts against the swap.coffee limit
+        return self.throttle()
+
     async def emulate_route(self, client: AsyncClient, sender: EmulationSender, route: DexRoute) -> EmulatedResult:
         body = {
             "slippage": sender.slippage,
@@ -158,8 +193,7 @@ class SwapCoffeeRouteProvider(DexRouteProvider):
                 swap_input_amount=int(path["swap"]["input_amount"] * 10 ** path["input_token"]["metadata"]["decimals"]),
             ))
 
-        session_id = await create_session(client, sender.mc_block_seqno)
-        result = await emulate_internal_messages(self.get_name(), client, messages, session_id)
+        result = await emulate_on_block(self.get_name(), client, messages, sender.mc_block_seqno)
 
         output, gas_used = await get_total_swap_output(result)
 
@@ -1,14 +1,17 @@
 import httpx
 from httpx import AsyncClient
 
-from emulator.emulator import UnsignedMessage, emulate_internal_messages, get_total_swap_output, create_session
+from emulator.emulator import UnsignedMessage, get_total_swap_output
+from emulator.session import emulate_on_block
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, \
     EmulationSender, EmulatedResult
+from common.limiter import RateLimit
 
 TON_ADDRESS = "EQAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAM9c"
 
 
 class TitanTgProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=2, burst=2, max_concurrency=2)
 
     def __init__(self):
         super().__init__()
@@ -54,6 +57,10 @@ class TitanTgProvider(DexRouteProvider):
     def is_dex(self):
         return False
 
+    def throttle_emulation(self):
+        # titan's /v1/swap-messages builds the messages to emulate
+        return self.throttle()
+
     async def emulate_route(self, client: httpx.AsyncClient, sender: EmulationSender, route: DexRoute) -> EmulatedResult:
         body = {
             "senderAddress": sender.wallet_address,
@@ -79,8 +86,7 @@ class TitanTgProvider(DexRouteProvider):
                 swap_input_amount=int(path["amountIn"]),
             ))
 
-        session_id = await create_session(client, sender.mc_block_seqno)
-        result = await emulate_internal_messages(self.get_name(), client, messages, session_id)
+        result = await emulate_on_block(self.get_name(), client, messages, sender.mc_block_seqno)
         output, gas_used = await get_total_swap_output(result)
 
         return EmulatedResult(
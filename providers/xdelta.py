@@ -1,15 +1,19 @@
-import asyncio
+from contextlib import nullcontext
 
 import httpx
 from httpx import AsyncClient
 
-from common.util import address_to_friendly
-from emulator.emulator import UnsignedMessage, emulate_internal_messages, get_total_swap_output, create_session
+from common.util import address_forms
+from emulator.emulator import UnsignedMessage, get_total_swap_output
+from emulator.session import emulate_on_block
 from common.models import DexRouteProvider, DexRoute, BuildRouteRequest, \
-    EmulationSender, EmulatedResult
+    EmulationSender, EmulatedResult, EMULATOR_LIMITER
+from common.limiter import RateLimit
+from common.deadline import sleep_within_deadline
 
 
 class XdeltaRouteProvider(DexRouteProvider):
+    rate_limit = RateLimit(rate=1, burst=2, max_concurrency=4)
 
     def __init__(self):
         super().__init__()
@@ -24,8 +28,8 @@ class XdeltaRouteProvider(DexRouteProvider):
         output_token_address = output_token.address
 
         body = {
-            "input_token": "TON" if input_token_address == "native" else address_to_friendly(input_token_address),
-            "output_token": "TON" if output_token_address == "native" else address_to_friendly(output_token_address),
+            "input_token": address_forms(input_token_address).friendly_or("TON"),
+            "output_token": address_forms(output_token_address).friendly_or("TON"),
             "input_amount": str(input_amount / 10 ** input_token.decimals),
             "max_splits": request.max_splits,
             "max_length": request.max_length,
@@ -33,10 +37,10 @@ class XdeltaRouteProvider(DexRouteProvider):
         }
 
         response = await client.post(f"{self.api_url}/api/v1/route", json=body)
-        data = response.json()
-
         response.raise_for_status()
 
+        data = response.json()
+
         return DexRoute(
             input_token=input_token,
             output_token=output_token,
@@ -53,8 +57,13 @@ class XdeltaRouteProvider(DexRouteProvider):
     def is_dex(self):
         return False
 
+    def throttle_emulation(self):
+        # slots are taken inside emulate_route, none of them is held through the pause before composing
+        return nullcontext()
+
     async def emulate_route(self, client: httpx.AsyncClient, sender: EmulationSender, route: DexRoute) -> EmulatedResult:
-        await asyncio.sleep(5)
+        # fails at once when the rest of the emulation budget is shorter than the wait
+        await sleep_within_deadline(5)
 
         body = {
             "multiroute": route.extra["data"]["multiroute"],
@@ -63,8 +72,10 @@ class XdeltaRouteProvider(DexRouteProvider):
             "timeout": 300
         }
 
-        response = await client.post(f"{self.api_url}/api/v1/compose", json=body)
-        response.raise_for_status()
+        # the messages are composed by xdelta's API before they are emulated
+        async with self.throttle():
+            response = await client.post(f"{self.api_url}/api/v1/compose", json=body)
+            response.raise_for_status()
 
         data = response.json()
 
@@ -82,8 +93,8 @@ class XdeltaRouteProvider(DexRouteProvider):
                 swap_input_amount=int(path["in_amount"]),
             ))
 
-        session_id = await create_session(client, sender.mc_block_seqno)
-        result = await emulate_internal_messages(self.get_name(), client, messages, session_id)
+        async with EMULATOR_LIMITER.slot():
+            result = await emulate_on_block(self.get_name(), client, messages, sender.mc_block_seqno)
         output, gas_used = await get_total_swap_output(result)
 
         return EmulatedResult(
@@ -1,32 +1,45 @@
 #!/usr/bin/env python
 
+import sys
 import time
+from itertools import product
 from pathlib import Path
-from typing import List
+from typing import List, Awaitable
 
-from httpx import AsyncClient, Timeout, Limits
+from httpx import AsyncClient, Timeout, URL
 from pydantic import TypeAdapter
 
-from exporters.csv import CsvExporter
 from common.models import BlockchainToken, DexRouteProvider, BuildRouteRequest, \
-    EmulationSender, DexBenchmarkResult, ProviderException
+    EmulationSender, DexBenchmarkResult, ProviderException, DexBenchmarkStreamExporter, RouteTimeout
 from loguru import logger
 
-from exporters.jinja_template import Jinja2Exporter
-from providers.dedust_router_v2 import DedustRouterV2Provider
-from providers.moki_ag import MokiAgProvider
-from providers.rainbow_ag import RainbowAgProvider
-from providers.swap_coffee import SwapCoffeeRouteProvider
-from common.util import get_jetton_wallet_address, get_latest_mc_seqno
-from providers.titan_tg import TitanTgProvider
-from providers.xdelta import XdeltaRouteProvider
+from providers.registry import PROVIDER_REGISTRY, ENTRY_POINT_GROUP
+from common.scheduler import BenchmarkPair, PairScheduler, ProviderLane
+from common.cache import set_cache_dir
+from common.deadline import deadline, DeadlineExceeded, BUILD_BUDGET, EMULATION_BUDGET
+from common.journal import ResultJournal, iter_results, new_run_id, merge_journals
+from common.limiter import set_limiter_share
+from common.shard import Shard, shards, launch_shards
+from common.loop_lag import LOOP_LAG
+from common.masterchain import MasterchainTracker
+from common.timing import record_phases
+from common.transport import create_client, prewarm, CONNECTION_MODES, HTTP2_AVAILABLE
+from common.replay import HttpArchive
+from common.offload import configure_offload, shutdown_offload, OFFLOAD_MODES
+from emulator.emulator import set_trace_validation, preload_message_builder, BASE_URL as EMULATOR_URL
+from emulator.session import SESSION_POOL, set_parallel_splits
+from common.util import get_jetton_wallet_address, prefetch_jetton_wallets, save_caches, \
+    warm_address_forms
 from optparse import OptionParser
 
+# hosts every run talks to besides the providers: masterchain head and jetton wallets, token metadata, emulator
+SHARED_HOSTS = ["tonapi.io", "tokens.swap.coffee", URL(EMULATOR_URL).host]
 
 
 async def build_route(client: AsyncClient, output_token: BlockchainToken, provider: DexRouteProvider,
-                      sender: EmulationSender,
-                      max_splits: int, max_length: int, input_amount: int) -> DexBenchmarkResult:
+                      sender: Awaitable[EmulationSender],
+                      max_splits: int, max_length: int, input_amount: int, build_budget: float = BUILD_BUDGET,
+                      emulation_budget: float = EMULATION_BUDGET) -> DexBenchmarkResult:
 
     input_token = BlockchainToken(address="native", symbol="TON", decimals=9)
 
@@ -36,19 +49,37 @@ async def build_route(client: AsyncClient, output_token: BlockchainToken, provid
                                 max_splits=max_splits,
                                 max_length=max_length)
 
-    now = time.time()
+    block_seqno = None
 
     try:
-        route = await provider.build_route(client, sender, request)
-        elapsed = time.time() - now
+        sender = await sender
+        block_seqno = sender.mc_block_seqno
 
-        logger.info(f"Built route for {provider.get_name()} in {elapsed:.2f} seconds")
+        async with provider.throttle():
+            lag_mark = LOOP_LAG.mark()
+            with record_phases() as timings:
+                async with deadline("build", build_budget):
+                    route = await provider.build_route(client, sender, request)
+            elapsed = timings.total
+            loop_lag = LOOP_LAG.since(lag_mark)
+
+        logger.info(f"Built route for {provider.get_name()} in {elapsed:.2f} seconds "
+                    f"(queue: {timings.queue:.3f}, connect: {timings.connect + timings.tls:.3f}, "
+                    f"first byte: {timings.wait:.3f}, processing: {timings.processing:.3f}, event loop lag: {loop_lag:.3f})")
 
         route.provider = provider.get_name()
 
-        now = time.time()
-        emulation_result = await provider.emulate_route(client, sender, route)
-        elapsed_emulation = time.time() - now
+        # only a built route needs a session, it is created while the route waits for its emulation slot
+        SESSION_POOL.warm(client, block_seqno, 1)
+
+        async with provider.throttle_emulation():
+            now = time.perf_counter()
+            async with deadline("emulation", emulation_budget):
+                emulation_result = await provider.emulate_route(client, sender, route)
+            elapsed_emulation = time.perf_counter() - now
+
+        # waiting for an emulation slot is our own throttling, not the route's latency
+        end_to_end = elapsed + elapsed_emulation
 
         logger.info(f"Emulated route for {provider.get_name()} in {elapsed_emulation:.2f} seconds (gas used: {emulation_result.gas_used})")
 
@@ -56,19 +87,52 @@ async def build_route(client: AsyncClient, output_token: BlockchainToken, provid
         input_amount = (route.input_amount + emulation_result.gas_used) / 1e9
         ratio = output / input_amount
 
+    except DeadlineExceeded as e:
+        # cancelled at the deadline, the route could not count anyway
+        logger.warning(f"Discarded route of {provider.get_name()}: {e}")
+        raise RouteTimeout(provider, request, e.stage, e.budget, block_seqno)
     except Exception as e:
         logger.error(f"Error building route for {provider.get_name()}: {e.__class__.__name__} {str(e)}")
-        raise ProviderException(provider, request, str(e))
+        raise ProviderException(provider, request, str(e), e.__class__.__name__, block_seqno)
 
     return DexBenchmarkResult(
         route=route,
         elapsed=elapsed,
+        loop_lag=loop_lag,
+        timings=timings,
+        emulation_elapsed=elapsed_emulation,
+        end_to_end_elapsed=end_to_end,
         provider=provider,
         ratio=ratio,
-        emulation_result=emulation_result
+        emulation_result=emulation_result,
+        mc_block_seqno=block_seqno
     )
 
 
+def create_exporters(results_dir: str, run_id: str, options, providers: list[str]) -> list[DexBenchmarkStreamExporter]:
+    # imported here, numpy and jinja2 are only loaded by runs that report
+    from exporters.columnar import ColumnarStore
+    from exporters.csv import CsvExporter
+    from exporters.history import RunHistory
+    from exporters.jinja_template import Jinja2Exporter
+
+    return [
+        CsvExporter(results_dir),
+        ColumnarStore(options.store_dir or f"{results_dir}/store", run_id),
+        RunHistory(options.history or f"{results_dir}/history.sqlite", run_id,
+                   providers=None if options.export_only else providers,
+                   options=None if options.export_only else vars(options)),
+        Jinja2Exporter(
+            template_name="template.jinja2",
+            output_file=f"{results_dir}/summary.md",
+            directory="exporters",
+            # the journal does not record how connections were made
+            context={"connection_mode": None if options.export_only else options.connection_mode},
+            histograms_file=f"{results_dir}/histograms.json"
+        )
+    ]
+
+
 async def run_benchmark():
     parser = OptionParser()
 
@@ -80,8 +144,36 @@ async def run_benchmark():
     parser.add_option("--max-splits", dest="max_splits", help="Max splits", type="int", default=4)
     parser.add_option("--size", dest="size", help="Size", type="int", default=100)
     parser.add_option("--max-length", dest="max_length", help="Max length", type="int", default=5)
+    parser.add_option("--providers", dest="providers", help=f"Providers to benchmark, separated by comma (default: all but dedust and stonfi, plus {ENTRY_POINT_GROUP} plugins)", type="string", default=None)
     parser.add_option("-e", "--exclude", dest="exclude", help="Exclude providers", type="string", default="")
-
+    parser.add_option("--build-timeout", dest="build_timeout", help="Seconds a route may take to build before it is cancelled and discarded", type="float", default=BUILD_BUDGET)
+    parser.add_option("--emulation-timeout", dest="emulation_timeout", help="Seconds the emulation of a route may take before it is cancelled", type="float", default=EMULATION_BUDGET)
+    parser.add_option("--provider-concurrency", dest="provider_concurrency", help="Max in-flight pairs per provider (default: provider's own limit)", type="int", default=None)
+    parser.add_option("--lane-window", dest="lane_window", help="Max pairs a provider may run ahead of the slowest one (0: unbounded)", type="int", default=10)
+    parser.add_option("--prepare-concurrency", dest="prepare_concurrency", help="Max pairs preparing sender data at once", type="int", default=4)
+    parser.add_option("--cache-dir", dest="cache_dir", help="Directory for persistent lookup caches", type="string", default=".cache")
+    parser.add_option("--seqno-batch", dest="seqno_batch", help="Pairs emulated against the same masterchain block", type="int", default=1)
+    parser.add_option("--max-block-age", dest="max_block_age", help="Seconds after which a provider reaching a batch re-pins it to the current block", type="float", default=10)
+    parser.add_option("--seqno-interval", dest="seqno_interval", help="Masterchain head polling interval in seconds", type="float", default=2)
+    parser.add_option("--share-sessions", dest="share_sessions", help="Emulate all routes on the same block in one emulator session", action="store_true", default=False)
+    parser.add_option("--parallel-splits", dest="parallel_splits", help="Emulate splits of a route at the same time, each in its own session", action="store_true", default=False)
+    parser.add_option("--offload", dest="offload", help=f"Where CPU-bound emulation work runs: {', '.join(OFFLOAD_MODES)}", type="choice", choices=list(OFFLOAD_MODES), default="thread")
+    parser.add_option("--offload-workers", dest="offload_workers", help="Offload executor workers", type="int", default=None)
+    parser.add_option("--validate-traces", dest="validate_traces", help="Fully validate emulator traces against the schema", action="store_true", default=False)
+    parser.add_option("--connection-mode", dest="connection_mode", help=f"Connection reuse: {', '.join(CONNECTION_MODES)}", type="choice", choices=list(CONNECTION_MODES), default="warm")
+    parser.add_option("--warm-connections", dest="warm_connections", help="Connections opened to every host before the benchmark in warm mode", type="int", default=2)
+    parser.add_option("--journal", dest="journal", help="Result journal path (default: <dir>/journal.jsonl)", type="string", default=None)
+    parser.add_option("--resume", dest="resume", help="Continue the journal, skipping combinations it already has", action="store_true", default=False)
+    parser.add_option("--store-dir", dest="store_dir", help="Columnar result store kept across runs (default: <dir>/store)", type="string", default=None)
+    parser.add_option("--history", dest="history", help="Run history database (default: <dir>/history.sqlite)", type="string", default=None)
+    parser.add_option("--export-only", dest="export_only", help="Rebuild reports from the journal without benchmarking", action="store_true", default=False)
+    parser.add_option("--no-http2", dest="http2", help="Use HTTP/1.1 only", action="store_false", default=True)
+    parser.add_option("--workers", dest="workers", help="Benchmark in this many local processes, each on its own shard of the pairs", type="int", default=1)
+    parser.add_option("--shard", dest="shard", help="Benchmark only shard i of N (i/N, zero-based) into its own journal", type="string", default=None)
+    parser.add_option("--run-id", dest="run_id", help="Run id (default: a new one, or the journal's when resuming)", type="string", default=None)
+    parser.add_option("--record", dest="record", help="Record every HTTP exchange to this archive directory", type="string", default=None)
+    parser.add_option("--replay", dest="replay", help="Answer HTTP requests from this archive directory instead of the network", type="string", default=None)
+    parser.add_option("--replay-latency", dest="replay_latency", help="Scale of recorded latencies on replay (0: answer at once)", type="float", default=1)
 
     (options, args) = parser.parse_args()
     size = options.size
@@ -94,106 +186,231 @@ async def run_benchmark():
 
     jettons = jettons[:size]
 
-    timeout = Timeout(6)
-    limits = Limits(max_connections=100, max_keepalive_connections=100)
-    client = AsyncClient(timeout=timeout, limits=limits)
+    try:
+        shard = Shard.parse(options.shard) if options.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    if options.record and options.replay:
+        parser.error("--record and --replay are mutually exclusive")
+
+    if shard is not None:
+        jettons = shard.select(jettons)
+        # every worker uses its share of each API limit, so together they stay within it
+        set_limiter_share(1 / shard.count)
+        logger.configure(patcher=lambda record: record.update(message=f"[shard {shard}] {record['message']}"))
+
+    # without --shard, several workers are launched and their journals merged once all of them finish;
+    # with --export-only the journals are only merged, e.g. those of shards run on other machines
+    merge = shard is None and options.workers > 1
+
     slippage = options.slippage
     wallet = options.sender
     results_dir = options.dir
     max_splits = options.max_splits
     max_length = options.max_length
 
-    Path(results_dir).mkdir(parents=True, exist_ok=True)
-
-    logger.info(f"Starting benchmark...")
+    # providers are imported and created on first use, excluded ones and those a report does not mention never are
+    names = options.providers.split(",") if options.providers else PROVIDER_REGISTRY.defaults()
+    unknown = set(names) - set(PROVIDER_REGISTRY.names())
 
-    swap_coffee = SwapCoffeeRouteProvider()
-    providers = [
-        swap_coffee,
-        RainbowAgProvider(),
-        TitanTgProvider(),
-        XdeltaRouteProvider(),
-        # Note: swap.coffee is used as a transaction builder, because providers below do not provide a REST API for this
-        # Transaction building is required for emulation
-        # To disable this functionality, set builder=None in the provider constructor
-        # DedustProvider(swap_coffee),
-        # StonfiProvider(swap_coffee),
-        MokiAgProvider(swap_coffee),
-        DedustRouterV2Provider()
-    ]
+    if unknown:
+        parser.error(f"Unknown providers {', '.join(sorted(unknown))}, "
+                     f"expected some of {', '.join(PROVIDER_REGISTRY.names())}")
 
     if options.exclude:
-        providers = [provider for provider in providers if provider.get_name() not in options.exclude.split(",")]
+        names = [name for name in names if name not in options.exclude.split(",")]
 
+    journal_path = options.journal or f"{results_dir}/journal.jsonl"
+    journal = ResultJournal(shard.with_shard(journal_path) if shard else journal_path, options.run_id)
 
-    exporters = [
-        CsvExporter(results_dir),
-        Jinja2Exporter(
-            template_name="template.jinja2",
-            output_file=f"{results_dir}/summary.md",
-            directory="exporters"
-        )
-    ]
+    # a resumed run, and reports rebuilt from a journal, keep the id of the run that started the journal
+    if journal.run_id is None and merge and (options.resume or options.export_only):
+        journal.run_id = ResultJournal(shards(options.workers)[0].with_shard(journal_path)).recorded_run_id()
+    elif journal.run_id is None and (options.resume or options.export_only):
+        journal.run_id = journal.recorded_run_id()
+
+    journal.run_id = journal.run_id or new_run_id()
+
+    # exporters receive results as they arrive and finish their output on close, shard workers leave them
+    # to the merge step and never import them
+    exporters = [] if shard is not None else create_exporters(results_dir, journal.run_id, options, names)
+
+    def replay_journal():
+        # records of providers excluded from this run can still be reported
+        for amount, result in iter_results(journal.path, PROVIDER_REGISTRY):
+            for exporter in exporters:
+                exporter.add(amount, result)
 
-    results: dict[int, list[DexBenchmarkResult]] = {}
+    if merge and not options.export_only:
+        logger.info(f"Run {journal.run_id}, launching {options.workers} workers")
+        codes = await launch_shards(__file__, sys.argv[1:], options.workers, journal.run_id)
 
-    for input_amount in input_amounts:
-        pair_results = []
+        if any(codes):
+            logger.error("Some workers failed, their shards are incomplete; run again with --resume to finish them")
 
-        for jetton in jettons:
-            tasks = []
+    if merge:
+        merged = merge_journals([worker.with_shard(journal_path) for worker in shards(options.workers)],
+                                journal_path, resume=options.resume or options.export_only)
+        logger.info(f"Merged {merged} results of {options.workers} shards into {journal_path}")
 
-            logger.info(f"[{input_amount} TON -> {jetton.symbol}] Building routes...")
+    if options.export_only or merge:
+        replay_journal()
 
-            block_seqno = await get_latest_mc_seqno(client)
+        for exporter in exporters:
+            exporter.close()
 
-            sender = EmulationSender(
-                wallet_address=wallet,
-                jetton_wallet_address=await get_jetton_wallet_address(client, wallet, jetton.address),
-                slippage=slippage,
-                mc_block_seqno=block_seqno
-            )
+        return
 
+    providers = [PROVIDER_REGISTRY.create(name) for name in names]
+    archive = None
 
-            for provider in providers:
-                tasks.append(build_route(
+    if options.record:
+        # shard workers record archives of their own
+        archive = HttpArchive(shard.with_shard(options.record) if shard else options.record)
+        archive.open()
+    elif options.replay:
+        archive = HttpArchive(shard.with_shard(options.replay) if shard else options.replay)
+
+    hosts = set(SHARED_HOSTS).union(*(provider.get_hosts() for provider in providers))
+    client = create_client(hosts, timeout=Timeout(6), mode=options.connection_mode, http2=options.http2,
+                           archive=archive, archive_mode="replay" if options.replay else "record",
+                           latency_scale=options.replay_latency)
+
+    if options.http2 and not HTTP2_AVAILABLE:
+        logger.warning("HTTP/2 requested but the h2 package is not installed (pip install httpx[http2]), "
+                       "falling back to HTTP/1.1")
+
+    logger.info(f"Connection mode: {options.connection_mode}, "
+                f"HTTP/2: {'on' if options.http2 and HTTP2_AVAILABLE else 'off'}")
+
+    if options.connection_mode == "warm":
+        await prewarm(client, {host: options.warm_connections for host in sorted(hosts)})
+
+    Path(results_dir).mkdir(parents=True, exist_ok=True)
+    set_cache_dir(options.cache_dir)
+    warm_address_forms([wallet] + [jetton.address for jetton in jettons])
+
+    logger.info(f"Prefetching jetton wallets for {len(jettons)} jettons...")
+    await prefetch_jetton_wallets(client, wallet, [jetton.address for jetton in jettons],
+                                  concurrency=options.prepare_concurrency)
+
+    SESSION_POOL.shared = options.share_sessions
+    set_trace_validation(options.validate_traces)
+    preload_message_builder()
+    set_parallel_splits(options.parallel_splits)
+    configure_offload(options.offload, options.offload_workers)
+    LOOP_LAG.start()
+
+    tracker = MasterchainTracker(client, interval=options.seqno_interval)
+    await tracker.start()
+
+    logger.info(f"Starting benchmark...")
+
+    async def prepare_pair(pair: BenchmarkPair) -> EmulationSender:
+        block_seqno = await tracker.pin(pair.index // options.seqno_batch)
+
+        logger.info(f"[{pair.input_amount} TON -> {pair.output_token.symbol}] Using block {block_seqno} "
+                    f"(head moved {tracker.staleness:.2f}s ago)")
+
+        return EmulationSender(
+            wallet_address=wallet,
+            jetton_wallet_address=await get_jetton_wallet_address(client, wallet, pair.output_token.address),
+            slippage=slippage,
+            mc_block_seqno=block_seqno
+        )
+
+    async def current_sender(pair: BenchmarkPair, sender: Awaitable[EmulationSender]) -> EmulationSender:
+        # a provider reaching the batch long after it was pinned would emulate on an old block, it moves the pin
+        sender = await sender
+        block_seqno = await tracker.pin(pair.index // options.seqno_batch, max_age=options.max_block_age)
+
+        if block_seqno == sender.mc_block_seqno:
+            return sender
+
+        logger.info(f"[{pair.input_amount} TON -> {pair.output_token.symbol}] Re-pinned to block {block_seqno}")
+
+        return sender.model_copy(update={"mc_block_seqno": block_seqno})
+
+    def lane_job(provider: DexRouteProvider, splits: int):
+        async def job(pair: BenchmarkPair, sender: Awaitable[EmulationSender]):
+            try:
+                result = await build_route(
                     client=client,
-                    output_token=jetton,
+                    output_token=pair.output_token,
                     provider=provider,
-                    sender=sender,
-                    max_splits=max_splits,
+                    sender=current_sender(pair, sender),
+                    max_splits=splits,
                     max_length=max_length,
-                    input_amount=input_amount
-                ))
+                    input_amount=pair.input_amount,
+                    build_budget=options.build_timeout,
+                    emulation_budget=options.emulation_timeout
+                )
+            except ProviderException as e:
+                result = e
+
+            journal.append(pair.input_amount, result)
+
+            # the journal and the exporters own the result from here, nothing is kept in memory
+            for exporter in exporters:
+                exporter.add(pair.input_amount, result)
+
+        return job
+
+    def lane_skip(provider: DexRouteProvider, splits: int):
+        def skip(pair: BenchmarkPair) -> bool:
+            return (pair.input_amount, pair.output_token.address, provider.get_name(), splits) in completed
 
-                if isinstance(provider, SwapCoffeeRouteProvider):
-                    tasks.append(build_route(
-                        client=client,
-                        output_token=jetton,
-                        provider=provider,
-                        sender=sender,
-                        max_splits=20,
-                        max_length=max_length,
-                        input_amount=input_amount
-                    ))
+        return skip
 
+    completed = journal.completed() if options.resume else set()
+    journal.open(resume=options.resume)
 
-            res = await asyncio.gather(*tasks, return_exceptions=True)
+    logger.info(f"Run {journal.run_id}")
 
-            logger.info(f"[{input_amount} TON -> {jetton.symbol}] ")
+    if completed:
+        logger.info(f"Resuming {journal.path} with {len(completed)} results already recorded")
+        replay_journal()
 
-            pair_results.extend(res)
+    lanes = []
+
+    for provider in providers:
+        concurrency = options.provider_concurrency or provider.limiter.limit.max_concurrency
+
+        lanes.append(ProviderLane(provider.get_name(), lane_job(provider, max_splits), concurrency,
+                                  skip=lane_skip(provider, max_splits)))
+
+        if provider.get_name() == "swap.coffee":
+            lanes.append(ProviderLane(f"{provider.get_name()} (20 splits)", lane_job(provider, 20), concurrency,
+                                      skip=lane_skip(provider, 20)))
+
+    pairs = [BenchmarkPair(index=idx, input_amount=input_amount, output_token=jetton)
+             for idx, (input_amount, jetton) in enumerate(product(input_amounts, jettons))]
+
+    scheduler = PairScheduler(prepare_pair, prepare_concurrency=options.prepare_concurrency,
+                              window=options.lane_window or None)
+
+    try:
+        await scheduler.run(pairs, lanes)
+    finally:
+        await journal.close()
 
-            logger.info(f"[{input_amount} TON -> {jetton.symbol}] Sleeping for 2 seconds...")
-            await asyncio.sleep(2)
+        for exporter in exporters:
+            exporter.close()
 
-        results[input_amount] = pair_results
+    await tracker.stop()
+    LOOP_LAG.stop()
+    shutdown_offload()
 
-        logger.info(f"Finished benchmark for {input_amount} input amount")
+    logger.info(f"Finished benchmark for {len(pairs)} pairs")
+    logger.info(f"Emulation sessions: {SESSION_POOL.stats}")
+    logger.info(f"Event loop lag: {LOOP_LAG.total_lag:.2f}s total, {LOOP_LAG.max_lag * 1000:.1f}ms max")
 
+    save_caches()
+    await client.aclose()
 
-    for exporter in exporters:
-        exporter.export(results)
+    if options.record:
+        archive.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+from datetime import datetime, timezone
+from optparse import OptionParser
+
+from exporters.history import RunHistory, PERCENTILES, ProviderDiff
+
+
+def format_rate(value: float | None) -> str:
+    return "n/a" if value is None else f"{value * 100:.1f}%"
+
+
+def format_change(value: float | None, scale: float = 1, unit: str = "", digits: int = 1) -> str:
+    return "" if value is None else f" ({value * scale:+.{digits}f}{unit})"
+
+
+def format_run(run) -> str:
+    started = datetime.fromtimestamp(run["started_at"], timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+    return f"{run['run_id']} (started {started} UTC, {run['results']} results, blocks {run['min_seqno']}-{run['max_seqno']})"
+
+
+def format_diff(provider: str, amount: int, diff: ProviderDiff) -> str:
+    before, after = diff.before, diff.after
+    columns = [provider, str(amount)]
+
+    columns.append(f"{format_rate(before.win_rate if before else None)} -> {format_rate(after.win_rate if after else None)}"
+                   f"{format_change(diff.win_rate_change, 100, 'pp')}")
+
+    for percentile in PERCENTILES:
+        latency = after.latency if after and after.latency else None
+        columns.append("n/a" if latency is None else
+                       f"{latency[percentile]:.3f}s{format_change(diff.latency_change(percentile), unit='s', digits=3)}")
+
+    columns.append(str(len(after.failures) if after else 0))
+    columns.append(str(len(diff.new_failures)))
+
+    return "| " + " | ".join(columns) + " |"
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [BEFORE_RUN AFTER_RUN]")
+
+    parser.add_option("--db", dest="db", help="Run history database", type="string", default="results/history.sqlite")
+    parser.add_option("--list", dest="list", help="List recorded runs", action="store_true", default=False)
+    parser.add_option("--failures", dest="failures", help="Max new failures listed per provider", type="int", default=10)
+
+    (options, args) = parser.parse_args()
+
+    history = RunHistory(options.db)
+    runs = {run["run_id"]: run for run in history.runs()}
+
+    if options.list:
+        for run in runs.values():
+            print(format_run(run))
+        return
+
+    if args and len(args) != 2:
+        parser.error("expected two run ids")
+
+    if not args and len(runs) < 2:
+        parser.error(f"need two recorded runs to compare, {options.db} has {len(runs)}")
+
+    # the two latest runs by default
+    before, after = args or list(runs)[-2:]
+
+    if before not in runs or after not in runs:
+        parser.error(f"unknown run, recorded runs: {', '.join(runs) or 'none'}")
+
+    print(f"Before: {format_run(runs[before])}")
+    print(f"After:  {format_run(runs[after])}")
+    print()
+    print("| Provider | Amount | Win rate | " + " | ".join(f"p{p} build time" for p in PERCENTILES) +
+          " | Failures | New failures |")
+    print("|" + "---|" * (len(PERCENTILES) + 5))
+
+    diffs = history.diff(before, after)
+
+    for (provider, amount), diff in diffs.items():
+        print(format_diff(provider, amount, diff))
+
+    for (provider, amount), diff in diffs.items():
+        new_failures = sorted(diff.new_failures)
+        if not new_failures:
+            continue
+
+        listed = ", ".join(f"{symbol} (max splits {splits})" for symbol, splits in new_failures[:options.failures])
+        more = f" and {len(new_failures) - options.failures} more" if len(new_failures) > options.failures else ""
+
+        print(f"\nNew failures for {provider} at {amount} TON: {listed}{more}")
+
+    history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import sys
+import time
+from optparse import OptionParser
+from pathlib import Path
+
+from emulator.analyzer import analyze_trace
+from emulator.synthetic import TraceShape, TraceSummary, TraceGenerator, write_trace, DEXES, EXCESS_PATTERNS
+from emulator.trace import decode_trace
+
+
+def parse_dexes(value: str) -> dict[str, float]:
+    # "dedust=2,stonfi=1" or "dedust,stonfi"
+    dexes = {}
+
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        dexes[name.strip()] = float(weight) if weight else 1.0
+
+    return dexes
+
+
+def check(path: Path, shape: TraceShape, summary: TraceSummary) -> list[str]:
+    # the analysis of the written trace has to find what the generator put into it
+    analysis = analyze_trace(decode_trace(path.read_bytes()).result, shape.sender, shape.jetton_wallet,
+                             shape.input_amount)
+    failed_hops = sum(hop.exit_code != 0 for hop in analysis.hops)
+
+    expected = {"output": summary.output, "excesses": summary.excesses, "hops": summary.hops,
+                "failed hops": summary.failed_hops}
+    found = {"output": analysis.output, "excesses": analysis.excesses, "hops": len(analysis.hops),
+             "failed hops": failed_hops}
+
+    return [f"{name}: expected {expected[name]}, found {found[name]}" for name in expected if expected[name] != found[name]]
+
+
+def main():
+    parser = OptionParser(usage="python -m scripts.generate_traces [options]")
+
+    parser.add_option("--hops", dest="hops", help="Swaps along every split", type="int", default=2)
+    parser.add_option("--fanout", dest="fanout", help="Side messages sent by every hop", type="int", default=0)
+    parser.add_option("--splits", dest="splits", help="Parallel chains the route splits into", type="int", default=1)
+    parser.add_option("--dexes", dest="dexes", help=f"Dex mix with optional weights, e.g. dedust=2,stonfi=1 ({', '.join(DEXES)})", type="string", default=",".join(DEXES))
+    parser.add_option("--bounce-rate", dest="bounce_rate", help="Probability that a hop fails and bounces", type="float", default=0)
+    parser.add_option("--excess", dest="excess", help=f"Excess pattern: {', '.join(EXCESS_PATTERNS)}", type="choice", choices=list(EXCESS_PATTERNS), default="final")
+    parser.add_option("--seed", dest="seed", help="Seed of the first trace, the next ones count up from it", type="int", default=0)
+    parser.add_option("--count", dest="count", help="Traces to generate", type="int", default=1)
+    parser.add_option("--out", dest="out", help="Output directory", type="string", default="traces")
+    parser.add_option("--check", dest="check", help="Analyze every trace and compare with what was generated", action="store_true", default=False)
+
+    (options, args) = parser.parse_args()
+
+    base = TraceShape(hops=options.hops, fanout=options.fanout, splits=options.splits,
+                      dexes=parse_dexes(options.dexes), bounce_rate=options.bounce_rate, excess=options.excess)
+
+    try:
+        TraceGenerator(base)
+    except ValueError as e:
+        parser.error(str(e))
+
+    directory = Path(options.out)
+    directory.mkdir(parents=True, exist_ok=True)
+    failures = 0
+
+    for seed in range(options.seed, options.seed + options.count):
+        shape = base.model_copy(update={"seed": seed})
+        path = directory / f"trace-h{shape.hops}-f{shape.fanout}-s{shape.splits}-{seed}.json"
+        started_at = time.perf_counter()
+
+        with open(path, "w") as file:
+            summary = write_trace(shape, file)
+
+        print(f"{path}: {summary.transactions} transactions, depth {summary.max_depth}, {summary.hops} hops "
+              f"({summary.failed_hops} failed), output {summary.output}, {path.stat().st_size / 2 ** 20:.1f} MiB "
+              f"in {time.perf_counter() - started_at:.2f}s")
+
+        if options.check:
+            mismatches = check(path, shape, summary)
+            failures += bool(mismatches)
+
+            for mismatch in mismatches:
+                print(f"  mismatch {mismatch}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import asyncio
+from pathlib import Path
+
+from common.journal import ResultJournal
+from common.models import BlockchainToken, BuildRouteRequest, DexRouteProvider, DexRoute, DexBenchmarkResult, \
+    EmulationSender, ProviderException
+
+TON = BlockchainToken(address="native", symbol="TON", decimals=9)
+
+
+class DummyProvider(DexRouteProvider):
+
+    def __init__(self, name: str = "dummy"):
+        self.name = name
+
+        super().__init__()
+
+    async def build_route(self, client, sender: EmulationSender, request: BuildRouteRequest) -> DexRoute:
+        raise NotImplementedError
+
+    def get_name(self) -> str:
+        return self.name
+
+    def is_dex(self):
+        return False
+
+
+def jetton(idx: int) -> BlockchainToken:
+    return BlockchainToken(address=f"EQ{idx:04d}", symbol=f"J{idx}", decimals=9)
+
+
+def request(idx: int, amount: int = 10, max_splits: int = 4) -> BuildRouteRequest:
+    return BuildRouteRequest(input_token=TON, output_token=jetton(idx), input_amount=amount * 10 ** 9,
+                             max_splits=max_splits, max_length=3)
+
+
+def result(provider: DexRouteProvider, idx: int, amount: int = 10, elapsed: float = 0.5) -> DexBenchmarkResult:
+    route_request = request(idx, amount)
+    route = DexRoute(input_token=TON, output_token=route_request.output_token, provider=provider.get_name(),
+                     input_amount=route_request.input_amount, output_amount=1000 + idx, request=route_request)
+
+    return DexBenchmarkResult(route=route, elapsed=elapsed, emulation_elapsed=0.1, end_to_end_elapsed=elapsed + 0.1,
+                              ratio=1.0, provider=provider, mc_block_seqno=100)
+
+
+def write_journal(path: Path, run_id: str | None, records: list[tuple[int, DexBenchmarkResult | ProviderException]]):
+    async def write():
+        journal = ResultJournal(path, run_id)
+        journal.open(resume=True)
+
+        for amount, record in records:
+            journal.append(amount, record)
+
+        await journal.close()
+
+    asyncio.run(write())
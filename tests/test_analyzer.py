@@ -0,0 +1,92 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from common.util import address_to_raw
+from emulator.analyzer import analyze_trace, PAYOUT_OP_CODES
+from emulator.emulator import EmulatedTransaction, UnsignedMessage, get_total_swap_output
+from emulator.models import EmulatorResult, InternalMsgBodyJettonInternalTransfer
+from emulator.synthetic import TraceShape, generate_trace, write_trace
+from emulator.trace import decode_trace
+
+SHAPES = [
+    TraceShape(),
+    TraceShape(hops=4, fanout=2, excess="every_hop", seed=1),
+    TraceShape(hops=3, fanout=1, bounce_rate=0.5, excess="none", seed=2),
+    TraceShape(hops=5, bounce_rate=1, seed=3),
+]
+
+
+def emulated(shape: TraceShape, result) -> EmulatedTransaction:
+    message = UnsignedMessage(src=shape.sender, dest=shape.router, body="", value=0,
+                              swap_input_amount=shape.input_amount, jetton_wallet=shape.jetton_wallet)
+
+    return EmulatedTransaction(message=message, emulation_result=result)
+
+
+def recursive_swap_output(shape: TraceShape, root) -> tuple[int, int]:
+    # the recursive walk over the validated result the analyzer replaced
+    sender_raw = address_to_raw(shape.sender)
+    jetton_wallet_raw = address_to_raw(shape.jetton_wallet)
+    output = excesses = 0
+
+    def visit(model):
+        nonlocal output, excesses
+
+        if isinstance(model.in_msg.decoded_body, InternalMsgBodyJettonInternalTransfer) and \
+                model.in_msg.dest == jetton_wallet_raw:
+            output += model.in_msg.decoded_body.amount
+
+        if model.in_msg.dest == sender_raw and model.compute_phase.exit_code == 0 and \
+                model.in_msg.decoded_op not in PAYOUT_OP_CODES:
+            excesses += model.in_msg.value
+
+        for child in model.children:
+            visit(child)
+
+    visit(root)
+
+    return output, max(0, root.in_msg.value - shape.input_amount - excesses)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_analysis_matches_validated_result(shape):
+    data, summary = generate_trace(shape)
+    content = json.dumps(data)
+    full = EmulatorResult.model_validate_json(content)
+    fast = decode_trace(content)
+
+    sender_raw, jetton_wallet_raw = address_to_raw(shape.sender), address_to_raw(shape.jetton_wallet)
+    analysis = analyze_trace(fast.result, sender_raw, jetton_wallet_raw, shape.input_amount)
+
+    assert analysis == analyze_trace(full.result, sender_raw, jetton_wallet_raw, shape.input_amount)
+    assert (analysis.output, analysis.excesses, len(analysis.hops)) == (summary.output, summary.excesses, summary.hops)
+    assert sum(hop.exit_code != 0 for hop in analysis.hops) == summary.failed_hops
+
+    expected = recursive_swap_output(shape, full.result)
+    assert asyncio.run(get_total_swap_output([emulated(shape, full)])) == expected
+    assert asyncio.run(get_total_swap_output([emulated(shape, fast)])) == expected
+
+
+def test_splits_add_up():
+    shapes = [TraceShape(seed=seed) for seed in range(3)]
+    results = [emulated(shape, decode_trace(json.dumps(generate_trace(shape)[0]))) for shape in shapes]
+
+    output, gas_used = asyncio.run(get_total_swap_output(results))
+    singles = [asyncio.run(get_total_swap_output([result])) for result in results]
+
+    assert output == sum(single[0] for single in singles)
+    assert gas_used == sum(single[1] for single in singles)
+
+
+def test_deep_trace_within_default_recursion_limit():
+    file = io.StringIO()
+    shape = TraceShape(hops=300, seed=5)
+    summary = write_trace(shape, file)
+
+    analysis = analyze_trace(decode_trace(file.getvalue()).result, address_to_raw(shape.sender),
+                             address_to_raw(shape.jetton_wallet), shape.input_amount)
+
+    assert (analysis.output, len(analysis.hops)) == (summary.output, summary.hops)
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from common.models import ProviderException
+from common.timing import PhaseTimings
+from exporters.columnar import ColumnarStore
+from tests.factories import DummyProvider, request, result
+
+
+def record_run(directory, run_id: str, records: list):
+    # a small capacity, so the rows buffer grows while the run is recorded
+    store = ColumnarStore(directory, run_id, capacity=2)
+    for amount, record in records:
+        store.add(amount, record)
+    store.close()
+
+    return store
+
+
+def test_segment_round_trip(tmp_path):
+    alpha, beta = DummyProvider("alpha"), DummyProvider("beta")
+    timed = result(alpha, 2, elapsed=0.75)
+    timed.loop_lag = 0.05
+    timed.timings = PhaseTimings(queue=0.1, dns=0.01, wait=0.3, total=0.7, connections=2)
+
+    store = record_run(tmp_path, "first", [
+        (10, result(alpha, 1)),
+        (10, timed),
+        (10, ProviderException(beta, request(1), "boom", "HTTPStatusError", mc_block_seqno=101)),
+        (100, result(beta, 3, amount=100)),
+        (100, ProviderException(alpha, request(3, amount=100), "failed")),
+    ])
+
+    assert store.runs() == ["first"]
+
+    table = store.segment("first")
+    assert isinstance(table.rows, np.memmap)
+    assert len(table) == 5
+
+    assert table.decode("provider").tolist() == ["alpha", "alpha", "beta", "beta", "alpha"]
+    assert table.decode("output_symbol").tolist() == ["J1", "J2", "J1", "J3", "J3"]
+    assert table.decode("error_type").tolist() == ["", "", "HTTPStatusError", "", "Error"]
+    assert table.decode("run").tolist() == ["first"] * 5
+    assert table.ok().tolist() == [True, True, False, True, False]
+
+    rows = table.rows
+    assert rows["amount"].tolist() == [10, 10, 10, 100, 100]
+    assert rows["input_amount"].tolist() == [10, 10, 10, 100, 100]
+    assert rows["output_amount"][:2].tolist() == pytest.approx([1001e-9, 1002e-9])
+    assert rows["mc_block_seqno"].tolist() == [100, 100, 101, 100, 0]
+    assert rows["max_splits"].tolist() == [4] * 5
+    assert rows["elapsed"].tolist() == pytest.approx([0.5, 0.75, 0, 0.5, 0])
+    assert rows["loop_lag"][1] == pytest.approx(0.05)
+    assert rows["queue"][1] == pytest.approx(0.1)
+    assert rows["wait"][1] == pytest.approx(0.3)
+    assert rows["processing"][1] == pytest.approx(0.29)
+    assert rows["connections"].tolist() == [0, 2, 0, 0, 0]
+    # a failed result leaves everything it does not set at zero
+    assert rows["ratio"].tolist() == [1, 1, 0, 1, 0]
+
+
+def test_load_shares_dictionaries_across_runs(tmp_path):
+    alpha, beta = DummyProvider("alpha"), DummyProvider("beta")
+    record_run(tmp_path, "first", [(10, result(alpha, 1)), (10, result(beta, 1))])
+    # the same strings get other codes in the second segment
+    store = record_run(tmp_path, "second", [(10, result(beta, 2)), (10, ProviderException(alpha, request(1), "x")),
+                                            (10, result(alpha, 3))])
+
+    assert store.runs() == ["first", "second"]
+
+    table = store.load(columns=["run", "provider", "output_symbol", "error_type", "ratio"])
+    assert table.rows.dtype.names == ("run", "provider", "output_symbol", "error_type", "ratio")
+    assert table.decode("run").tolist() == ["first", "first", "second", "second", "second"]
+    assert table.decode("provider").tolist() == ["alpha", "beta", "beta", "alpha", "alpha"]
+    assert table.decode("output_symbol").tolist() == ["J1", "J1", "J2", "J1", "J3"]
+
+    beta_rows = table.rows["provider"] == table.code("provider", "beta")
+    assert table.decode("output_symbol", table.rows["output_symbol"][beta_rows]).tolist() == ["J1", "J2"]
+    assert (table.ok() & (table.rows["provider"] == table.code("provider", "alpha"))).sum() == 2
+    assert table.code("provider", "gamma") == -1
+
+    assert len(store.load(runs=["second"])) == 3
+
+
+def test_resumed_run_replaces_its_segment(tmp_path):
+    provider = DummyProvider()
+    record_run(tmp_path, "run", [(10, result(provider, 1)), (10, result(provider, 2))])
+    # a resumed run replays its journal and records every result again
+    store = record_run(tmp_path, "run", [(10, result(provider, 1)), (10, result(provider, 2)),
+                                         (10, result(provider, 3))])
+
+    assert store.runs() == ["run"]
+    assert store.segment("run", mmap=False).decode("output_symbol").tolist() == ["J1", "J2", "J3"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_empty_store(tmp_path):
+    store = ColumnarStore(tmp_path / "columns", "run")
+    store.close()
+
+    assert not (tmp_path / "columns").exists()
+    assert len(ColumnarStore(tmp_path).load()) == 0
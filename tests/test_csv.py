@@ -0,0 +1,65 @@
+import asyncio
+import csv
+
+from common.models import ProviderException
+from exporters.csv import CsvExporter, HEADER
+from tests.factories import DummyProvider, request, result
+
+# columns of the CSV files before the timing columns were added
+ORIGINAL_HEADER = ['provider', 'input_token_symbol', 'output_token_symbol', 'input_amount', 'ratio',
+                   'emulated_output_amount', 'output_amount', 'gas_used', 'elapsed', 'max_splits', 'max_length',
+                   'splits', 'error_message']
+
+
+def read_rows(path) -> list[dict]:
+    with open(path, newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def test_original_columns_keep_their_positions():
+    assert HEADER[:len(ORIGINAL_HEADER)] == ORIGINAL_HEADER
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    provider = DummyProvider()
+    exporter = CsvExporter(str(tmp_path), flush_rows=3, flush_interval=60)
+
+    exporter.add(10, result(provider, 1))
+    exporter.add(100, result(provider, 2, amount=100))
+    assert read_rows(tmp_path / "10.csv") == []
+
+    exporter.add(10, ProviderException(provider, request(3), "boom"))
+    rows = read_rows(tmp_path / "10.csv")
+    assert [(row["output_token_symbol"], row["error_message"]) for row in rows] == [("J1", ""), ("J3", "boom")]
+    assert len(read_rows(tmp_path / "100.csv")) == 1
+
+    exporter.close()
+
+
+def test_waiting_rows_are_flushed_without_new_results(tmp_path):
+    provider = DummyProvider()
+
+    async def run():
+        exporter = CsvExporter(str(tmp_path), flush_rows=100, flush_interval=0.05)
+        exporter.add(10, result(provider, 1))
+        before = read_rows(tmp_path / "10.csv")
+
+        # a slow pair, nothing else is added meanwhile
+        await asyncio.sleep(0.2)
+        after = read_rows(tmp_path / "10.csv")
+        exporter.close()
+
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert before == []
+    assert [row["elapsed"] for row in after] == ["0.5"]
+
+
+def test_export_without_a_loop(tmp_path):
+    provider = DummyProvider()
+
+    CsvExporter(str(tmp_path)).export({10: [result(provider, idx) for idx in range(5)]})
+
+    assert len(read_rows(tmp_path / "10.csv")) == 5
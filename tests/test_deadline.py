@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from common.deadline import deadline, DeadlineExceeded, CURRENT_DEADLINE
+from common.journal import load_results
+from common.models import RouteTimeout
+from tests.factories import DummyProvider, request, write_journal
+
+
+def test_stage_past_its_deadline_is_cancelled():
+    cancelled = False
+
+    async def run():
+        nonlocal cancelled
+
+        async with deadline("build", 0.05):
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+    with pytest.raises(DeadlineExceeded) as e:
+        asyncio.run(run())
+
+    assert (e.value.stage, e.value.budget) == ("build", 0.05)
+    assert cancelled
+
+
+def test_inner_timeout_is_not_the_deadlines():
+    async def run():
+        async with deadline("emulation", 1):
+            async with asyncio.timeout(0.01):
+                await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
+
+
+def test_current_deadline_is_set_within_the_stage():
+    async def run():
+        async with deadline("emulation", 5) as current:
+            assert CURRENT_DEADLINE.get() is current
+            assert 0 < current.remaining() <= 5
+
+        assert CURRENT_DEADLINE.get() is None
+
+    asyncio.run(run())
+
+
+def test_timeouts_are_restored_from_the_journal(tmp_path):
+    provider = DummyProvider()
+    path = tmp_path / "journal.jsonl"
+    write_journal(path, "run", [(10, RouteTimeout(provider, request(1), "emulation", 30.0, 100))])
+
+    [timeout] = load_results(path, {"dummy": provider})[10]
+
+    assert isinstance(timeout, RouteTimeout)
+    assert (timeout.stage, timeout.budget, timeout.error_type) == ("emulation", 30.0, "EmulationTimeout")
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from common.histogram import LatencyHistogram, merge_histograms, save_histograms, load_histograms
+
+
+def latencies(size: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).lognormal(mean=-1, sigma=1, size=size)
+
+
+def histogram_of(values: np.ndarray) -> LatencyHistogram:
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(float(value))
+
+    return histogram
+
+
+def test_percentiles_within_one_percent():
+    values = latencies(20_000)
+    percentiles = [1, 25, 50, 90, 99, 99.9, 100]
+
+    expected = np.percentile(values, percentiles, method="inverted_cdf")
+
+    assert histogram_of(values).percentiles(percentiles) == pytest.approx(expected, rel=0.01)
+
+
+def test_merge_equals_recording_everything_in_one():
+    values = latencies(5_000)
+    merged = histogram_of(values[:2_000]).merge(histogram_of(values[2_000:]))
+    whole = histogram_of(values)
+
+    assert np.array_equal(merged.counts, whole.counts)
+    assert (merged.total, merged.min, merged.max, merged.mean) == (whole.total, whole.min, whole.max, whole.mean)
+
+
+def test_merge_histograms_leaves_inputs_untouched(tmp_path):
+    first = {"build": histogram_of(latencies(100, seed=1))}
+    second = {"build": histogram_of(latencies(100, seed=2)), "emulation": histogram_of(latencies(10, seed=3))}
+
+    save_histograms(tmp_path / "histograms.json", first)
+    merged = merge_histograms(load_histograms(tmp_path / "histograms.json"), second)
+
+    assert merged["build"].total == 200
+    assert merged["emulation"].total == 10
+    assert first["build"].total == 100
+    assert merged["emulation"] is not second["emulation"]
+
+
+def test_merge_rejects_different_settings():
+    with pytest.raises(ValueError):
+        LatencyHistogram(significant_digits=2).merge(LatencyHistogram(significant_digits=3))
+
+
+def test_values_past_the_highest_saturate():
+    histogram = LatencyHistogram(highest_value=10)
+    histogram.record(60)
+
+    assert histogram.max == 10
+    assert histogram.percentile(100) == 10
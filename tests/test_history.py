@@ -0,0 +1,104 @@
+import pytest
+
+from common.models import ProviderException
+from exporters.history import RunHistory
+from tests.factories import DummyProvider, request, result
+
+ALPHA, BETA = DummyProvider("alpha"), DummyProvider("beta")
+
+
+def scored(provider, idx: int, ratio: float, elapsed: float = 0.5, amount: int = 10):
+    r = result(provider, idx, amount, elapsed)
+    r.ratio = ratio
+
+    return r
+
+
+def record_run(path, run_id: str, records: list):
+    history = RunHistory(path, run_id, providers=["alpha", "beta"], options={"max_splits": 4}, batch=2)
+    for amount, record in records:
+        history.add(amount, record)
+    history.close()
+
+
+@pytest.fixture
+def history(tmp_path):
+    path = tmp_path / "history.sqlite"
+
+    record_run(path, "before", [
+        (10, scored(ALPHA, 1, 1.0, elapsed=0.2)),
+        (10, scored(BETA, 1, 1.0, elapsed=0.4)),
+        (10, scored(ALPHA, 2, 1.0, elapsed=0.4)),
+        (10, scored(BETA, 2, 0.9, elapsed=0.6)),
+        (100, scored(ALPHA, 1, 1.0, amount=100)),
+    ])
+    record_run(path, "after", [
+        (10, scored(ALPHA, 1, 0.9, elapsed=0.3)),
+        (10, scored(BETA, 1, 1.0, elapsed=0.4)),
+        (10, ProviderException(ALPHA, request(2), "boom", "HTTPStatusError", mc_block_seqno=103)),
+        (10, scored(BETA, 2, 1.0, elapsed=0.6)),
+    ])
+
+    history = RunHistory(path)
+    yield history
+    history.close()
+
+
+def test_runs_are_recorded(history):
+    runs = history.runs()
+
+    assert [run["run_id"] for run in runs] == ["before", "after"]
+    assert [run["results"] for run in runs] == [5, 4]
+    assert (runs[1]["min_seqno"], runs[1]["max_seqno"]) == (100, 103)
+    assert runs[0]["providers"] == '["alpha", "beta"]'
+    assert all(run["finished_at"] >= run["started_at"] for run in runs)
+
+
+def test_run_stats(history):
+    stats = history.run_stats("before")
+
+    assert sorted(stats) == [("alpha", 10), ("alpha", 100), ("beta", 10)]
+
+    alpha = stats[("alpha", 10)]
+    assert (alpha.wins, alpha.rounds, alpha.results) == (2, 2, 2)
+    assert alpha.win_rate == 1
+    assert alpha.latency[50] == pytest.approx(0.3)
+    assert alpha.failures == set()
+
+    # ties on the best ratio count for every tied provider
+    assert stats[("beta", 10)].win_rate == 0.5
+    assert stats[("alpha", 100)].win_rate == 1
+
+
+def test_failed_routes(history):
+    alpha = history.run_stats("after")[("alpha", 10)]
+
+    assert (alpha.wins, alpha.rounds, alpha.results) == (0, 2, 2)
+    assert alpha.failures == {("J2", 4)}
+    assert alpha.latency[99] == pytest.approx(0.3)
+
+
+def test_diff(history):
+    diff = history.diff("before", "after")
+
+    assert list(diff) == [("alpha", 10), ("beta", 10), ("alpha", 100)]
+    assert diff[("alpha", 10)].win_rate_change == -1
+    assert diff[("beta", 10)].win_rate_change == 0.5
+    assert diff[("alpha", 10)].new_failures == {("J2", 4)}
+    assert diff[("beta", 10)].new_failures == set()
+    assert diff[("alpha", 10)].latency_change(50) == pytest.approx(0)
+    assert diff[("beta", 10)].latency_change(50) == pytest.approx(0)
+
+    # gone in the later run
+    assert diff[("alpha", 100)].after is None
+    assert diff[("alpha", 100)].win_rate_change is None
+    assert diff[("alpha", 100)].latency_change(50) is None
+
+
+def test_resumed_run_replaces_its_results(history):
+    # a resumed run replays its journal and records every result again
+    record_run(history.path, "after", [(10, scored(ALPHA, 1, 1.0)), (10, scored(BETA, 1, 0.5))])
+
+    assert [run["results"] for run in history.runs()] == [5, 2]
+    assert history.run_stats("after")[("alpha", 10)].failures == set()
+    assert history.diff("before", "after")[("beta", 10)].win_rate_change == -0.5
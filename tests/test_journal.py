@@ -0,0 +1,50 @@
+import asyncio
+
+from common.journal import ResultJournal, iter_journal, load_results
+from common.models import ProviderException
+from tests.factories import DummyProvider, request, result, write_journal
+
+
+def test_resume_skips_completed_and_drops_partial_record(tmp_path):
+    provider = DummyProvider()
+    path = tmp_path / "journal.jsonl"
+    write_journal(path, "run", [(10, result(provider, 1)), (10, result(provider, 2))])
+
+    # a crash in the middle of a write
+    with open(path, "ab") as file:
+        file.write(b'{"run_id": "run", "amount": 10, "prov')
+
+    journal = ResultJournal(path, "run")
+    assert journal.completed() == {(10, "EQ0001", "dummy", 4), (10, "EQ0002", "dummy", 4)}
+    assert journal.recorded_run_id() == "run"
+
+    write_journal(path, "run", [(10, result(provider, 3))])
+
+    assert [entry.request.output_token.address for entry in iter_journal(path)] == ["EQ0001", "EQ0002", "EQ0003"]
+
+
+def test_open_without_resume_keeps_previous_journal(tmp_path):
+    provider = DummyProvider()
+    path = tmp_path / "journal.jsonl"
+    write_journal(path, "first", [(10, result(provider, 1))])
+
+    async def restart():
+        journal = ResultJournal(path, "second")
+        journal.open()
+        await journal.close()
+
+    asyncio.run(restart())
+
+    assert ResultJournal(path).completed() == set()
+    assert len(list(tmp_path.glob("journal.jsonl.*"))) == 1
+
+
+def test_errors_are_restored(tmp_path):
+    provider = DummyProvider()
+    path = tmp_path / "journal.jsonl"
+    write_journal(path, "run", [(10, ProviderException(provider, request(1), "boom", "HTTPStatusError", 100))])
+
+    [error] = load_results(path, {"dummy": provider})[10]
+
+    assert type(error) is ProviderException
+    assert (error.message, error.error_type, error.mc_block_seqno) == ("boom", "HTTPStatusError", 100)
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common.limiter import RateLimiter, RateLimit, parse_retry_after
+
+
+def status_error(status: int, headers: dict | None = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://api.example.com/route")
+    response = httpx.Response(status, headers=headers, request=request)
+
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+async def throttle(limiter: RateLimiter, error: httpx.HTTPStatusError):
+    with pytest.raises(httpx.HTTPStatusError):
+        async with limiter.slot():
+            raise error
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(status_error(429, {"Retry-After": "2.5"}).response) == 2.5
+    assert parse_retry_after(status_error(429, {"Retry-After": "soon"}).response) == 0
+    assert parse_retry_after(status_error(429).response) == 0
+
+
+def test_backs_off_on_429_and_waits_for_retry_after():
+    limiter = RateLimiter("test", RateLimit(rate=10, burst=1, max_concurrency=2))
+
+    async def run():
+        await throttle(limiter, status_error(429, {"Retry-After": "0.2"}))
+        assert limiter.rate == 5
+
+        started_at = time.monotonic()
+        async with limiter.slot():
+            pass
+
+        return time.monotonic() - started_at
+
+    assert asyncio.run(run()) >= 0.19
+
+
+def test_503_backs_off_only_with_retry_after():
+    limiter = RateLimiter("test", RateLimit(rate=10, burst=1))
+
+    async def run():
+        await throttle(limiter, status_error(503))
+        assert limiter.rate == 10
+
+        await throttle(limiter, status_error(503, {"Retry-After": "0"}))
+        assert limiter.rate == 5
+
+        await throttle(limiter, status_error(500))
+        assert limiter.rate == 5
+
+    asyncio.run(run())
+
+
+def test_rate_never_drops_below_minimum_and_recovers():
+    limiter = RateLimiter("test", RateLimit(rate=1000, burst=1000, max_concurrency=4), recovery_successes=2)
+
+    async def run():
+        for _ in range(10):
+            await throttle(limiter, status_error(429))
+        assert limiter.rate == pytest.approx(100)
+
+        for _ in range(20):
+            async with limiter.slot():
+                pass
+        assert limiter.rate == 1000
+
+    asyncio.run(run())
+
+
+def test_share_keeps_at_least_one_request():
+    assert RateLimit(rate=4, burst=3, max_concurrency=3).share(0.25) == RateLimit(rate=1, burst=1, max_concurrency=1)
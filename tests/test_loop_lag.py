@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from common.loop_lag import LoopLagMonitor
+
+
+async def monitored(body) -> tuple[LoopLagMonitor, float]:
+    monitor = LoopLagMonitor()
+    monitor.start()
+    # a few ticks to see the idle overshoot
+    await asyncio.sleep(0.05)
+
+    try:
+        return monitor, await body(monitor)
+    finally:
+        monitor.stop()
+
+
+def test_idle_overshoot_is_not_lag():
+    monitor = LoopLagMonitor(min_stall=0.001)
+
+    # the timer wakes every tick a little late, by 0.1 to 0.6ms
+    for tick in range(1000):
+        monitor._record(0.0001 + (tick * 7 % 11) * 0.00005, tick * 0.0055)
+
+    assert monitor.total_lag == 0
+    assert monitor.since(0) == 0
+
+
+def test_stall_within_the_window_is_counted():
+    async def blocked(monitor):
+        mark = monitor.mark()
+        await asyncio.sleep(0.02)
+        time.sleep(0.2)
+        await asyncio.sleep(0.02)
+        return monitor.since(mark)
+
+    _, lag = asyncio.run(monitored(blocked))
+
+    # give or take preemptions of the whole process
+    assert lag == pytest.approx(0.2, abs=0.03)
+
+
+def test_stall_before_the_window_is_not_counted():
+    async def blocked_before(monitor):
+        time.sleep(0.2)
+        mark = monitor.mark()
+        await asyncio.sleep(0.05)
+        return monitor.since(mark), monitor.total_lag
+
+    _, (lag, total) = asyncio.run(monitored(blocked_before))
+
+    assert lag < 0.03
+    assert total == pytest.approx(0.2, abs=0.03)
+
+
+def test_stall_only_counts_above_the_baseline():
+    monitor = LoopLagMonitor(min_stall=0.001)
+
+    # every wake-up overshoots by 0.3ms, one of them by 50ms
+    for tick, overshoot in enumerate([0.0003] * 10 + [0.0503] + [0.0003] * 10):
+        monitor._record(overshoot, tick * 0.01)
+
+    assert monitor.total_lag == pytest.approx(0.05)
+    assert monitor.since(0.095) == pytest.approx(0.005)
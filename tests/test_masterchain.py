@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common.limiter import RateLimit
+from common.masterchain import MasterchainTracker
+from common.util import TONAPI_LIMITER
+
+
+@pytest.fixture(autouse=True)
+def fast_tonapi():
+    TONAPI_LIMITER.configure(RateLimit(rate=1000, burst=1000, max_concurrency=4))
+    yield
+    TONAPI_LIMITER.configure(TONAPI_LIMITER.base_limit)
+
+
+def head_client(bodies: list[bytes]) -> httpx.AsyncClient:
+    # answers with the bodies in turn, then keeps repeating the last one
+    polls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal polls
+        polls += 1
+
+        return httpx.Response(200, content=bodies[min(polls, len(bodies)) - 1])
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_poll_survives_malformed_responses():
+    async def run():
+        client = head_client([b"not json", b'{"head": 1}', b'{"seqno": 5}', b'{"seqno": 6}'])
+        tracker = MasterchainTracker(client, interval=0.01, ready_timeout=2)
+
+        await tracker.start()
+        first = tracker.seqno
+        await asyncio.sleep(0.1)
+
+        running = not tracker.task.done()
+        await tracker.stop()
+
+        return first, tracker.seqno, running
+
+    assert asyncio.run(run()) == (5, 6, True)
+
+
+def test_staleness_counts_from_the_last_change():
+    async def run():
+        tracker = MasterchainTracker(head_client([b'{"seqno": 5}']), interval=0.01)
+
+        await tracker.start()
+        await asyncio.sleep(0.1)
+        staleness = tracker.staleness
+        await tracker.stop()
+
+        return staleness
+
+    # polls kept succeeding, but the head never moved
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_pin_moves_once_older_than_max_age():
+    async def run():
+        tracker = MasterchainTracker(head_client([b'{"seqno": 5}']))
+        tracker.seqno = 5
+
+        first = await tracker.pin("batch")
+        tracker.seqno = 6
+        shared = await tracker.pin("batch", max_age=10)
+
+        tracker.pinned["batch"] = (5, time.monotonic() - 11)
+        moved = await tracker.pin("batch", max_age=10)
+
+        return first, shared, moved, await tracker.pin("batch")
+
+    assert asyncio.run(run()) == (5, 5, 6, 6)
@@ -0,0 +1,69 @@
+import json
+import subprocess
+import sys
+from importlib.metadata import EntryPoint
+from pathlib import Path
+
+import pytest
+
+import providers.registry
+from providers.registry import DEFAULT_PROVIDERS, ENTRY_POINT_GROUP, PROVIDERS, ProviderRegistry
+from tests.factories import DummyProvider
+
+ROOT = Path(__file__).parent.parent
+
+
+def loaded_providers(code: str) -> list[str]:
+    # a fresh interpreter, the modules this one imported do not count
+    script = f"import json, sys\n{code}\n" \
+             "print(json.dumps(sorted(name for name in sys.modules if name.startswith('providers.'))))"
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def test_import_loads_no_provider():
+    assert loaded_providers("from providers.registry import PROVIDER_REGISTRY") == ["providers.registry"]
+
+
+def test_lookup_loads_only_the_requested_provider():
+    assert loaded_providers("from providers.registry import PROVIDER_REGISTRY\n"
+                            "PROVIDER_REGISTRY.create('rainbow.ag')") == ["providers.rainbow_ag", "providers.registry"]
+
+
+def test_lookup_of_names_loads_no_provider():
+    assert loaded_providers("from providers.registry import PROVIDER_REGISTRY\n"
+                            "PROVIDER_REGISTRY.names(), PROVIDER_REGISTRY.defaults()\n"
+                            "PROVIDER_REGISTRY.get('unknown')") == ["providers.registry"]
+
+
+def test_builder_is_shared():
+    registry = ProviderRegistry(plugins=False)
+
+    dedust = registry.create("dedust")
+
+    assert dedust.builder is registry.create("swap.coffee")
+    assert registry.create("dedust") is dedust
+    assert registry.get("dedust") is dedust
+
+
+def test_unknown_provider():
+    registry = ProviderRegistry(plugins=False)
+
+    with pytest.raises(KeyError, match="Unknown provider nope"):
+        registry.create("nope")
+
+    assert registry.get("nope") is None
+    assert registry.instances == {}
+
+
+def test_plugins_are_registered(monkeypatch):
+    plugin = EntryPoint("my.dex", "tests.factories:DummyProvider", ENTRY_POINT_GROUP)
+    monkeypatch.setattr(providers.registry, "entry_points",
+                        lambda group: [plugin] if group == ENTRY_POINT_GROUP else [])
+
+    registry = ProviderRegistry()
+
+    assert registry.names() == list(PROVIDERS) + ["my.dex"]
+    assert registry.defaults() == DEFAULT_PROVIDERS + ["my.dex"]
+    assert isinstance(registry.create("my.dex"), DummyProvider)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from common.replay import Exchange, HttpArchive, RecordingTransport, ReplayTransport
+from common.timing import PhaseTimings, TimedTransport, record_phases
+
+TOKENS = {"tokens": [{"symbol": f"J{idx}", "address": f"EQ{idx:04d}"} for idx in range(50)]}
+
+
+class Body(httpx.AsyncByteStream):
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    async def __aiter__(self):
+        yield self.content
+
+
+def streamed(status_code: int, data) -> httpx.Response:
+    # streamed the way a network response is, httpx reads content passed as bytes up front
+    return httpx.Response(status_code, headers={"content-type": "application/json"},
+                          stream=Body(json.dumps(data).encode()))
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/tokens":
+        return streamed(200, TOKENS)
+
+    if request.url.path == "/route":
+        body = json.loads(request.content)
+        return streamed(200, {"output_amount": body["input_amount"] * 2})
+
+    if request.url.path == "/emulate":
+        return streamed(200, {"session": request.url.params["session"]})
+
+    return streamed(404, {"error": "not found"})
+
+
+async def exchange_all(transport: httpx.AsyncBaseTransport) -> list[tuple[int, str, bytes]]:
+    responses = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="https://api.test") as client:
+        for _ in range(2):
+            responses.append(await client.get("/tokens"))
+        for amount in (1, 2, 1):
+            responses.append(await client.post("/route", json={"input_amount": amount}))
+        for session in ("a", "b"):
+            responses.append(await client.get("/emulate", params={"session": session}))
+        responses.append(await client.get("/missing"))
+
+    return [(response.status_code, response.headers["content-type"], response.content) for response in responses]
+
+
+def record(path) -> tuple[HttpArchive, list]:
+    archive = HttpArchive(path)
+    archive.open()
+
+    try:
+        responses = asyncio.run(exchange_all(RecordingTransport(httpx.MockTransport(handler), archive)))
+    finally:
+        archive.close()
+
+    return archive, responses
+
+
+def test_recording_saves_every_exchange(tmp_path):
+    archive, responses = record(tmp_path / "archive")
+
+    exchanges = HttpArchive(archive.path).exchanges()
+    assert [(exchange.method, httpx.URL(exchange.url).path) for exchange in exchanges] == \
+        [("GET", "/tokens")] * 2 + [("POST", "/route")] * 3 + [("GET", "/emulate")] * 2 + [("GET", "/missing")]
+    assert [exchange.status_code for exchange in exchanges] == [status for status, _, _ in responses]
+    assert all(exchange.phases.total > 0 for exchange in exchanges)
+    assert exchanges == sorted(exchanges, key=lambda exchange: exchange.started_at)
+
+    # bodies are stored once per distinct content
+    assert exchanges[0].response_body == exchanges[1].response_body
+    assert exchanges[2].request_body == exchanges[4].request_body
+    assert archive.blob(exchanges[0].response_body) == responses[0][2]
+    assert len([path for path in (archive.path / "blobs").rglob("*") if path.is_file()]) == len(archive.blobs) == 8
+
+
+def test_replay_returns_the_recorded_responses(tmp_path):
+    archive, recorded = record(tmp_path / "archive")
+
+    replay = ReplayTransport(HttpArchive(archive.path), latency_scale=0)
+    replayed = asyncio.run(exchange_all(replay))
+
+    assert replayed == recorded
+    assert (replay.served, replay.missed) == (len(recorded), 0)
+
+
+def test_replay_matches_the_most_specific_request(tmp_path):
+    archive, _ = record(tmp_path / "archive")
+    replay = ReplayTransport(HttpArchive(archive.path), latency_scale=0)
+
+    async def run():
+        async with httpx.AsyncClient(transport=replay, base_url="https://api.test") as client:
+            route = await client.post("/route", json={"input_amount": 2})
+            # the session id of this run differs from the recorded ones, the endpoint matches in recording order
+            sessions = [(await client.get("/emulate", params={"session": "z"})).json()["session"] for _ in range(3)]
+
+            with pytest.raises(httpx.ConnectError):
+                await client.get("/unknown")
+
+            return route.json(), sessions
+
+    route, sessions = asyncio.run(run())
+
+    assert route == {"output_amount": 4}
+    assert sessions == ["a", "b", "a"]
+    assert replay.missed == 1
+
+
+def test_replay_plays_back_recorded_phases(tmp_path):
+    archive = HttpArchive(tmp_path / "archive")
+    archive.open()
+    archive.add(Exchange(method="GET", url="https://api.test/slow", status_code=200, headers=[],
+                         response_body=archive.put_blob(b"ok"), started_at=0,
+                         phases=PhaseTimings(send=0.01, wait=0.1, download=0.05, total=0.17)))
+    archive.close()
+
+    async def timed(latency_scale: float) -> tuple[PhaseTimings, bytes]:
+        transport = TimedTransport(ReplayTransport(HttpArchive(archive.path), latency_scale))
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            with record_phases() as timings:
+                response = await client.get("https://api.test/slow")
+
+        return timings, response.content
+
+    timings, content = asyncio.run(timed(1))
+    assert content == b"ok"
+    assert timings.wait == pytest.approx(0.1, abs=0.03)
+    assert timings.download == pytest.approx(0.05, abs=0.03)
+    # a kept-alive connection is not connected again
+    assert (timings.connect, timings.connections) == (0, 0)
+
+    timings, _ = asyncio.run(timed(0))
+    assert timings.wait + timings.download < 0.03
@@ -0,0 +1,52 @@
+import asyncio
+
+from common.models import EmulationSender
+from common.scheduler import PairScheduler, ProviderLane, BenchmarkPair
+from tests.factories import jetton
+
+PAIRS = [BenchmarkPair(index=idx, input_amount=1, output_token=jetton(idx)) for idx in range(40)]
+
+
+async def prepare(pair: BenchmarkPair) -> EmulationSender:
+    return EmulationSender(wallet_address="wallet", jetton_wallet_address="jetton wallet", mc_block_seqno=pair.index)
+
+
+def test_lanes_stay_within_window_and_share_senders():
+    scheduler = PairScheduler(prepare, window=3)
+    prepared = []
+
+    async def counting_prepare(pair):
+        prepared.append(pair.index)
+        return await prepare(pair)
+
+    scheduler.prepare = counting_prepare
+
+    def lane(delay: float):
+        async def job(pair, sender):
+            # a lane only starts a pair once every lane has started the one a window behind it
+            assert min(scheduler.positions) >= pair.index - scheduler.window
+            await asyncio.sleep(delay)
+            return (await sender).mc_block_seqno
+
+        return job
+
+    results = asyncio.run(scheduler.run(PAIRS, [
+        ProviderLane("fast", lane(0.001), concurrency=4),
+        ProviderLane("slow", lane(0.01), concurrency=2, skip=lambda pair: pair.index % 5 == 0),
+    ]))
+
+    assert [fast for fast, _ in results] == list(range(40))
+    assert [slow for _, slow in results] == [None if idx % 5 == 0 else idx for idx in range(40)]
+    assert sorted(prepared) == list(range(40))
+
+
+def test_lane_errors_are_kept_as_results():
+    async def job(pair, sender):
+        if pair.index == 2:
+            raise RuntimeError("boom")
+        return pair.index
+
+    results = asyncio.run(PairScheduler(prepare).run(PAIRS[:4], [ProviderLane("lane", job)]))
+
+    assert [row[0] for row in results[:2]] == [0, 1]
+    assert isinstance(results[2][0], RuntimeError)
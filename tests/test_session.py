@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+import emulator.session
+from common.limiter import RateLimit
+from common.models import EMULATOR_LIMITER
+from emulator.session import EmulationSessionPool
+
+
+@pytest.fixture
+def sessions(monkeypatch) -> list[int]:
+    # seqnos of the sessions created, one emulator slot at a time and without pacing
+    created = []
+
+    async def create_session(client, seqno: int) -> str:
+        created.append(seqno)
+        return f"session-{len(created)}"
+
+    monkeypatch.setattr(emulator.session, "create_session", create_session)
+    EMULATOR_LIMITER.configure(RateLimit(rate=1000, burst=1000, max_concurrency=1))
+    yield created
+    EMULATOR_LIMITER.configure(EMULATOR_LIMITER.base_limit)
+
+
+def test_warmed_session_is_taken_by_the_next_route(sessions):
+    async def run():
+        pool = EmulationSessionPool()
+        pool.warm(None, 100, 1)
+
+        first = await pool.acquire(None, 100)
+        second = await pool.acquire(None, 100)
+
+        return first, second, pool.stats.hits, pool.stats.misses
+
+    assert asyncio.run(run()) == ("session-1", "session-2", 1, 1)
+    assert sessions == [100, 100]
+
+
+def test_sessions_wait_for_an_emulator_slot(sessions):
+    async def run():
+        pool = EmulationSessionPool()
+
+        async with EMULATOR_LIMITER.slot():
+            pool.warm(None, 100, 1)
+            await asyncio.sleep(0.05)
+            waiting = list(sessions)
+
+        await pool.acquire(None, 100)
+
+        return waiting
+
+    assert asyncio.run(run()) == []
+    assert sessions == [100]
+
+
+def test_session_created_within_an_emulation_slot(sessions):
+    async def run():
+        pool = EmulationSessionPool()
+
+        # the only slot is held by the emulation itself
+        async with EMULATOR_LIMITER.slot():
+            return await asyncio.wait_for(pool.acquire(None, 100), 1)
+
+    assert asyncio.run(run()) == "session-1"
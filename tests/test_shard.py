@@ -0,0 +1,48 @@
+import pytest
+
+from common.journal import merge_journals, iter_journal
+from common.shard import Shard, shards
+from tests.factories import DummyProvider, result, write_journal
+
+
+def test_shards_split_items_without_overlap():
+    items = list(range(10))
+    selected = [shard.select(items) for shard in shards(3)]
+
+    assert selected == [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]]
+    assert Shard.parse("1/3") == Shard(index=1, count=3)
+    assert str(Shard.parse("1/3")) == "1/3"
+
+
+@pytest.mark.parametrize("value", ["3/3", "-1/2", "1", "a/b", "0/0"])
+def test_invalid_shard(value):
+    with pytest.raises(ValueError):
+        Shard.parse(value)
+
+
+def test_shard_journal_path(tmp_path):
+    assert Shard(index=0, count=4).with_shard(tmp_path / "journal.jsonl") == tmp_path / "journal.shard-0-of-4.jsonl"
+
+
+def test_merge_is_independent_of_shard_order(tmp_path):
+    provider = DummyProvider()
+    shards = [tmp_path / "journal.shard-0-of-2.jsonl", tmp_path / "journal.shard-1-of-2.jsonl"]
+    write_journal(shards[0], "run", [(10, result(provider, 3)), (1, result(provider, 1))])
+    write_journal(shards[1], "run", [(10, result(provider, 2)), (1, result(provider, 4))])
+
+    assert merge_journals(shards, tmp_path / "a.jsonl") == 4
+    assert merge_journals(shards[::-1], tmp_path / "b.jsonl") == 4
+
+    assert (tmp_path / "a.jsonl").read_bytes() == (tmp_path / "b.jsonl").read_bytes()
+    assert [entry.key[:2] for entry in iter_journal(tmp_path / "a.jsonl")] == \
+           [(1, "EQ0001"), (1, "EQ0004"), (10, "EQ0002"), (10, "EQ0003")]
+
+
+def test_merge_keeps_first_journal_for_duplicate_keys(tmp_path):
+    provider = DummyProvider()
+    shards = [tmp_path / "first.jsonl", tmp_path / "second.jsonl"]
+    write_journal(shards[0], "run", [(10, result(provider, 1, elapsed=1.0))])
+    write_journal(shards[1], "run", [(10, result(provider, 1, elapsed=2.0))])
+
+    assert merge_journals(shards, tmp_path / "journal.jsonl") == 1
+    assert [entry.elapsed for entry in iter_journal(tmp_path / "journal.jsonl")] == [1.0]
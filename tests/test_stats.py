@@ -0,0 +1,30 @@
+import numpy as np
+
+from exporters.stats import bootstrap_rate_ci
+
+
+def test_bootstrap_interval_covers_observed_rate():
+    rng = np.random.default_rng(1)
+    wins = rng.random((500, 3)) < np.array([0.1, 0.5, 0.9])
+
+    low, high = bootstrap_rate_ci(wins)
+    observed = wins.mean(axis=0)
+
+    assert np.all(low <= observed) and np.all(observed <= high)
+    # standard error of a rate over 500 rounds is at most ~0.022, a 95% interval spans about four of them
+    assert np.all(high - low < 0.1)
+
+
+def test_bootstrap_is_reproducible():
+    wins = np.random.default_rng(2).random((50, 2)) < 0.5
+
+    first, second = bootstrap_rate_ci(wins, seed=3), bootstrap_rate_ci(wins, seed=3)
+
+    assert np.array_equal(first[0], second[0]) and np.array_equal(first[1], second[1])
+
+
+def test_bootstrap_degenerate_cases():
+    low, high = bootstrap_rate_ci(np.array([[True, False]] * 20))
+
+    assert np.array_equal(low, [1, 0]) and np.array_equal(high, [1, 0])
+    assert bootstrap_rate_ci(np.zeros((0, 2), dtype=bool)) is None
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from common.models import DexBenchmarkResult, ProviderException
+from exporters.stats import ResultIndex
+from tests.factories import DummyProvider, request, result
+
+
+def provider_class(name: str, dex: bool) -> type:
+    # the baseline told providers apart by their class
+    return type(name, (DummyProvider,), {"get_name": lambda self: name, "is_dex": lambda self: dex})
+
+
+PROVIDERS = [provider_class("alpha", False)(), provider_class("beta", False)(), provider_class("gamma", False)(),
+             provider_class("dex", True)()]
+
+
+# measure_provider_stats as it was before the index, one sort per symbol and provider
+def baseline_wins(results: list, provider_type: type, extractor, reverse: bool) -> tuple[int, int, set]:
+    by_symbol: dict[str, list] = {}
+    for r in results:
+        if isinstance(r, DexBenchmarkResult):
+            by_symbol.setdefault(r.route.output_token.symbol, []).append(r)
+
+    tokens = set()
+    for symbol, symbol_results in by_symbol.items():
+        symbol_results = sorted(symbol_results, key=extractor, reverse=reverse)
+        best = extractor(symbol_results[0])
+
+        for r in symbol_results:
+            if type(r.provider) == provider_type:
+                value = extractor(r)
+                if reverse:
+                    diff = 1 - value / best if best != 0 else float('inf')
+                else:
+                    diff = 1 - best / value if value != 0 else float('inf')
+
+                if diff < 1e-4:
+                    tokens.add(symbol)
+                    break
+
+    return len(by_symbol), len(tokens), tokens
+
+
+def baseline_stats(results: list, provider_type: type) -> dict:
+    total, profitable_hit, tokens = baseline_wins(results, provider_type, lambda r: r.ratio, reverse=True)
+    _, fast_hit, _ = baseline_wins(results, provider_type,
+                                   lambda r: r.elapsed if not r.provider.is_dex() else float('inf'), reverse=False)
+    own = [r for r in results if isinstance(r, DexBenchmarkResult) and type(r.provider) == provider_type and r.elapsed > 0]
+
+    return {"symbols": total, "profitable_hit": profitable_hit, "fast_hit": fast_hit, "tokens": tokens,
+            "avg_elapsed": sum(r.elapsed for r in own) / len(own)}
+
+
+def random_results(seed: int) -> dict[int, list]:
+    rng = random.Random(seed)
+    results = {}
+
+    for amount in (1, 10, 100):
+        amount_results = []
+
+        for idx in range(30):
+            for provider in PROVIDERS:
+                if rng.random() < 0.1:
+                    amount_results.append(ProviderException(provider, request(idx, amount), "failed"))
+                    continue
+
+                r = result(provider, idx, amount, elapsed=rng.choice([0.5, 0.7, rng.uniform(0.1, 3)]))
+                # ties on the best ratio are common, every tied provider wins
+                r.ratio = rng.choice([0.9, 1.0, rng.uniform(0.5, 1)])
+                amount_results.append(r)
+
+        # every provider has at least one successful route for the amount
+        amount_results.extend(result(provider, 99, amount) for provider in PROVIDERS)
+        results[amount] = amount_results
+
+    return results
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_summary_matches_baseline(seed):
+    results = random_results(seed)
+    index = ResultIndex()
+    for amount, amount_results in results.items():
+        for r in amount_results:
+            index.add(amount, r)
+
+    for summary in index.summarize():
+        amount_results = results[summary.input_amount]
+
+        for provider_summary in summary.providers:
+            provider = next(p for p in PROVIDERS if p.get_name() == provider_summary.name)
+            expected = baseline_stats(amount_results, type(provider))
+
+            assert summary.symbols == expected["symbols"]
+            assert provider_summary.profitable_hit == expected["profitable_hit"]
+            assert provider_summary.fast_hit == expected["fast_hit"]
+            assert provider_summary.tokens == expected["tokens"]
+            assert provider_summary.avg_elapsed == pytest.approx(expected["avg_elapsed"])
@@ -0,0 +1,53 @@
+import pytest
+
+from common.util import TOKEN_METADATA, address_to_raw
+from emulator.synthetic import address
+from providers.swap_coffee import harvest_paths_metadata
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    # in memory only, nothing is read from or saved to the cache directory
+    TOKEN_METADATA.entries = {}
+    yield
+    TOKEN_METADATA.entries = None
+
+
+def token(idx: int, metadata: dict | None = None) -> dict:
+    if metadata is None:
+        metadata = {"name": f"Token {idx}", "symbol": f"T{idx}", "decimals": 9}
+
+    return {"address": {"blockchain": "ton", "address": address(1000 + idx)}, "metadata": metadata}
+
+
+def path(input_token: dict, output_token: dict, *next_paths: dict) -> dict:
+    return {"input_token": input_token, "output_token": output_token, "next": list(next_paths)}
+
+
+def cached(idx: int) -> dict | None:
+    return TOKEN_METADATA.get(address_to_raw(address(1000 + idx)))
+
+
+def test_harvest_walks_every_branch():
+    harvest_paths_metadata([
+        path(token(0), token(1),
+             path(token(1), token(2), path(token(2), token(5))),
+             path(token(1), token(3))),
+        path(token(0), token(4)),
+    ])
+
+    assert [cached(idx)["symbol"] for idx in range(6)] == ["T0", "T1", "T2", "T3", "T4", "T5"]
+
+
+def test_harvest_skips_what_it_cannot_use():
+    harvest_paths_metadata([
+        path(token(0), {"metadata": {"symbol": "NOADDR"}}, path(token(1), token(2))),
+        path(token(3, metadata={"symbol": "T3"}), token(4)),
+        {"input_token": None},
+        path({"address": {"address": address(1005)}, "metadata": None}, token(6)),
+        path({"address": {"address": "not an address"}}, token(7)),
+    ])
+
+    assert cached(0)["symbol"] == "T0"
+    assert [cached(idx)["symbol"] for idx in (1, 2, 4, 6, 7)] == ["T1", "T2", "T4", "T6", "T7"]
+    assert cached(3) is None and cached(5) is None
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from emulator.models import EmulatorResult
+from emulator.synthetic import TraceShape, generate_trace, write_trace
+from emulator.trace import decode_trace
+
+SHAPES = [
+    TraceShape(),
+    TraceShape(hops=4, fanout=2, excess="every_hop", seed=1),
+    TraceShape(hops=3, fanout=1, bounce_rate=0.5, excess="none", seed=2),
+    TraceShape(hops=1, dexes={"stonfi_v2": 1}, seed=3),
+]
+
+
+def transactions(root) -> list:
+    # depth first, children in order
+    found = []
+    stack = [root]
+
+    while stack:
+        transaction = stack.pop()
+        found.append(transaction)
+        stack.extend(reversed(transaction.children or []))
+
+    return found
+
+
+def fields(transaction) -> tuple:
+    # everything the swap output analysis reads
+    in_msg = transaction.in_msg
+    body = in_msg.decoded_body if in_msg is not None else None
+    compute_phase = transaction.compute_phase
+
+    return (
+        transaction.account,
+        transaction.total_fees,
+        len(transaction.children or []),
+        in_msg and (in_msg.type, in_msg.src, in_msg.dest, in_msg.value, in_msg.decoded_op),
+        body and (body.type, getattr(body, "amount", None)),
+        compute_phase and compute_phase.exit_code,
+    )
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_decoded_trace_matches_validated_result(shape):
+    data, _ = generate_trace(shape)
+    content = json.dumps(data)
+
+    full = EmulatorResult.model_validate_json(content)
+    fast = decode_trace(content)
+
+    assert (fast.ok, fast.exit_code, fast.message) == (full.ok, full.exit_code, full.message)
+    assert [fields(transaction) for transaction in transactions(fast.result)] == \
+           [fields(transaction) for transaction in transactions(full.result)]
+
+
+def test_decodes_failed_emulation():
+    fast = decode_trace(b'{"ok": false, "exit_code": 33, "message": "out of gas", "result": null}')
+
+    assert (fast.ok, fast.exit_code, fast.message, fast.result) == (False, 33, "out of gas", None)
+
+
+def test_decodes_deep_traces():
+    # about as deep as the json module can parse, streamed since dumping it would recurse
+    file = io.StringIO()
+    summary = write_trace(TraceShape(hops=300, seed=4), file)
+
+    assert len(transactions(decode_trace(file.getvalue()).result)) == summary.transactions